@@ -0,0 +1,293 @@
+"""
+Almacén columnar en disco de historias laborales ya limpias.
+
+Todas las historias de un portafolio van concatenadas en un archivo binario
+por columna (Desde/Hasta en datetime64[D], IBC y Semanas en float64 y
+Periodo en datetime64[M]) más un índice de offsets: las filas del afiliado
+i son [offsets[i], offsets[i + 1]). Los datos de cada afiliado (id, nombre,
+género, fecha de nacimiento) van en almacen.json.
+
+Los archivos se leen con np.memmap: la historia de un afiliado es una vista
+sin copia y la reliquidación masiva recorre el almacén por bloques de filas,
+mapeando solo el bloque en curso para acotar la memoria y liquidándolo
+con el núcleo vectorizado de portafolio.py.
+
+Uso:
+    python almacen.py reliquidar portafolio/ -o resumen.csv --granularidad mensual
+    python almacen.py info portafolio/
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from historia import HistoriaLaboral
+
+VERSION_ALMACEN = 1
+META = "almacen.json"
+OFFSETS = "offsets.bin"
+COLUMNAS = {
+    "desde": "datetime64[D]", "hasta": "datetime64[D]",
+    "ibc": "float64", "semanas": "float64", "periodo": "datetime64[M]"
+}
+FILAS_POR_BLOQUE = 1_000_000
+
+def _ruta(directorio, columna):
+    return os.path.join(directorio, f"{columna}.bin")
+
+def _mapear(ruta, dtype, inicio, fin):
+    """Vista de solo lectura de las filas [inicio, fin) de un archivo columnar"""
+    dtype = np.dtype(dtype)
+    if fin <= inicio: return np.empty(0, dtype)
+    return np.memmap(ruta, dtype=dtype, mode="r", offset=inicio * dtype.itemsize, shape=(fin - inicio,))
+
+class AlmacenHistorias:
+    """
+    Almacén de solo anexado. Lectura: len, ids, historia(id), afiliado(id),
+    bloques() y reliquidar(). Escritura: 'with almacen.escritor() as e:
+    e.agregar(...)'; el índice y los metadatos se publican al cerrar.
+    """
+    def __init__(self, directorio):
+        self.directorio = directorio
+        os.makedirs(directorio, exist_ok=True)
+        self._cargar()
+
+    def _cargar(self):
+        ruta_meta = os.path.join(self.directorio, META)
+        if os.path.exists(ruta_meta):
+            with open(ruta_meta, encoding="utf-8") as f:
+                meta = json.load(f)
+            if meta.get("version") != VERSION_ALMACEN:
+                raise ValueError(f"Versión de almacén no soportada: {meta.get('version')}")
+            self.afiliados = meta["afiliados"]
+            self.filas = int(meta["filas"])
+            self.offsets = np.fromfile(os.path.join(self.directorio, OFFSETS), dtype=np.int64, count=len(self.afiliados) + 1)
+        else:
+            self.afiliados, self.filas = [], 0
+            self.offsets = np.zeros(1, dtype=np.int64)
+        self._indice = {a["id"]: i for i, a in enumerate(self.afiliados)}
+        # Una vista por columna sobre todo el almacén (se crea a demanda)
+        self._columnas = {}
+
+    def __len__(self):
+        return len(self.afiliados)
+
+    def __contains__(self, id_afiliado):
+        return str(id_afiliado) in self._indice
+
+    @property
+    def ids(self):
+        return [a["id"] for a in self.afiliados]
+
+    @property
+    def nbytes(self):
+        return sum(np.dtype(t).itemsize for t in COLUMNAS.values()) * self.filas + self.offsets.nbytes
+
+    def _columna(self, nombre):
+        if nombre not in self._columnas:
+            self._columnas[nombre] = _mapear(_ruta(self.directorio, nombre), COLUMNAS[nombre], 0, self.filas)
+        return self._columnas[nombre]
+
+    def posicion(self, id_afiliado):
+        try:
+            return self._indice[str(id_afiliado)]
+        except KeyError:
+            raise KeyError(f"Afiliado no encontrado en el almacén: {id_afiliado}") from None
+
+    def afiliado(self, id_afiliado):
+        return self.afiliados[self.posicion(id_afiliado)]
+
+    def _historia(self, i, columnas, base=0):
+        """HistoriaLaboral del afiliado i con vistas sobre columnas que empiezan en la fila 'base' (sin copia)"""
+        inicio, fin = int(self.offsets[i]) - base, int(self.offsets[i + 1]) - base
+        periodo = columnas["periodo"][inicio:fin] if self.afiliados[i]["periodo"] else None
+        return HistoriaLaboral(
+            columnas["desde"][inicio:fin], columnas["hasta"][inicio:fin],
+            columnas["ibc"][inicio:fin], columnas["semanas"][inicio:fin], periodo=periodo
+        )
+
+    def historia(self, id_afiliado):
+        """Historia de un afiliado como vistas sobre los archivos mapeados"""
+        return self._historia(self.posicion(id_afiliado), {c: self._columna(c) for c in COLUMNAS})
+
+    def bloques(self, max_filas=FILAS_POR_BLOQUE):
+        """
+        Rangos [primer, último) de afiliados con a lo sumo max_filas filas
+        (o un solo afiliado, si su historia es más larga)
+        """
+        i, n = 0, len(self.afiliados)
+        while i < n:
+            limite = self.offsets[i] + max_filas
+            j = max(int(np.searchsorted(self.offsets, limite, side="right")) - 1, i + 1)
+            yield i, min(j, n)
+            i = min(j, n)
+
+    def historias_bloque(self, primero, ultimo):
+        """(posición, afiliado, historia) del bloque, mapeando solo sus filas"""
+        inicio, fin = int(self.offsets[primero]), int(self.offsets[ultimo])
+        columnas = {c: _mapear(_ruta(self.directorio, c), t, inicio, fin) for c, t in COLUMNAS.items()}
+        for i in range(primero, ultimo):
+            yield i, self.afiliados[i], self._historia(i, columnas, inicio)
+
+    def reliquidar(self, limitar_semanas_cotizadas=True, granularidad="anual", tabla_ipc=None,
+                   max_filas=FILAS_POR_BLOQUE, progreso=None):
+        """
+        Liquida todo el almacén (p. ej. tras actualizar el IPC) bloque a
+        bloque con el núcleo de portafolio. Devuelve un DataFrame con una
+        fila por afiliado.
+        """
+        from portafolio import liquidar_concatenado
+
+        partes = []
+        for primero, ultimo in self.bloques(max_filas):
+            inicio, fin = int(self.offsets[primero]), int(self.offsets[ultimo])
+            afiliados = self.afiliados[primero:ultimo]
+            try:
+                res = liquidar_concatenado(
+                    _mapear(_ruta(self.directorio, "hasta"), COLUMNAS["hasta"], inicio, fin),
+                    _mapear(_ruta(self.directorio, "ibc"), COLUMNAS["ibc"], inicio, fin),
+                    _mapear(_ruta(self.directorio, "semanas"), COLUMNAS["semanas"], inicio, fin),
+                    self.offsets[primero:ultimo + 1] - inicio,
+                    [a["genero"] for a in afiliados], [a["fecha_nacimiento"] for a in afiliados],
+                    limitar_semanas_cotizadas, granularidad=granularidad, tabla_ipc=tabla_ipc
+                )
+                bloque = pd.DataFrame({
+                    "id": [a["id"] for a in afiliados], "nombre": [a.get("nombre", "") for a in afiliados],
+                    "periodos": res["periodos"], "estado": "ok", "semanas": res["semanas"],
+                    "fecha_estatus": res["fecha_estatus"], "fecha_corte": res["fecha_corte"],
+                    "ibl_10": res["ibl_10"], "ibl_vida": res["ibl_vida"], "ibl": res["ibl"],
+                    "origen_ibl": res["origen_ibl"], "tasa": res["tasa"], "mesada": res["mesada"]
+                })
+            except Exception:
+                # Un dato inválido no tumba el bloque: se liquida afiliado por afiliado
+                bloque = pd.DataFrame(self._reliquidar_uno(afiliado, historia, limitar_semanas_cotizadas,
+                                                           granularidad, tabla_ipc)
+                                      for _, afiliado, historia in self.historias_bloque(primero, ultimo))
+            partes.append(bloque)
+            if progreso: progreso(ultimo, len(self))
+        return pd.concat(partes, ignore_index=True) if partes else pd.DataFrame()
+
+    @staticmethod
+    def _reliquidar_uno(afiliado, historia, limitar_semanas_cotizadas, granularidad, tabla_ipc):
+        from logic import LiquidadorPension
+
+        fila = {"id": afiliado["id"], "nombre": afiliado.get("nombre", ""), "periodos": len(historia)}
+        try:
+            liq = LiquidadorPension(historia, afiliado["genero"], afiliado["fecha_nacimiento"], tabla_ipc)
+            res = liq.liquidar(limitar_semanas_cotizadas, granularidad=granularidad)
+            fechas = res["fechas"]
+            fila.update({
+                "estado": "ok", "semanas": float(res["semanas"]),
+                "fecha_estatus": fechas["fecha_estatus"], "fecha_corte": fechas["fecha_corte"],
+                "ibl_10": res["ibl_10"], "ibl_vida": res["ibl_vida"], "ibl": res["ibl"],
+                "origen_ibl": res["origen_ibl"], "tasa": float(res["tasa"]), "mesada": float(res["mesada"])
+            })
+        except Exception as e:
+            fila.update({"estado": "error", "error": f"{type(e).__name__}: {e}"})
+        return fila
+
+    def escritor(self):
+        return _EscritorAlmacen(self)
+
+class _EscritorAlmacen:
+    """Anexa historias al final de cada columna; publica offsets y metadatos al cerrar"""
+    def __init__(self, almacen):
+        self.almacen = almacen
+        self._archivos = {}
+        self._nuevos = []
+        self._offsets = []
+        self._filas = almacen.filas
+
+    def abrir(self):
+        for columna, dtype in COLUMNAS.items():
+            ruta = _ruta(self.almacen.directorio, columna)
+            f = open(ruta, "r+b" if os.path.exists(ruta) else "w+b")
+            # Descarta filas de una escritura anterior que no llegó a publicarse
+            f.truncate(self.almacen.filas * np.dtype(dtype).itemsize)
+            f.seek(0, os.SEEK_END)
+            self._archivos[columna] = f
+        return self
+
+    def agregar(self, id_afiliado, historia, genero, fecha_nacimiento, nombre=""):
+        """Agrega una historia (HistoriaLaboral o DataFrame limpio)"""
+        id_afiliado = str(id_afiliado)
+        if id_afiliado in self.almacen or any(a["id"] == id_afiliado for a in self._nuevos):
+            raise ValueError(f"El afiliado {id_afiliado} ya está en el almacén")
+        if not isinstance(historia, HistoriaLaboral):
+            historia = HistoriaLaboral.desde_dataframe(historia)
+        n = len(historia)
+        periodo = historia.periodo if historia.periodo is not None else np.full(n, np.datetime64("NaT"), "datetime64[M]")
+        for columna, valores in (("desde", historia.desde), ("hasta", historia.hasta), ("ibc", historia.ibc),
+                                 ("semanas", historia.semanas), ("periodo", periodo)):
+            np.ascontiguousarray(valores, dtype=COLUMNAS[columna]).tofile(self._archivos[columna])
+        self._filas += n
+        self._offsets.append(self._filas)
+        self._nuevos.append({
+            "id": id_afiliado, "nombre": nombre, "genero": genero,
+            "fecha_nacimiento": pd.Timestamp(fecha_nacimiento).strftime("%Y-%m-%d"),
+            "periodo": historia.periodo is not None
+        })
+
+    def cerrar(self, publicar=True):
+        """Cierra los archivos; con publicar=False las filas escritas se descartan en la próxima apertura"""
+        for f in self._archivos.values():
+            f.flush()
+            os.fsync(f.fileno())
+            f.close()
+        self._archivos = {}
+        if not publicar: return
+
+        almacen = self.almacen
+        offsets = np.concatenate([almacen.offsets, np.array(self._offsets, dtype=np.int64)])
+        meta = {"version": VERSION_ALMACEN, "filas": self._filas, "afiliados": almacen.afiliados + self._nuevos}
+        # Offsets y metadatos se reemplazan de forma atómica: un lector nunca
+        # ve filas sin índice ni un índice sin filas
+        ruta_offsets = os.path.join(almacen.directorio, OFFSETS)
+        offsets.tofile(ruta_offsets + ".tmp")
+        os.replace(ruta_offsets + ".tmp", ruta_offsets)
+        ruta_meta = os.path.join(almacen.directorio, META)
+        with open(ruta_meta + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False)
+        os.replace(ruta_meta + ".tmp", ruta_meta)
+        almacen._cargar()
+
+    def __enter__(self):
+        return self.abrir()
+
+    def __exit__(self, tipo, *_):
+        self.cerrar(publicar=tipo is None)
+        return False
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Almacén columnar de historias laborales.")
+    sub = parser.add_subparsers(dest="comando", required=True)
+    info = sub.add_parser("info", help="Resumen del almacén")
+    info.add_argument("directorio")
+    reliq = sub.add_parser("reliquidar", help="Liquida de nuevo todo el almacén")
+    reliq.add_argument("directorio")
+    reliq.add_argument("-o", "--salida", default="reliquidacion.csv", help="CSV de resultados")
+    reliq.add_argument("--sin-tope", action="store_true", help="No limitar a 1800 semanas")
+    reliq.add_argument("--granularidad", choices=["anual", "mensual"], default="anual")
+    reliq.add_argument("--filas-por-bloque", type=int, default=FILAS_POR_BLOQUE)
+    args = parser.parse_args(argv)
+
+    almacen = AlmacenHistorias(args.directorio)
+    if args.comando == "info":
+        print(f"{len(almacen)} afiliados, {almacen.filas:,} periodos, {almacen.nbytes / 1024 ** 2:,.2f} MB")
+        return 0
+
+    inicio = time.perf_counter()
+    resultado = almacen.reliquidar(not args.sin_tope, args.granularidad, max_filas=args.filas_por_bloque,
+                                   progreso=lambda i, n: print(f"[{i}/{n}]", file=sys.stderr))
+    resultado.to_csv(args.salida, index=False)
+    total = time.perf_counter() - inicio
+    print(f"{len(resultado)} afiliados en {total:.2f}s -> {len(resultado) / total:,.0f} afiliados/s. Resultados: {args.salida}",
+          file=sys.stderr)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
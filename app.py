@@ -1,15 +1,21 @@
+import os
+import hashlib
 import streamlit as st
 import pandas as pd
-import matplotlib.pyplot as plt
-from datetime import date, datetime, timedelta
-from io import BytesIO
-from docx import Document
-from docx.shared import Pt, Inches, RGBColor
-from docx.enum.text import WD_ALIGN_PARAGRAPH
-from data_processor import extraer_tabla_cruda, limpiar_y_estandarizar, aplicar_regla_simultaneidad
-from logic import LiquidadorPension
+import numpy as np
+from datetime import date, datetime
+from data_processor import limpiar_y_estandarizar, aplicar_regla_simultaneidad, sugerir_columnas, detectar_columnas, UMBRAL_CONFIANZA
+from logic import LiquidadorPension, SMMLV
+from proyeccion import simular_escenarios, mejor_estrategia
+from regimenes import evaluar_regimenes, mas_favorable
+from sensibilidad import analizar_sensibilidad, escenarios_monte_carlo, resumir_distribucion
+from cache_historias import CacheHistorias
+from reporte import generar_reporte_completo, MIME_DOCX
+import instrumentacion
+from servicio import ClienteServicio
 
 st.set_page_config(page_title="Liquidador Pensional Pro", layout="wide", page_icon="⚖️")
+medidas_rerun = instrumentacion.nueva_captura()
 
 # --- CSS ---
 st.markdown("""
@@ -26,108 +32,62 @@ st.title("⚖️ Liquidador Pensional: Análisis Técnico & Jurídico")
 # --- ESTADO ---
 if 'df_crudo' not in st.session_state: st.session_state.df_crudo = None
 if 'df_final' not in st.session_state: st.session_state.df_final = None
+if 'clave_pdf' not in st.session_state: st.session_state.clave_pdf = None
+if 'huella_final' not in st.session_state: st.session_state.huella_final = None
+if 'trabajo_servicio' not in st.session_state: st.session_state.trabajo_servicio = None
 
-# ==========================================
-# GENERADOR DE REPORTE WORD
-# ==========================================
-def generar_reporte_completo(perfil, fechas, liq_data, proyeccion=None):
-    doc = Document()
-    style = doc.styles['Normal']
-    style.font.name = 'Arial'
-    style.font.size = Pt(10)
+# Con LIQUIDADOR_SERVICIO_URL el PDF y el dictamen se procesan en el servicio
+# local (servicio.py) y esta sesión solo consulta y muestra resultados
+SERVICIO_URL = os.environ.get("LIQUIDADOR_SERVICIO_URL")
+# Extracción del PDF en serie por defecto; LIQUIDADOR_WORKERS_PDF > 1 la
+# reparte en procesos para documentos largos (una a la vez en el servidor)
+WORKERS_PDF = int(os.environ.get("LIQUIDADOR_WORKERS_PDF", "1"))
 
-    # TÍTULO
-    tit = doc.add_heading('DICTAMEN TÉCNICO PENSIONAL', 0)
-    tit.alignment = WD_ALIGN_PARAGRAPH.CENTER
-    doc.add_paragraph(f"Fecha de Emisión: {datetime.now().strftime('%d/%m/%Y')}")
-    doc.add_paragraph("_" * 70)
+@st.cache_resource
+def obtener_cache_historias():
+    # Caché en disco compartida por todas las sesiones del servidor
+    return CacheHistorias()
 
-    # 1. INFORMACIÓN
-    doc.add_heading('1. ESTATUS JURÍDICO', level=1)
-    table = doc.add_table(rows=1, cols=2)
-    table.style = 'Table Grid'
-    
-    datos = [
-        ("Afiliado", perfil['nombre']),
-        ("Fecha Nacimiento", perfil['fecha_nac']),
-        ("Cumplimiento Edad", fechas['fecha_cumple_edad'].strftime('%d/%m/%Y')),
-        ("Cumplimiento Semanas", fechas['fecha_cumple_semanas'].strftime('%d/%m/%Y') if fechas['fecha_cumple_semanas'] else "No cumplido"),
-        ("FECHA ESTATUS", fechas['fecha_estatus'].strftime('%d/%m/%Y') if fechas['tiene_estatus'] else "NO ADQUIRIDO"),
-        ("FECHA CORTE (INDEXACIÓN)", fechas['fecha_corte'].strftime('%d/%m/%Y')),
-    ]
-    for k, v in datos:
-        r = table.add_row().cells
-        r[0].text = k
-        r[1].text = str(v)
+# ==========================================
+# CACHÉ DE CÁLCULOS (por huella de la historia + parámetros)
+# ==========================================
+# Cada widget dispara un rerun completo: los pasos pesados solo se recalculan
+# cuando cambian sus propias entradas. Los argumentos con '_' no se hashean,
+# la huella (o la clave de liquidación) los representa. 'hoy' va en la clave
+# porque el resultado depende de la fecha actual.
+def huella_historia(df):
+    """SHA-256 del contenido de la historia (valores e índice)"""
+    return hashlib.sha256(pd.util.hash_pandas_object(df, index=True).to_numpy().tobytes()).hexdigest()
 
-    # 2. LIQUIDACIÓN
-    doc.add_heading('2. RESULTADO DE LA LIQUIDACIÓN', level=1)
-    t2 = doc.add_table(rows=1, cols=2)
-    t2.style = 'Light Shading Accent 1'
-    
-    res_data = [
-        ("Semanas Totales", f"{liq_data['semanas']:,.2f}"),
-        ("IBL 10 Años", f"${liq_data['ibl_10']:,.0f}"),
-        ("IBL Toda la Vida", f"${liq_data['ibl_vida']:,.0f}"),
-        ("IBL APLICADO", f"${liq_data['ibl']:,.0f} ({liq_data['origen_ibl']})"),
-        ("Tasa Reemplazo", f"{liq_data['tasa']:.2f}%"),
-        ("MESADA PENSIONAL", f"${liq_data['mesada']:,.0f}")
-    ]
-    for k, v in res_data:
-        r = t2.add_row().cells
-        r[0].text = k
-        r[1].text = v
+@st.cache_data(max_entries=64, show_spinner=False)
+def liquidar_cacheado(huella, _df, genero, fecha_nac, aplicar_tope, hoy, granularidad="anual"):
+    return LiquidadorPension(_df, genero, fecha_nac).liquidar(aplicar_tope, granularidad=granularidad)
 
-    # 3. GRÁFICA COMPARATIVA
-    doc.add_heading('3. ANÁLISIS GRÁFICO', level=1)
-    fig1, ax1 = plt.subplots(figsize=(6, 3))
-    ax1.bar(["Últimos 10", "Toda Vida"], [liq_data['ibl_10'], liq_data['ibl_vida']], color=['#3498db', '#2ecc71'])
-    ax1.set_title("Comparativo IBL")
-    ax1.yaxis.set_major_formatter('${x:,.0f}')
-    
-    memfile1 = BytesIO()
-    fig1.savefig(memfile1)
-    doc.add_picture(memfile1, width=Inches(5))
-    memfile1.close()
-    
-    # 4. TABLAS DE SOPORTE (AMBAS)
-    doc.add_page_break()
-    doc.add_heading('ANEXO 1: DETALLE ÚLTIMOS 10 AÑOS', level=1)
-    
-    def agregar_tabla_soporte(df_sop):
-        if not df_sop.empty:
-            t = doc.add_table(rows=1, cols=3)
-            t.style = 'Table Grid'
-            h = t.rows[0].cells
-            h[0].text = 'Periodo'; h[1].text = 'IBC Histórico'; h[2].text = 'IBC Actualizado'
-            
-            # Limitamos a las primeras 50 y últimas 10 filas para no saturar el Word si es muy largo
-            filas_mostrar = pd.concat([df_sop.head(50), df_sop.tail(10)]) if len(df_sop) > 60 else df_sop
-            
-            for _, row in filas_mostrar.iterrows():
-                rc = t.add_row().cells
-                rc[0].text = f"{row['Desde'].strftime('%m/%Y')} - {row['Hasta'].strftime('%m/%Y')}"
-                rc[1].text = f"${row['IBC_Historico']:,.0f}"
-                rc[2].text = f"${row['IBC_Actualizado']:,.0f}"
+@st.cache_data(max_entries=256, show_spinner=False)
+def simular_cacheado(huella, _df, genero, fecha_nac, valores, anios, estrategias, aplicar_tope, mesada, hoy, granularidad="anual"):
+    liq = LiquidadorPension(_df, genero, fecha_nac)
+    return simular_escenarios(liq, list(valores), list(anios), list(estrategias), aplicar_tope, mesada, granularidad)
 
-    agregar_tabla_soporte(liq_data['df_soporte_10'])
+@st.cache_data(max_entries=64, show_spinner=False)
+def regimenes_cacheado(huella, _df, genero, fecha_nac, aplicar_tope, hoy, granularidad="anual"):
+    liq = LiquidadorPension(_df, genero, fecha_nac)
+    return evaluar_regimenes(liq, limitar_semanas_cotizadas=aplicar_tope, granularidad=granularidad)
 
-    doc.add_heading('ANEXO 2: DETALLE TODA LA VIDA', level=1)
-    agregar_tabla_soporte(liq_data['df_soporte_vida'])
+@st.cache_data(max_entries=64, show_spinner=False)
+def sensibilidad_cacheada(huella, _df, genero, fecha_nac, aplicar_tope, hoy, granularidad, n, desviacion_ipc, desviacion_smmlv, semilla):
+    ipc, smmlv = escenarios_monte_carlo(n, desviacion_ipc=desviacion_ipc, desviacion_smmlv=desviacion_smmlv, semilla=semilla)
+    liq = LiquidadorPension(_df, genero, fecha_nac)
+    return analizar_sensibilidad(liq, ipc, smmlv, limitar_semanas_cotizadas=aplicar_tope, granularidad=granularidad)
 
-    # 5. PROYECCIÓN
-    if proyeccion:
-        doc.add_page_break()
-        doc.add_heading('4. PROYECCIÓN FUTURA', level=1)
-        doc.add_paragraph(f"Estrategia: {proyeccion['estrategia']}")
-        doc.add_paragraph(f"Inversión: ${proyeccion['inversion']:,.0f}")
-        doc.add_paragraph(f"Nueva Mesada: ${proyeccion['mesada_fut']:,.0f}")
-        doc.add_paragraph(f"ROI: {proyeccion['roi']:.1f} Años")
+@st.cache_data(max_entries=64, show_spinner=False)
+def liquidacion_servicio(id_trabajo, genero, fecha_nac, aplicar_tope, hoy, granularidad):
+    # La historia ya está en el servicio: solo viajan parámetros y resultados
+    return ClienteServicio(SERVICIO_URL).liquidacion(id_trabajo, genero, fecha_nac, aplicar_tope, granularidad)
 
-    buffer = BytesIO()
-    doc.save(buffer)
-    buffer.seek(0)
-    return buffer
+@st.cache_data(max_entries=64, show_spinner=False)
+def dictamen_cacheado(clave_liquidacion, perfil, proyeccion, _fechas, _liq_data):
+    # Fechas y soportes se derivan de la clave de liquidación
+    return generar_reporte_completo(perfil, _fechas, _liq_data, proyeccion).getvalue()
 
 # ==========================================
 # INTERFAZ (SIDEBAR)
@@ -140,9 +100,14 @@ with st.sidebar:
     
     st.divider()
     aplicar_tope = st.checkbox("Tope 1800 Semanas", value=True)
+    granularidad = st.radio("Indexación IPC", ["anual", "mensual"], format_func=str.capitalize, horizontal=True)
     if st.button("🔄 Reiniciar"):
         st.session_state.df_crudo = None
         st.session_state.df_final = None
+        st.session_state.clave_pdf = None
+        st.session_state.huella_final = None
+        st.session_state.dictamen = None
+        st.session_state.trabajo_servicio = None
         st.rerun()
 
 # ==========================================
@@ -152,45 +117,96 @@ if st.session_state.df_final is None:
     st.info("📂 Carga el PDF de Historia Laboral")
     uploaded_file = st.file_uploader("Archivo PDF", type="pdf")
 
+    if uploaded_file and SERVICIO_URL and st.session_state.df_crudo is None:
+        # Parseo y limpieza en el servicio; si falla (p. ej. columnas dudosas)
+        # se sigue con el mapeo manual local
+        cliente = ClienteServicio(SERVICIO_URL)
+        barra = st.progress(0.0, text="Enviando al servicio de liquidación...")
+        avance = {"en_cola": 0.1, "extrayendo": 0.3, "liquidando": 0.8, "listo": 1.0}
+        try:
+            id_trabajo = cliente.enviar_pdf(uploaded_file.getvalue(), genero, fecha_nac, aplicar_tope, granularidad)
+            for evento in cliente.eventos(id_trabajo):
+                barra.progress(avance.get(evento["estado"], 1.0), text=f"Servicio: {evento['estado']} ({evento['segundos']:.1f}s)")
+            final = cliente.historia(id_trabajo)
+            st.session_state.df_final = final
+            st.session_state.huella_final = huella_historia(final)
+            st.session_state.trabajo_servicio = id_trabajo
+            st.rerun()
+        except (RuntimeError, OSError) as e:
+            barra.empty()
+            st.warning(f"{e}. Se continúa con el procesamiento local.")
+
     if uploaded_file:
         if st.session_state.df_crudo is None:
-            st.session_state.df_crudo = extraer_tabla_cruda(uploaded_file)
+            st.session_state.df_crudo, st.session_state.clave_pdf = obtener_cache_historias().obtener_o_extraer(
+                uploaded_file, workers=WORKERS_PDF
+            )
         
         df = st.session_state.df_crudo
         if df is not None and not df.empty:
             st.dataframe(df.head(3))
+            formatos = df.attrs.get("formatos")
+            if formatos:
+                st.caption(f"Filas leídas: {formatos['moderno']} formato moderno, {formatos['antiguo']} formato antiguo, "
+                           f"{formatos['otro']} sin formato reconocido.")
             cols = df.columns.tolist()
             c1, c2, c3, c4 = st.columns(4)
-            cd = c1.selectbox("Desde", cols, index=2 if len(cols)>2 else 0)
-            ch = c2.selectbox("Hasta", cols, index=3 if len(cols)>3 else 0)
-            ci = c3.selectbox("IBC", cols, index=4 if len(cols)>4 else 0)
-            cs = c4.selectbox("Semanas", cols, index=len(cols)-1)
+            deteccion = detectar_columnas(df)
+            sug = sugerir_columnas(df, deteccion)
+            if deteccion['confianza'] >= UMBRAL_CONFIANZA:
+                st.caption(f"Columnas detectadas automáticamente (confianza {deteccion['confianza']:.0%}). Verifica antes de procesar.")
+            else:
+                st.warning("No fue posible detectar las columnas con certeza. Selecciónalas manualmente.")
+            cd = c1.selectbox("Desde", cols, index=cols.index(sug['desde']))
+            ch = c2.selectbox("Hasta", cols, index=cols.index(sug['hasta']))
+            ci = c3.selectbox("IBC", cols, index=cols.index(sug['ibc']))
+            cs = c4.selectbox("Semanas", cols, index=cols.index(sug['semanas']))
             
             if st.button("Procesar"):
-                clean = limpiar_y_estandarizar(df, cd, ch, ci, cs)
-                if not clean.empty:
-                    st.session_state.df_final = aplicar_regla_simultaneidad(clean)
+                cache = obtener_cache_historias()
+                tipo = CacheHistorias.tipo_final(cd, ch, ci, cs)
+                final = cache.obtener(st.session_state.clave_pdf, tipo)
+                if final is None:
+                    clean = limpiar_y_estandarizar(df, cd, ch, ci, cs)
+                    final = aplicar_regla_simultaneidad(clean) if not clean.empty else None
+                    if final is not None: cache.guardar(st.session_state.clave_pdf, final, tipo)
+                if final is not None:
+                    st.session_state.df_final = final
+                    st.session_state.huella_final = huella_historia(final)
                     st.rerun()
                 else: st.error("Error columnas")
 
 else:
     # --- CÁLCULOS TÉCNICOS ---
     df = st.session_state.df_final
-    liq = LiquidadorPension(df, genero, fecha_nac)
+    if st.session_state.huella_final is None:
+        st.session_state.huella_final = huella_historia(df)
+    huella = st.session_state.huella_final
+    hoy = date.today()
+    clave_liquidacion = (huella, genero, fecha_nac, aplicar_tope, hoy, granularidad)
     
-    fechas_clave = liq.determinar_fechas_clave()
+    # FECHAS CLAVE + LOS DOS IBL (UNA SOLA PASADA DE INDEXACIÓN) + TASA
+    # En modo servicio la liquidación y los regímenes se calculan allá
+    resultado = regimenes = None
+    if SERVICIO_URL and st.session_state.trabajo_servicio:
+        try:
+            resultado = liquidacion_servicio(st.session_state.trabajo_servicio, genero, fecha_nac, aplicar_tope, hoy, granularidad)
+            regimenes = resultado['regimenes']
+        except (RuntimeError, OSError) as e:
+            # Sin el trabajo en el servicio (reinicio, expiración) se sigue en local
+            st.session_state.trabajo_servicio = None
+            st.warning(f"{e}. Se continúa con el cálculo local.")
+    if resultado is None:
+        resultado = liquidar_cacheado(huella, df, genero, fecha_nac, aplicar_tope, hoy, granularidad)
+    fechas_clave = resultado['fechas']
+    ibl_10, det_10 = resultado['ibl_10'], resultado['det_10']
+    ibl_vida, det_vida = resultado['ibl_vida'], resultado['det_vida']
     
-    # CALCULAMOS LOS DOS IBL POR SEPARADO
-    ibl_10, det_10 = liq.calcular_ibl_indexado(fechas_clave['fecha_corte'], "ultimos_10")
-    ibl_vida, det_vida = liq.calcular_ibl_indexado(fechas_clave['fecha_corte'], "toda_vida")
+    ibl_def = resultado['ibl']
+    origen_ibl = resultado['origen_ibl']
     
-    ibl_def = max(ibl_10, ibl_vida)
-    origen_ibl = "Últimos 10 Años" if ibl_10 >= ibl_vida else "Toda la Vida"
-    
-    total_sem = df['Semanas'].sum()
-    mesada, tasa, info = liq.calcular_tasa_reemplazo_797(
-        ibl_def, total_sem, datetime.now().year, aplicar_tope
-    )
+    total_sem = resultado['semanas']
+    mesada, tasa, info = resultado['mesada'], resultado['tasa'], resultado['detalle']
 
     # --- PESTAÑA 1: DIAGNÓSTICO DETALLADO ---
     tab1, tab2 = st.tabs(["📊 DIAGNÓSTICO JURÍDICO", "💰 PROYECCIÓN"])
@@ -274,6 +290,20 @@ else:
                     'IBC_Historico': "${:,.0f}", 'IBC_Actualizado': "${:,.0f}", 'Factor_IPC': "{:.4f}"
                 }))
 
+        # 5. OTROS REGÍMENES (misma historia indexada una sola vez)
+        with st.expander("⚖️ Comparativo de Regímenes"):
+            if regimenes is None:
+                regimenes = regimenes_cacheado(huella, df, genero, fecha_nac, aplicar_tope, hoy, granularidad)
+            st.dataframe(pd.DataFrame([{
+                "Régimen": r["regimen"], "Aplica": "Sí" if r["aplica"] else "No", "Observación": r["razon"],
+                "Semanas Req.": r["semanas_requeridas"],
+                "Estatus": r["fechas"]["fecha_estatus"].strftime('%d/%m/%Y') if r["fechas"]["tiene_estatus"] else "PENDIENTE",
+                "IBL": r["ibl"], "Ventana IBL": r["origen_ibl"], "Tasa": r["tasa"], "Mesada": r["mesada"]
+            } for r in regimenes]).style.format({"IBL": "${:,.0f}", "Tasa": "{:.2f}%", "Mesada": "${:,.0f}"}), hide_index=True)
+            favorable = mas_favorable(regimenes)
+            if favorable:
+                st.caption(f"Régimen más favorable: **{favorable['regimen']}** (mesada ${favorable['mesada']:,.0f}).")
+
     # --- PESTAÑA 2: PROYECCIÓN ---
     with tab2:
         st.subheader("Simulación Financiera")
@@ -291,23 +321,10 @@ else:
             st.metric("Inversión Total", f"${inv:,.0f}")
 
         with c_res:
-            filas = []
-            cur = df['Hasta'].max() + timedelta(days=1)
-            for _ in range(anios*12):
-                filas.append({"Desde": cur, "Hasta": cur+timedelta(days=30), "IBC": nuevo_ibc, "Semanas": 4.29})
-                cur += timedelta(days=31)
-            
-            df_fut = pd.concat([df, pd.DataFrame(filas)], ignore_index=True)
-            liq_f = LiquidadorPension(df_fut, genero, fecha_nac)
-            
-            fechas_fut = liq_f.determinar_fechas_clave()
-            ibl_f = max(liq_f.calcular_ibl_indexado(fechas_fut['fecha_corte'], "ultimos_10")[0], 
-                        liq_f.calcular_ibl_indexado(fechas_fut['fecha_corte'], "toda_vida")[0])
-            
-            mes_f, tasa_f, _ = liq_f.calcular_tasa_reemplazo_797(ibl_f, df_fut['Semanas'].sum(), datetime.now().year+anios, aplicar_tope)
-            
-            delta = mes_f - mesada
-            roi = (inv / delta / 12) if delta > 0 else 0
+            # Motor de escenarios: reutiliza la historia indexada y solo calcula los meses nuevos
+            esc = simular_cacheado(huella, df, genero, fecha_nac, (val,), (anios,), (opcion,), aplicar_tope, mesada, hoy, granularidad).iloc[0]
+            mes_f, tasa_f = esc['mesada'], esc['tasa']
+            delta, roi = esc['delta'], esc['roi']
             
             m1, m2 = st.columns(2)
             m1.metric("Mesada Futura", f"${mes_f:,.0f}", f"+ ${delta:,.0f}")
@@ -322,6 +339,47 @@ else:
                 "inversion": inv, "mesada_fut": mes_f, "delta": delta, "roi": roi
             }
 
+        # BARRIDO COMPLETO DE ESTRATEGIAS (una sola pasada vectorizada)
+        # Un expander ejecuta su contenido aunque esté cerrado: el barrido y la
+        # sensibilidad se calculan a pedido para que un rerun solo pague la
+        # liquidación (en caché)
+        with st.expander("🧭 Barrido de Estrategias (valor x años)"):
+            if st.toggle("Calcular barrido", key="activar_barrido"):
+                valores_cot = np.linspace(SMMLV, 25 * SMMLV, 25)
+                valores_extra = np.linspace(500000, 10000000, 20)
+                barrido = pd.concat([
+                    simular_cacheado(huella, df, genero, fecha_nac, tuple(valores_cot), tuple(range(1, 16)), ("Cotizar Indep.",), aplicar_tope, mesada, hoy, granularidad),
+                    simular_cacheado(huella, df, genero, fecha_nac, tuple(valores_extra), tuple(range(1, 16)), ("Extra",), aplicar_tope, mesada, hoy, granularidad)
+                ], ignore_index=True)
+            
+                mejor = mejor_estrategia(barrido)
+                if mejor is not None:
+                    st.success(
+                        f"Óptimo: **{mejor['estrategia']}** con ${mejor['valor']:,.0f} durante {int(mejor['anios'])} años "
+                        f"→ mesada ${mejor['mesada']:,.0f} (+${mejor['delta']:,.0f}), recuperación en {mejor['roi']:.1f} años"
+                    )
+                else:
+                    st.warning("Ninguna estrategia del barrido mejora la mesada actual.")
+            
+                est_sel = st.radio("Superficie", ["Cotizar Indep.", "Extra"], horizontal=True, key="superficie_estrategia")
+                metrica = st.radio("Métrica", ["mesada", "roi"], horizontal=True, key="superficie_metrica")
+                superficie = barrido[barrido['estrategia'] == est_sel].pivot(index='valor', columns='anios', values=metrica)
+                st.dataframe(superficie.style.format("${:,.0f}" if metrica == "mesada" else "{:.1f}").format_index("${:,.0f}"))
+
+        # SENSIBILIDAD A IPC PROYECTADO Y SMMLV (Monte Carlo sobre la historia ya indexada)
+        with st.expander("📉 Sensibilidad IPC / SMMLV"):
+            s1, s2, s3 = st.columns(3)
+            n_sim = s1.select_slider("Escenarios", [1000, 5000, 10000, 50000], value=10000)
+            desv_ipc = s2.number_input("Desviación IPC (puntos)", 0.0, 10.0, 1.5, 0.5)
+            desv_smmlv = s3.number_input("Desviación SMMLV (%)", 0.0, 20.0, 3.0, 1.0)
+            if st.toggle("Simular escenarios", key="activar_sensibilidad"):
+                sens = sensibilidad_cacheada(huella, df, genero, fecha_nac, aplicar_tope, hoy, granularidad,
+                                             n_sim, desv_ipc, desv_smmlv / 100, 0)
+                st.dataframe(resumir_distribucion(sens).style.format("{:,.2f}"))
+                conteos, bordes = np.histogram(sens['mesada'], bins=30)
+                st.bar_chart(pd.DataFrame({"Escenarios": conteos}, index=pd.Index(bordes[:-1].round(), name="Mesada")), color="#8E44AD")
+                st.caption("IPC 2025-2026 y SMMLV simulados; la mesada de referencia usa los valores de la tabla.")
+
     # --- BOTÓN WORD ---
     st.sidebar.markdown("---")
     
@@ -334,7 +392,36 @@ else:
     }
     
     perfil = {"nombre": nombre, "fecha_nac": fecha_nac.strftime('%d/%m/%Y')}
+    proyeccion_data = proyeccion_data if 'proyeccion_data' in locals() else None
     
-    docx = generar_reporte_completo(perfil, fechas_clave, liq_data, proyeccion_data if 'proyeccion_data' in locals() else None)
+    # El dictamen solo se arma cuando se pide: los reruns no dependen de su tamaño
+    clave_dictamen = (clave_liquidacion, nombre, proyeccion_data and tuple(sorted(proyeccion_data.items())))
+    if st.sidebar.button("📝 Preparar Dictamen"):
+        with st.spinner("Generando dictamen..."):
+            docx = None
+            if SERVICIO_URL and st.session_state.trabajo_servicio:
+                try:
+                    docx = ClienteServicio(SERVICIO_URL).dictamen(
+                        st.session_state.trabajo_servicio, perfil, genero, fecha_nac, aplicar_tope, granularidad, proyeccion_data
+                    )
+                except (RuntimeError, OSError) as e:
+                    st.sidebar.warning(f"{e}. Dictamen generado localmente.")
+            if docx is None:
+                docx = dictamen_cacheado(clave_liquidacion, perfil, proyeccion_data, fechas_clave, liq_data)
+        st.session_state.dictamen = (clave_dictamen, docx)
     
-    st.sidebar.download_button("📥 Descargar Dictamen (Word)", docx, f"Dictamen_{nombre}.docx", "application/vnd.openxmlformats-officedocument.wordprocessingml.document")
+    dictamen = st.session_state.get('dictamen')
+    if dictamen and dictamen[0] == clave_dictamen:
+        st.sidebar.download_button("📥 Descargar Dictamen (Word)", dictamen[1], f"Dictamen_{nombre}.docx", MIME_DOCX)
+    elif dictamen:
+        st.sidebar.caption("Los datos cambiaron: prepara de nuevo el dictamen.")
+
+# --- PANEL DE RENDIMIENTO (solo con LIQUIDADOR_INSTRUMENTACION activa) ---
+if instrumentacion.esta_activa():
+    with st.sidebar.expander("⏱️ Rendimiento"):
+        if medidas_rerun:
+            st.dataframe(instrumentacion.resumen(medidas_rerun).style.format(
+                {"segundos": "{:.3f}", "promedio_ms": "{:.1f}", "memoria_pico_kb": "{:,.0f}"}, na_rep="-"
+            ))
+        else:
+            st.caption("Sin etapas ejecutadas en este rerun (resultados en caché).")
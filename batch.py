@@ -0,0 +1,309 @@
+"""
+Modo lote (sin interfaz) para liquidar portafolios completos de afiliados.
+
+Uso:
+    python batch.py carpeta_pdfs/ --genero Masculino --fecha-nacimiento 1960-05-01 -o resumen.csv
+    python batch.py manifiesto.csv -o resumen.parquet --workers 8
+    python batch.py manifiesto.csv --dictamenes dictamenes.zip
+    python batch.py manifiesto.csv --almacen portafolio/
+
+El manifiesto es un CSV con columnas: archivo, genero, fecha_nacimiento
+y opcionalmente nombre. Las rutas relativas se resuelven desde la carpeta
+del manifiesto.
+"""
+import argparse
+import csv
+import os
+import sys
+import time
+from contextlib import closing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pandas as pd
+
+from data_processor import extraer_tabla_cruda, limpiar_y_estandarizar, aplicar_regla_simultaneidad, detectar_columnas, UMBRAL_CONFIANZA
+from logic import EDAD_797, LiquidadorPension
+from historia import HistoriaLaboral
+from cache_historias import CacheHistorias
+from exportacion import exportar_dictamenes
+from almacen import AlmacenHistorias
+from reporte import datos_liquidacion
+
+CAMPOS_RESUMEN = [
+    "archivo", "nombre", "estado", "error", "periodos", "semanas",
+    "fecha_estatus", "fecha_corte", "ibl_10", "ibl_vida", "ibl", "origen_ibl",
+    "tasa", "mesada", "cache", "segundos"
+]
+
+def _fecha_texto(fecha):
+    return pd.Timestamp(fecha).strftime('%Y-%m-%d') if fecha is not None else ""
+
+def cargar_tareas(entrada, genero=None, fecha_nacimiento=None):
+    """
+    Construye la lista de tareas desde una carpeta de PDFs (mismos datos
+    para todos) o desde un manifiesto CSV con datos por archivo.
+    """
+    tareas = []
+    if os.path.isdir(entrada):
+        if not genero or not fecha_nacimiento:
+            raise ValueError("Con una carpeta se requieren --genero y --fecha-nacimiento")
+        for nombre in sorted(os.listdir(entrada)):
+            if nombre.lower().endswith(".pdf"):
+                tareas.append({
+                    "archivo": os.path.join(entrada, nombre),
+                    "nombre": os.path.splitext(nombre)[0],
+                    "genero": genero,
+                    "fecha_nacimiento": fecha_nacimiento
+                })
+        return tareas
+
+    base = os.path.dirname(os.path.abspath(entrada))
+    with open(entrada, newline='', encoding='utf-8-sig') as f:
+        for fila in csv.DictReader(f):
+            ruta = fila["archivo"].strip()
+            tareas.append({
+                "archivo": ruta if os.path.isabs(ruta) else os.path.join(base, ruta),
+                "nombre": (fila.get("nombre") or "").strip() or os.path.splitext(os.path.basename(ruta))[0],
+                "genero": (fila.get("genero") or "").strip() or genero,
+                "fecha_nacimiento": (fila.get("fecha_nacimiento") or "").strip() or fecha_nacimiento
+            })
+    return tareas
+
+def _historia_limpia(df_crudo):
+    cols = detectar_columnas(df_crudo)
+    if cols["confianza"] < UMBRAL_CONFIANZA:
+        raise ValueError(f"Mapeo de columnas no confiable ({cols['confianza']:.0%})")
+    limpio = limpiar_y_estandarizar(df_crudo, cols["desde"], cols["hasta"], cols["ibc"], cols["semanas"])
+    if limpio.empty:
+        raise ValueError("Sin periodos válidos tras la limpieza")
+    return aplicar_regla_simultaneidad(limpio)
+
+def historia_desde_pdf(archivo, directorio_cache=None):
+    """
+    Historia limpia (mapeo automático de columnas) de un PDF, ruta o archivo
+    en memoria. Devuelve (df_final, estado_cache): 'hit', 'miss' o '' sin caché.
+    """
+    if directorio_cache:
+        cache = CacheHistorias(directorio_cache)
+        clave = cache.clave(archivo)
+        # La historia limpia con el mapeo automático se guarda como 'final-auto'
+        df_final = cache.obtener(clave, "final-auto")
+        if df_final is not None: return df_final, "hit"
+        df_crudo, _ = cache.obtener_o_extraer(archivo)
+        if df_crudo.empty:
+            raise ValueError("No se encontró la tabla de semanas cotizadas")
+        df_final = _historia_limpia(df_crudo)
+        cache.guardar(clave, df_final, "final-auto")
+        return df_final, "miss"
+
+    df_crudo = extraer_tabla_cruda(archivo)
+    if df_crudo.empty:
+        raise ValueError("No se encontró la tabla de semanas cotizadas")
+    return _historia_limpia(df_crudo), ""
+
+def procesar_archivo(tarea, limitar_semanas_cotizadas=True, directorio_cache=None, con_registro=False, con_historia=False):
+    """
+    Ejecuta el flujo completo para un PDF. Nunca lanza excepción:
+    los errores quedan registrados en la fila de resumen.
+    Con directorio_cache, un PDF ya visto no se vuelve a parsear.
+    Con con_registro, la fila incluye en 'registro' los datos del dictamen.
+    Con con_historia, incluye en 'historia' la HistoriaLaboral limpia.
+    """
+    inicio = time.perf_counter()
+    fila = dict.fromkeys(CAMPOS_RESUMEN, "")
+    fila.update({"archivo": tarea["archivo"], "nombre": tarea["nombre"], "estado": "ok"})
+    try:
+        # Un género desconocido cambiaría en silencio la edad y las semanas mínimas
+        if tarea["genero"] not in EDAD_797:
+            raise ValueError(f"Género no válido: '{tarea['genero'] or ''}' (use {' o '.join(EDAD_797)})")
+        df_final, fila["cache"] = historia_desde_pdf(tarea["archivo"], directorio_cache)
+
+        # Los cálculos corren sobre la historia compacta (arreglos tipados)
+        historia = HistoriaLaboral.desde_dataframe(df_final)
+        del df_final
+        liq = LiquidadorPension(historia, tarea["genero"], tarea["fecha_nacimiento"])
+        res = liq.liquidar(limitar_semanas_cotizadas)
+        fechas = res["fechas"]
+        fila.update({
+            "periodos": len(historia),
+            "semanas": round(float(res["semanas"]), 2),
+            "fecha_estatus": _fecha_texto(fechas["fecha_estatus"]),
+            "fecha_corte": _fecha_texto(fechas["fecha_corte"]),
+            "ibl_10": round(res["ibl_10"], 2),
+            "ibl_vida": round(res["ibl_vida"], 2),
+            "ibl": round(res["ibl"], 2),
+            "origen_ibl": res["origen_ibl"],
+            "tasa": round(float(res["tasa"]), 4),
+            "mesada": round(float(res["mesada"]), 2)
+        })
+        if con_historia:
+            fila["historia"] = historia
+        if con_registro:
+            fila["registro"] = {
+                "perfil": {"nombre": tarea["nombre"], "fecha_nac": pd.Timestamp(tarea["fecha_nacimiento"]).strftime('%d/%m/%Y')},
+                "fechas": fechas,
+                "liq_data": datos_liquidacion(res)
+            }
+    except Exception as e:
+        fila["estado"] = "error"
+        fila["error"] = f"{type(e).__name__}: {e}"
+    fila["segundos"] = round(time.perf_counter() - inicio, 4)
+    return fila
+
+def _fila_error(tarea, error):
+    fila = dict.fromkeys(CAMPOS_RESUMEN, "")
+    fila.update({"archivo": tarea["archivo"], "nombre": tarea["nombre"], "estado": "error",
+                 "error": f"{type(error).__name__}: {error}", "segundos": 0.0})
+    return fila
+
+class _EscritorCSV:
+    def __init__(self, ruta):
+        self._f = open(ruta, "w", newline='', encoding='utf-8')
+        self._w = csv.DictWriter(self._f, fieldnames=CAMPOS_RESUMEN)
+        self._w.writeheader()
+
+    def escribir(self, fila):
+        self._w.writerow(fila)
+        self._f.flush()
+
+    def cerrar(self):
+        self._f.close()
+
+class _EscritorParquet:
+    """Escribe por lotes con pyarrow (dependencia opcional)."""
+    def __init__(self, ruta, filas_por_lote=256):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ImportError("La salida Parquet requiere pyarrow (pip install pyarrow)")
+        self._pa = pa
+        self._schema = pa.schema([(c, pa.string()) for c in CAMPOS_RESUMEN])
+        self._w = pq.ParquetWriter(ruta, self._schema)
+        self._lote = []
+        self._filas_por_lote = filas_por_lote
+
+    def escribir(self, fila):
+        self._lote.append({k: str(v) for k, v in fila.items()})
+        if len(self._lote) >= self._filas_por_lote:
+            self._volcar()
+
+    def _volcar(self):
+        if self._lote:
+            self._w.write_table(self._pa.Table.from_pylist(self._lote, schema=self._schema))
+            self._lote = []
+
+    def cerrar(self):
+        self._volcar()
+        self._w.close()
+
+def ejecutar_lote(tareas, salida, workers=None, limitar_semanas_cotizadas=True, progreso=None, directorio_cache=None,
+                  destino_dictamenes=None, directorio_almacen=None):
+    """
+    Procesa las tareas en un pool de procesos y escribe el resumen a medida
+    que llegan los resultados (CSV o Parquet según la extensión de salida).
+    Con destino_dictamenes (.zip o carpeta) genera además los dictámenes Word.
+    Con directorio_almacen agrega las historias limpias al almacén columnar
+    (los afiliados que ya estén en él o repetidos en las tareas se omiten);
+    el almacén solo se publica si el lote termina sin interrupciones.
+    Devuelve estadísticas de rendimiento del lote.
+    """
+    escritor = _EscritorParquet(salida) if salida.lower().endswith(".parquet") else _EscritorCSV(salida)
+    inicio = time.perf_counter()
+    conteo = {"ok": 0, "errores": 0, "hits": 0}
+    almacen = AlmacenHistorias(directorio_almacen) if directorio_almacen else None
+
+    def registros():
+        """Procesa las tareas y entrega los datos de cada dictamen en cuanto su fila está lista"""
+        escritor_almacen = almacen.escritor().abrir() if almacen is not None else None
+        # Un archivo repetido en el manifiesto se agrega al almacén una sola vez
+        agregados = set()
+        completo = False
+        try:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                futuros = [
+                    pool.submit(procesar_archivo, t, limitar_semanas_cotizadas, directorio_cache,
+                                destino_dictamenes is not None, almacen is not None)
+                    for t in tareas
+                ]
+                por_futuro = dict(zip(futuros, tareas))
+                for i, fut in enumerate(as_completed(futuros), 1):
+                    try:
+                        fila = fut.result()
+                    except Exception as e:
+                        # Un worker caído (BrokenProcessPool) no debe perder las filas ya escritas
+                        fila = _fila_error(por_futuro[fut], e)
+                    registro = fila.pop("registro", None)
+                    historia = fila.pop("historia", None)
+                    if historia is not None and fila["archivo"] not in almacen and fila["archivo"] not in agregados:
+                        tarea = por_futuro[fut]
+                        escritor_almacen.agregar(fila["archivo"], historia, tarea["genero"], tarea["fecha_nacimiento"], tarea["nombre"])
+                        agregados.add(fila["archivo"])
+                    escritor.escribir(fila)
+                    conteo["ok" if fila["estado"] == "ok" else "errores"] += 1
+                    if fila["cache"] == "hit": conteo["hits"] += 1
+                    if progreso: progreso(i, len(tareas), fila)
+                    if registro is not None: yield registro
+            completo = True
+        finally:
+            escritor.cerrar()
+            # Un lote interrumpido no publica un almacén parcial
+            if escritor_almacen is not None: escritor_almacen.cerrar(publicar=completo)
+
+    dictamenes = None
+    if destino_dictamenes is not None:
+        # Los registros (con sus tablas de soporte) pasan al exportador a
+        # medida que llegan en lugar de acumularse hasta el final del lote
+        with closing(registros()) as fuente:
+            _, dictamenes = exportar_dictamenes(fuente, destino_dictamenes, workers)
+    else:
+        for _ in registros(): pass
+
+    total = time.perf_counter() - inicio
+    return {
+        "archivos": len(tareas), "ok": conteo["ok"], "errores": conteo["errores"], "cache_hits": conteo["hits"],
+        "segundos": total,
+        "archivos_por_segundo": (len(tareas) / total) if total > 0 else 0.0,
+        "dictamenes": dictamenes
+    }
+
+def _imprimir_progreso(i, total, fila):
+    detalle = f"{fila['segundos']:.2f}s" if fila["estado"] == "ok" else fila["error"]
+    print(f"[{i}/{total}] {fila['estado'].upper():5} {os.path.basename(fila['archivo'])} ({detalle})", file=sys.stderr)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Liquidación pensional en lote desde PDFs de historia laboral.")
+    parser.add_argument("entrada", help="Carpeta con PDFs o manifiesto CSV")
+    parser.add_argument("-o", "--salida", default="resumen_liquidaciones.csv", help="Archivo .csv o .parquet")
+    parser.add_argument("--workers", type=int, default=None, help="Procesos en paralelo (por defecto: núcleos)")
+    parser.add_argument("--genero", choices=list(EDAD_797), help="Género por defecto")
+    parser.add_argument("--fecha-nacimiento", help="Fecha de nacimiento por defecto (AAAA-MM-DD)")
+    parser.add_argument("--sin-tope", action="store_true", help="No limitar a 1800 semanas")
+    parser.add_argument("--cache", metavar="DIR", help="Caché en disco de historias ya parseadas")
+    parser.add_argument("--dictamenes", metavar="DESTINO", help="Genera los dictámenes Word en un .zip o carpeta")
+    parser.add_argument("--almacen", metavar="DIR", help="Agrega las historias limpias a un almacén columnar")
+    args = parser.parse_args(argv)
+
+    tareas = cargar_tareas(args.entrada, args.genero, args.fecha_nacimiento)
+    if not tareas:
+        parser.error("No se encontraron PDFs para procesar")
+
+    stats = ejecutar_lote(tareas, args.salida, args.workers, not args.sin_tope, _imprimir_progreso, args.cache, args.dictamenes, args.almacen)
+    print(
+        f"{stats['archivos']} archivos ({stats['ok']} ok, {stats['errores']} con error, {stats['cache_hits']} desde caché) "
+        f"en {stats['segundos']:.2f}s -> {stats['archivos_por_segundo']:.2f} archivos/s. Resumen: {args.salida}",
+        file=sys.stderr
+    )
+    if stats["dictamenes"]:
+        d = stats["dictamenes"]
+        # Sin dictámenes generados no hay medida de memoria
+        memoria = f"{d['memoria_pico_kb']:,.0f} KB" if d["memoria_pico_kb"] is not None else "n/d"
+        print(
+            f"{d['documentos']} dictámenes ({d['errores']} con error) en {d['segundos']:.2f}s -> "
+            f"{d['documentos_por_segundo']:.2f} docs/s, memoria pico {memoria}. Destino: {args.dictamenes}",
+            file=sys.stderr
+        )
+    return 0 if stats["errores"] == 0 else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,152 @@
+"""
+Benchmarks de las rutas críticas del liquidador.
+
+Uso (desde la raíz del repositorio):
+    python -m benchmarks.ejecutar -o resultados.json
+    python -m benchmarks.ejecutar --tamanos 50 500 5000 --comparar base.json
+
+Mide cada etapa del flujo sobre historias sintéticas de distintos tamaños
+y guarda un JSON con el commit evaluado. Con --comparar se contrasta contra
+un JSON anterior y se sale con código 1 si alguna etapa empeora más que el
+umbral.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+from benchmarks.generador import fixtures, leer_texto
+from data_processor import (extraer_tabla_cruda, construir_tabla_cruda, limpiar_y_estandarizar,
+                            aplicar_regla_simultaneidad, sugerir_columnas)
+from logic import LiquidadorPension
+from reporte import datos_liquidacion, generar_reporte_completo
+
+TAMANOS = [50, 500, 5000, 50000]
+
+def _commit():
+    try:
+        raiz = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], cwd=raiz, capture_output=True, text=True, check=True).stdout.strip()
+        sucio = bool(subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=raiz,
+                                    capture_output=True, text=True, check=True).stdout.strip())
+        return commit, sucio
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+
+def _medir(funcion, repeticiones):
+    """Ejecuta 'funcion' varias veces; devuelve (tiempos, último resultado)"""
+    tiempos = []
+    resultado = None
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        resultado = funcion()
+        tiempos.append(time.perf_counter() - inicio)
+    return tiempos, resultado
+
+def medir_tamano(filas, repeticiones=3, directorio=None, max_filas_pdf=5000, semilla=0):
+    """Tiempos de todas las etapas para una historia de 'filas' líneas"""
+    rutas = fixtures(directorio, filas, semilla, con_pdf=filas <= max_filas_pdf)
+    medidas = []
+
+    def registrar(etapa, n, funcion):
+        tiempos, resultado = _medir(funcion, repeticiones)
+        medidas.append({
+            "etapa": etapa, "filas": filas, "filas_entrada": n, "repeticiones": repeticiones,
+            "mediana_s": statistics.median(tiempos), "minimo_s": min(tiempos)
+        })
+        return resultado
+
+    # La extracción del PDF solo se mide hasta max_filas_pdf (pdfplumber domina en tamaños grandes)
+    if rutas["pdf"]:
+        registrar("extraer_tabla_cruda", filas, lambda: extraer_tabla_cruda(rutas["pdf"]))
+    lineas = leer_texto(rutas["texto"])
+    df_crudo = registrar("construir_tabla_cruda", len(lineas), lambda: construir_tabla_cruda(lineas))
+
+    cols = sugerir_columnas(df_crudo)
+    limpio = registrar("limpiar_y_estandarizar", len(df_crudo),
+                       lambda: limpiar_y_estandarizar(df_crudo, cols["desde"], cols["hasta"], cols["ibc"], cols["semanas"]))
+    final = registrar("aplicar_regla_simultaneidad", len(limpio), lambda: aplicar_regla_simultaneidad(limpio.copy()))
+
+    # Instancia nueva en cada repetición: sin reutilizar el orden ya calculado
+    nueva = lambda: LiquidadorPension(final, "Masculino", "1962-03-15")
+    fechas = registrar("determinar_fechas_clave", len(final), lambda: nueva().determinar_fechas_clave())
+    ibl, det_vida = registrar("calcular_ibl_indexado", len(final),
+                              lambda: nueva().calcular_ibl_indexado(fechas["fecha_corte"]))
+    semanas = final["Semanas"].sum()
+    registrar("calcular_tasa_reemplazo_797", len(final), lambda: nueva().calcular_tasa_reemplazo_797(ibl, semanas, fechas["fecha_corte"].year))
+
+    res = nueva().liquidar()
+    liq_data = datos_liquidacion(res)
+    perfil = {"nombre": "Afiliado Sintético", "fecha_nac": "15/03/1962"}
+    registrar("generar_reporte_completo", len(final),
+              lambda: generar_reporte_completo(perfil, res["fechas"], liq_data).getvalue())
+    return medidas
+
+def ejecutar(tamanos=TAMANOS, repeticiones=3, directorio=None, max_filas_pdf=5000, progreso=None):
+    directorio = directorio or os.path.join(tempfile.gettempdir(), "liquidador-benchmarks")
+    commit, sucio = _commit()
+    resultados = []
+    for filas in tamanos:
+        medidas = medir_tamano(filas, repeticiones, directorio, max_filas_pdf)
+        resultados.extend(medidas)
+        if progreso: progreso(filas, medidas)
+    return {
+        "commit": commit, "sucio": sucio, "fecha": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(), "plataforma": platform.platform(),
+        "repeticiones": repeticiones, "resultados": resultados
+    }
+
+def comparar(actual, base, umbral=1.25):
+    """Filas (etapa, filas, base, actual, razón, regresión) entre dos corridas"""
+    previas = {(r["etapa"], r["filas"]): r["mediana_s"] for r in base["resultados"]}
+    filas = []
+    for r in actual["resultados"]:
+        previo = previas.get((r["etapa"], r["filas"]))
+        if not previo: continue
+        razon = r["mediana_s"] / previo
+        filas.append({
+            "etapa": r["etapa"], "filas": r["filas"], "base_s": previo, "actual_s": r["mediana_s"],
+            "razon": razon, "regresion": razon > umbral
+        })
+    return filas
+
+def _imprimir(filas, medidas):
+    for m in medidas:
+        print(f"{filas:>7} {m['etapa']:<30} {m['mediana_s'] * 1000:>10.2f} ms", file=sys.stderr)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks del liquidador pensional.")
+    parser.add_argument("-o", "--salida", default="benchmark.json", help="JSON de resultados")
+    parser.add_argument("--tamanos", type=int, nargs="+", default=TAMANOS, help="Filas por historia")
+    parser.add_argument("--repeticiones", type=int, default=3)
+    parser.add_argument("--fixtures", metavar="DIR", help="Carpeta de fixtures (se reutilizan entre corridas)")
+    parser.add_argument("--max-filas-pdf", type=int, default=5000, help="Tamaño máximo para medir la extracción del PDF")
+    parser.add_argument("--comparar", metavar="JSON", help="Resultados anteriores contra los que comparar")
+    parser.add_argument("--umbral", type=float, default=1.25, help="Razón actual/base que cuenta como regresión")
+    args = parser.parse_args(argv)
+
+    actual = ejecutar(args.tamanos, args.repeticiones, args.fixtures, args.max_filas_pdf, _imprimir)
+    with open(args.salida, "w", encoding="utf-8") as f:
+        json.dump(actual, f, indent=2, ensure_ascii=False)
+    print(f"Resultados ({actual['commit'] or 'sin commit'}) en {args.salida}", file=sys.stderr)
+
+    if args.comparar:
+        with open(args.comparar, encoding="utf-8") as f:
+            base = json.load(f)
+        filas = comparar(actual, base, args.umbral)
+        print(f"Comparación contra {base.get('commit') or args.comparar}:", file=sys.stderr)
+        for c in filas:
+            marca = "REGRESIÓN" if c["regresion"] else ""
+            print(f"{c['filas']:>7} {c['etapa']:<30} {c['base_s'] * 1000:>10.2f} -> {c['actual_s'] * 1000:>10.2f} ms "
+                  f"(x{c['razon']:.2f}) {marca}", file=sys.stderr)
+        if any(c["regresion"] for c in filas): return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,110 @@
+"""
+Generador de historias laborales sintéticas para los benchmarks.
+
+Produce las líneas de la sección 'RESUMEN DE SEMANAS COTIZADAS' en los dos
+formatos que maneja data_processor:
+- antiguo (antes de 1995): texto libre, periodos de varios meses y semanas
+  dañadas ("999,00", "0,00");
+- moderno: CSV entre comillas, un periodo mensual por empleador.
+Con esas líneas se arman fixtures en texto plano y en PDF (matplotlib).
+"""
+import math
+import os
+
+import numpy as np
+import pandas as pd
+
+ENCABEZADO = [
+    "REPORTE DE SEMANAS COTIZADAS EN PENSIONES",
+    "Nombre: AFILIADO SINTETICO",
+    "RESUMEN DE SEMANAS COTIZADAS POR EMPLEADOR",
+    "Identificación Aportante Nombre Desde Hasta Salario Semanas Lic Sim Total",
+]
+PIE = "DETALLE DE PAGOS EFECTUADOS ANTERIORES A 1995"
+
+def _pesos(valor):
+    return f"${int(valor):,}".replace(",", ".")
+
+def _semanas(valor):
+    return f"{valor:.2f}".replace(".", ",")
+
+def generar_lineas(anios=30, empleadores=1, anio_inicio=1982, filas_legado=10, semilla=0):
+    """
+    Líneas de una historia de 'anios' años desde 'anio_inicio': primero
+    'filas_legado' periodos antiguos (hasta 1994) y luego un periodo mensual
+    por cada uno de los 'empleadores' simultáneos.
+    """
+    rng = np.random.default_rng(semilla)
+    lineas = []
+    desde = pd.Timestamp(anio_inicio, 1, 1)
+    fin = pd.Timestamp(anio_inicio + anios, 1, 1)
+
+    for i in range(filas_legado):
+        if desde.year >= 1995 or desde >= fin: break
+        hasta = min(desde + pd.Timedelta(days=int(rng.integers(60, 500))), pd.Timestamp(1994, 12, 31))
+        sem = rng.choice(["0,00", "999,00", _semanas((hasta - desde).days / 7)], p=[0.15, 0.15, 0.7])
+        lineas.append(
+            f"EMPRESA ANTIGUA {i} LTDA {desde:%d/%m/%Y} {hasta:%d/%m/%Y} "
+            f"{_pesos(rng.integers(20, 400) * 1000)} {sem} 0,00 0,00 {sem}"
+        )
+        desde = hasta + pd.Timedelta(days=1)
+
+    meses = pd.date_range(max(desde, pd.Timestamp(1995, 1, 1)), fin, freq="MS", inclusive="left")
+    nits = 800000000 + np.arange(empleadores)
+    for inicio_mes in meses:
+        fin_mes = inicio_mes + pd.offsets.MonthEnd(0)
+        salarios = rng.integers(900, 9000, size=empleadores) * 1000
+        for nit, salario in zip(nits, salarios):
+            lineas.append(
+                f'"{nit}","EMPRESA MODERNA {nit % 1000} SAS","{inicio_mes:%d/%m/%Y}","{fin_mes:%d/%m/%Y}",'
+                f'"{_pesos(salario)}","4,29","0,00","0,00","4,29"'
+            )
+    return lineas
+
+def lineas_por_filas(filas, anios=40, filas_legado=10, semilla=0):
+    """Historia de exactamente 'filas' líneas: los empleadores crecen con el tamaño pedido"""
+    # Solo los años desde 1995 tienen un periodo mensual por empleador
+    anio_inicio = 2025 - anios
+    meses = (2025 - max(anio_inicio, 1995)) * 12
+    empleadores = max(1, math.ceil(max(filas - filas_legado, 1) / meses))
+    lineas = generar_lineas(anios, empleadores, anio_inicio, filas_legado, semilla)
+    return lineas[:filas]
+
+def escribir_texto(ruta, lineas):
+    """Fixture de texto plano con los mismos marcadores que el PDF"""
+    with open(ruta, "w", encoding="utf-8") as f:
+        f.write("\n".join(ENCABEZADO + list(lineas) + [PIE]) + "\n")
+    return ruta
+
+def leer_texto(ruta):
+    """Líneas de la sección de un fixture de texto (entre los marcadores)"""
+    with open(ruta, encoding="utf-8") as f:
+        lineas = f.read().splitlines()
+    return lineas[len(ENCABEZADO):lineas.index(PIE)]
+
+def escribir_pdf(ruta, lineas, lineas_por_pagina=45):
+    """Fixture PDF con texto extraíble (una línea por renglón)"""
+    from matplotlib.backends.backend_pdf import PdfPages
+    from matplotlib.figure import Figure
+
+    todas = ENCABEZADO + list(lineas) + [PIE]
+    with PdfPages(ruta) as pdf:
+        for i in range(0, len(todas), lineas_por_pagina):
+            fig = Figure(figsize=(8.5, 11))
+            for j, linea in enumerate(todas[i:i + lineas_por_pagina]):
+                fig.text(0.02, 0.97 - j * 0.021, linea, fontsize=5, family="monospace")
+            pdf.savefig(fig)
+    return ruta
+
+def fixtures(directorio, filas, semilla=0, con_pdf=True):
+    """Crea (o reutiliza) los fixtures de un tamaño y devuelve sus rutas"""
+    os.makedirs(directorio, exist_ok=True)
+    base = os.path.join(directorio, f"historia_{filas}_{semilla}")
+    rutas = {"texto": base + ".txt", "pdf": base + ".pdf" if con_pdf else None}
+    lineas = None
+    if not os.path.exists(rutas["texto"]):
+        lineas = lineas_por_filas(filas, semilla=semilla)
+        escribir_texto(rutas["texto"], lineas)
+    if con_pdf and not os.path.exists(rutas["pdf"]):
+        escribir_pdf(rutas["pdf"], lineas if lineas is not None else leer_texto(rutas["texto"]))
+    return rutas
@@ -0,0 +1,160 @@
+"""
+Caché persistente en disco de historias laborales ya procesadas.
+
+La clave es el SHA-256 de los bytes del PDF más la versión del parser, así
+que un mismo archivo (aunque cambie de nombre) nunca se vuelve a parsear y
+un cambio en el parser invalida automáticamente todo lo guardado.
+Cada entrada es un .npz comprimido con un arreglo por columna.
+"""
+import hashlib
+import os
+
+import numpy as np
+import pandas as pd
+
+from data_processor import VERSION_PARSER, extraer_tabla_cruda
+
+DIRECTORIO_POR_DEFECTO = os.environ.get(
+    "LIQUIDADOR_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "liquidador-pension")
+)
+MAX_BYTES_POR_DEFECTO = 512 * 1024 * 1024
+
+def _leer_bytes(archivo_pdf):
+    if isinstance(archivo_pdf, (bytes, bytearray)): return bytes(archivo_pdf)
+    if isinstance(archivo_pdf, (str, os.PathLike)):
+        with open(archivo_pdf, "rb") as f: return f.read()
+    if hasattr(archivo_pdf, "getvalue"): return archivo_pdf.getvalue()
+    archivo_pdf.seek(0)
+    contenido = archivo_pdf.read()
+    archivo_pdf.seek(0)
+    return contenido
+
+def _df_a_arreglos(df):
+    """Serializa un DataFrame como arreglos tipados (sin pickle)"""
+    arreglos = {"__columnas__": np.array([str(c) for c in df.columns]), "__tipos__": []}
+    for i, col in enumerate(df.columns):
+        serie = df[col]
+        if isinstance(serie.dtype, pd.PeriodDtype):
+            arreglos["__tipos__"].append(f"periodo:{serie.dtype.name[len('period['):-1]}")
+            arreglos[f"c{i}"] = serie.array.asi8
+        elif serie.dtype.kind in "biufcmM":
+            arreglos["__tipos__"].append("numerico")
+            arreglos[f"c{i}"] = serie.to_numpy()
+        else:
+            # Texto / categorías / objetos: cadenas + máscara de nulos
+            nulos = serie.isna().to_numpy()
+            arreglos["__tipos__"].append("texto")
+            arreglos[f"c{i}"] = np.where(nulos, "", serie.astype(object).where(~nulos, "").astype(str)).astype(str)
+            arreglos[f"n{i}"] = nulos
+    arreglos["__tipos__"] = np.array(arreglos["__tipos__"])
+    # Conteo de filas por formato de la tabla cruda (df.attrs['formatos'])
+    if "formatos" in df.attrs:
+        arreglos["__formatos__"] = np.array(list(df.attrs["formatos"]))
+        arreglos["__conteos__"] = np.array(list(df.attrs["formatos"].values()), dtype=np.int64)
+    return arreglos
+
+def _arreglos_a_df(datos):
+    columnas = {}
+    for i, (nombre, tipo) in enumerate(zip(datos["__columnas__"].tolist(), datos["__tipos__"].tolist())):
+        valores = datos[f"c{i}"]
+        if tipo.startswith("periodo:"):
+            columnas[nombre] = pd.PeriodIndex.from_ordinals(valores, freq=tipo.split(":", 1)[1])
+        elif tipo == "numerico":
+            columnas[nombre] = valores
+        else:
+            columnas[nombre] = [None if nulo else v for v, nulo in zip(valores.tolist(), datos[f"n{i}"].tolist())]
+    df = pd.DataFrame(columnas)
+    if "__formatos__" in datos.files:
+        df.attrs["formatos"] = dict(zip(datos["__formatos__"].tolist(), datos["__conteos__"].tolist()))
+    return df
+
+class CacheHistorias:
+    """
+    Caché LRU acotada por tamaño. Guarda la tabla cruda ('crudo') y, si se
+    quiere, la historia limpia para un mapeo de columnas dado ('final-...').
+    """
+    def __init__(self, directorio=None, max_bytes=MAX_BYTES_POR_DEFECTO):
+        self.directorio = directorio or DIRECTORIO_POR_DEFECTO
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(self.directorio, exist_ok=True)
+
+    def clave(self, archivo_pdf):
+        """SHA-256 del contenido del PDF + versión del parser"""
+        h = hashlib.sha256(f"parser-{VERSION_PARSER}:".encode())
+        h.update(_leer_bytes(archivo_pdf))
+        return h.hexdigest()
+
+    def _ruta(self, clave, tipo):
+        return os.path.join(self.directorio, f"{clave}.{tipo}.npz")
+
+    def obtener(self, clave, tipo="crudo"):
+        ruta = self._ruta(clave, tipo)
+        try:
+            with np.load(ruta, allow_pickle=False) as datos:
+                df = _arreglos_a_df(datos)
+            os.utime(ruta)  # Marca de uso reciente para el LRU
+        except (OSError, KeyError, ValueError):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return df
+
+    def guardar(self, clave, df, tipo="crudo"):
+        ruta = self._ruta(clave, tipo)
+        temporal = f"{ruta}.{os.getpid()}.tmp"
+        with open(temporal, "wb") as f:
+            np.savez_compressed(f, **_df_a_arreglos(df))
+        os.replace(temporal, ruta)
+        self._desalojar()
+
+    def _entradas(self):
+        entradas = []
+        for nombre in os.listdir(self.directorio):
+            if not nombre.endswith(".npz"): continue
+            try:
+                st = os.stat(os.path.join(self.directorio, nombre))
+            except OSError:
+                continue
+            entradas.append((st.st_mtime, st.st_size, nombre))
+        return entradas
+
+    def _desalojar(self):
+        """Borra las entradas menos usadas hasta quedar bajo max_bytes"""
+        entradas = sorted(self._entradas())
+        total = sum(tam for _, tam, _ in entradas)
+        for _, tam, nombre in entradas:
+            if total <= self.max_bytes: break
+            try:
+                os.remove(os.path.join(self.directorio, nombre))
+            except OSError:
+                pass
+            total -= tam
+
+    def obtener_o_extraer(self, archivo_pdf, workers=None):
+        """
+        Devuelve (df_crudo, clave). Solo parsea el PDF si no está en caché.
+        """
+        contenido = _leer_bytes(archivo_pdf)
+        clave = self.clave(contenido)
+        df = self.obtener(clave)
+        if df is None:
+            df = extraer_tabla_cruda(archivo_pdf, workers)
+            self.guardar(clave, df)
+        return df, clave
+
+    @staticmethod
+    def tipo_final(col_desde, col_hasta, col_ibc, col_semanas):
+        """Tipo de entrada para la historia limpia según el mapeo de columnas"""
+        mapeo = "|".join(str(c) for c in (col_desde, col_hasta, col_ibc, col_semanas))
+        return "final-" + hashlib.sha256(mapeo.encode()).hexdigest()[:12]
+
+    def estadisticas(self):
+        entradas = self._entradas()
+        consultas = self.hits + self.misses
+        return {
+            "hits": self.hits, "misses": self.misses,
+            "tasa_aciertos": (self.hits / consultas) if consultas else 0.0,
+            "entradas": len(entradas), "bytes": sum(tam for _, tam, _ in entradas)
+        }
@@ -1,167 +1,480 @@
 import pdfplumber
 import pandas as pd
+import numpy as np
 import re
+import io
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from itertools import zip_longest
 
-def extraer_tabla_cruda(archivo_pdf):
+from instrumentacion import medir
+from historia import HistoriaLaboral
+
+# Incrementar cuando cambie la salida del parser, la detección o la limpieza:
+# invalida las historias guardadas en cache_historias
+VERSION_PARSER = 3
+
+# Marcadores que delimitan la tabla principal del reporte de Colpensiones
+MARCADOR_INICIO = "RESUMEN DE SEMANAS COTIZADAS POR EMPLEADOR"
+# Usamos una palabra clave de cierre común, o el final del documento si no está
+MARCADOR_FIN = "DETALLE DE PAGOS EFECTUADOS ANTERIORES"
+# Fallback: cabecera de la tabla si no aparece el título exacto
+MARCADOR_ALTERNO = "Identificación Aportante"
+
+REGEX_FECHA = re.compile(r'\d{2}/\d{2}/\d{4}')
+SEPARADOR_MODERNO = '","'
+FORMATOS_LINEA = ("moderno", "antiguo", "otro")
+# Filas que se acumulan antes de trasponerlas a las columnas de la tabla cruda
+FILAS_POR_LOTE = 4096
+
+# Por debajo de este número de páginas no compensa arrancar procesos
+# (pdfplumber tarda ~0.2 s por página; el pool, ~0.2 s más abrir el PDF en cada worker)
+UMBRAL_PAGINAS_PARALELO = 12
+# Una sola extracción paralela por proceso: en un servidor con varias
+# sesiones las demás van en serie en lugar de multiplicar los pools
+_extraccion_paralela = threading.Semaphore(1)
+
+def _textos_paginas_serie(archivo_pdf):
+    """Texto de cada página, abriendo una página a la vez"""
+    with pdfplumber.open(archivo_pdf) as pdf:
+        for page in pdf.pages:
+            text = page.extract_text() or ""
+            # Liberamos el layout de la página: la memoria queda acotada a una página
+            page.close()
+            yield text
+
+# Documento compartido por cada proceso del pool (se envía una sola vez)
+_origen_worker = None
+
+def _iniciar_worker(origen):
+    global _origen_worker
+    _origen_worker = origen
+
+def _extraer_rango(inicio, fin):
+    """Texto de las páginas [inicio, fin) dentro de un proceso del pool"""
+    origen = _origen_worker if isinstance(_origen_worker, str) else io.BytesIO(_origen_worker)
+    textos = []
+    with pdfplumber.open(origen, pages=list(range(inicio + 1, fin + 1))) as pdf:
+        for page in pdf.pages:
+            textos.append(page.extract_text() or "")
+            page.close()
+    return textos
+
+def _origen_pdf(archivo_pdf):
+    """Ruta o bytes del PDF, para poder abrirlo de nuevo en otro proceso"""
+    if isinstance(archivo_pdf, (str, os.PathLike)): return os.fspath(archivo_pdf)
+    if hasattr(archivo_pdf, 'getvalue'): return archivo_pdf.getvalue()
+    archivo_pdf.seek(0)
+    return archivo_pdf.read()
+
+def _textos_paginas(archivo_pdf, workers=None):
+    """
+    Texto de cada página en orden. Con workers > 1 y documentos grandes,
+    las páginas se extraen por rangos en un pool de procesos; los rangos se
+    consumen en orden, así que el clasificador de líneas no cambia.
+    """
+    workers = min(workers or 1, os.cpu_count() or 1)
+    if workers <= 1:
+        yield from _textos_paginas_serie(archivo_pdf)
+        return
+
+    origen = _origen_pdf(archivo_pdf)
+    with pdfplumber.open(origen if isinstance(origen, str) else io.BytesIO(origen)) as pdf:
+        n_paginas = len(pdf.pages)
+    if n_paginas < UMBRAL_PAGINAS_PARALELO or not _extraccion_paralela.acquire(blocking=False):
+        yield from _textos_paginas_serie(origen if isinstance(origen, str) else io.BytesIO(origen))
+        return
+
+    # El cupo se libera aunque el pool no llegue a crearse (límite de procesos, memoria)
+    try:
+        # Rangos más pequeños que páginas/workers para repartir mejor la carga
+        tam = max(1, -(-n_paginas // (workers * 2)))
+        pool = ProcessPoolExecutor(max_workers=workers, initializer=_iniciar_worker, initargs=(origen,))
+        try:
+            futuros = [pool.submit(_extraer_rango, i, min(i + tam, n_paginas)) for i in range(0, n_paginas, tam)]
+            for fut in futuros:
+                yield from fut.result()
+        finally:
+            # Si el consumidor se detiene (marcador de cierre) cancelamos lo pendiente
+            pool.shutdown(wait=False, cancel_futures=True)
+    finally:
+        _extraccion_paralela.release()
+
+def iterar_lineas_tabla(archivo_pdf, workers=None):
+    """
+    Generador que recorre el PDF página a página y emite solo las líneas de
+    la sección 'RESUMEN DE SEMANAS COTIZADAS'. Al encontrar el marcador de
+    cierre deja de leer páginas (el detalle de pagos nunca se procesa).
+    """
+    paginas = _textos_paginas(archivo_pdf, workers)
+    en_seccion = False
+    alterno_visto = False
+    # Si nunca aparece el título guardamos las líneas con fechas para el fallback
+    pendientes = []
+    try:
+        for texto in paginas:
+            for linea in texto.split('\n'):
+                if not en_seccion:
+                    idx = linea.find(MARCADOR_INICIO)
+                    if idx == -1:
+                        idx_alt = linea.find(MARCADOR_ALTERNO) if not alterno_visto else -1
+                        if idx_alt != -1:
+                            alterno_visto = True
+                            pendientes = []
+                            linea = linea[idx_alt:]
+                        if REGEX_FECHA.search(linea): pendientes.append(linea)
+                        continue
+                    en_seccion = True
+                    pendientes = []
+                    linea = linea[idx:]
+
+                idx_fin = linea.find(MARCADOR_FIN)
+                if idx_fin != -1:
+                    yield linea[:idx_fin]
+                    return
+                yield linea
+    finally:
+        paginas.close()
+
+    # Sin marcador de inicio: desde la cabecera de la tabla o todo el documento
+    yield from pendientes
+
+def _buscar_fecha(linea, inicio=0):
+    """
+    Primera fecha desde 'inicio'. Toda fecha tiene una '/' dos caracteres
+    después de su inicio, así que la búsqueda arranca junto a la primera '/'
+    en lugar de recorrer el texto previo con la expresión regular.
+    """
+    barra = linea.find('/', inicio + 2)
+    if barra == -1: return None
+    return REGEX_FECHA.search(linea, barra - 2)
+
+def _partir_linea(linea):
+    """
+    Clasifica y separa una línea. Devuelve (formato, celdas) o None si la
+    línea no es una fila (vacía o sin fechas).
+    """
+    linea = linea.strip()
+    fecha = _buscar_fecha(linea)
+    if fecha is None: return None
+
+    # A. Formato Moderno (CSV con comillas): las comillas externas solo
+    #    quedan en la primera y la última celda
+    if SEPARADOR_MODERNO in linea:
+        celdas = linea.split(SEPARADOR_MODERNO)
+        celdas[0] = celdas[0].lstrip('"')
+        celdas[-1] = celdas[-1].rstrip('"')
+        return "moderno", list(map(str.strip, celdas))
+
+    # B. Formato Antiguo (Sin comillas): las dos primeras fechas separan el
+    #    nombre de los valores; columna dummy al inicio para alinear
+    segunda = _buscar_fecha(linea, fecha.end())
+    if segunda is not None:
+        return "antiguo", ["(Sin ID)", linea[:fecha.start()].strip(), fecha.group(), segunda.group()] + linea[segunda.end():].split()
+    return "otro", linea.split()
+
+@medir()
+def extraer_tabla_cruda(archivo_pdf, workers=None):
     """
     Extrae solo la sección 'RESUMEN DE SEMANAS COTIZADAS' para evitar ruido.
     Alinea columnas antiguas y nuevas.
+    workers > 1 extrae las páginas en paralelo (documentos grandes).
     """
-    filas_crudas = []
-    
-    with pdfplumber.open(archivo_pdf) as pdf:
-        full_text = ""
-        for page in pdf.pages:
-            text = page.extract_text() or ""
-            full_text += "\n" + text
-
-    # --- ZONA DE RECORTE (LA IDEA NUEVA) ---
-    # Buscamos los marcadores para aislar la tabla principal
-    marcador_inicio = "RESUMEN DE SEMANAS COTIZADAS POR EMPLEADOR"
-    # Usamos una palabra clave de cierre común, o el final del documento si no está
-    marcador_fin = "DETALLE DE PAGOS EFECTUADOS ANTERIORES" 
-    
-    idx_inicio = full_text.find(marcador_inicio)
-    idx_fin = full_text.find(marcador_fin)
-    
-    texto_a_procesar = full_text
-    
-    # Aplicar recorte si encontramos los marcadores
-    if idx_inicio != -1:
-        if idx_fin != -1:
-            texto_a_procesar = full_text[idx_inicio:idx_fin]
-        else:
-            # Si no hay tabla de detalle (ej: gente joven), vamos hasta el final
-            texto_a_procesar = full_text[idx_inicio:]
-    else:
-        # Fallback: Si no encuentra el título exacto, busca "Identificación Aportante"
-        # que es la cabecera de la tabla
-        idx_alt = full_text.find("Identificación Aportante")
-        if idx_alt != -1:
-            texto_a_procesar = full_text[idx_alt:]
-
-    lineas = texto_a_procesar.split('\n')
-    regex_fecha = re.compile(r'\d{2}/\d{2}/\d{4}')
-    
+    return construir_tabla_cruda(iterar_lineas_tabla(archivo_pdf, workers))
+
+def _volcar_lote(columnas, lote, n_filas):
+    """Traspone un lote de filas al final de cada columna (zip_longest completa con None)"""
+    ancho = max(map(len, lote))
+    for _ in range(len(columnas), ancho): columnas.append([None] * n_filas)
+    for columna, valores in zip(columnas, zip_longest(*lote)): columna.extend(valores)
+    for columna in columnas[ancho:]: columna.extend([None] * len(lote))
+
+def construir_tabla_cruda(lineas):
+    """
+    Arma la tabla cruda (columnas 'Columna i') a partir de líneas de texto de
+    la sección. Las filas se trasponen por lotes a una lista por columna, sin
+    copias completadas de cada fila, y df.attrs['formatos'] cuenta las filas
+    de cada formato.
+    """
+    columnas, lote = [], []
+    formatos = dict.fromkeys(FORMATOS_LINEA, 0)
+    n_filas = 0
     for linea in lineas:
-        linea = linea.strip()
-        if not linea: continue
-        if not regex_fecha.search(linea): continue
-            
-        # A. Formato Moderno (CSV con comillas)
-        if '","' in linea:
-            token_sep = "||SEP||"
-            linea_temp = linea.replace('","', token_sep).strip('"')
-            partes = [p.strip() for p in linea_temp.split(token_sep)]
-            filas_crudas.append(partes)
-            
-        # B. Formato Antiguo (Sin comillas)
-        else:
-            fechas = regex_fecha.findall(linea)
-            if len(fechas) >= 2:
-                try:
-                    # Usamos fechas como separadores
-                    split_1 = linea.split(fechas[0], 1)
-                    p1 = split_1[0].strip() # Nombre
-                    
-                    split_2 = split_1[1].split(fechas[1], 1)
-                    p3 = split_2[1].strip() # Valores
-                    
-                    valores = re.split(r'\s+', p3)
-                    valores = [v for v in valores if v]
-                    
-                    # Alineamos agregando columna dummy al inicio
-                    filas_crudas.append(["(Sin ID)", p1, fechas[0], fechas[1]] + valores)
-                except:
-                    filas_crudas.append(linea.split())
-            else:
-                filas_crudas.append(linea.split())
-
-    if not filas_crudas: return pd.DataFrame()
-
-    max_cols = max(len(f) for f in filas_crudas)
-    header = [f"Columna {i}" for i in range(max_cols)]
-    datos_norm = [f + [None]*(max_cols-len(f)) for f in filas_crudas]
-    
-    return pd.DataFrame(datos_norm, columns=header)
+        partida = _partir_linea(linea)
+        if partida is None: continue
+        formatos[partida[0]] += 1
+        lote.append(partida[1])
+        if len(lote) == FILAS_POR_LOTE:
+            _volcar_lote(columnas, lote, n_filas)
+            n_filas += len(lote)
+            lote = []
+    if lote:
+        _volcar_lote(columnas, lote, n_filas)
+        n_filas += len(lote)
+
+    df = pd.DataFrame({f"Columna {i}": c for i, c in enumerate(columnas)}) if n_filas else pd.DataFrame()
+    df.attrs["formatos"] = formatos
+    return df
+
+UMBRAL_CONFIANZA = 0.6
+REGEX_FECHA_CELDA = r'\s*\d{2}/\d{2}/\d{4}\s*'
 
+def _normalizar_numeros(serie):
+    """
+    Versión vectorizada de la limpieza de números del PDF: separadores de
+    miles con '.' o ',' y decimales con ','. Lo que no se pueda leer vale 0.
+    """
+    v = serie.astype(str).str.replace(r'[^\d\.,]', '', regex=True)
+    tiene_coma = v.str.contains(',', regex=False)
+    tiene_punto = v.str.contains('.', regex=False)
+
+    ambos = tiene_coma & tiene_punto
+    varios_puntos = ~ambos & (v.str.count(r'\.') > 1)
+    solo_coma = ~ambos & ~varios_puntos & tiene_coma
+    coma_decimal = solo_coma & (v.str.rsplit(',', n=1).str[-1].str.len() == 2)
+    coma_miles = solo_coma & ~coma_decimal
+
+    v = v.mask(ambos, v.str.replace('.', '', regex=False).str.replace(',', '.', regex=False))
+    v = v.mask(varios_puntos, v.str.replace('.', '', regex=False))
+    v = v.mask(coma_decimal, v.str.replace(',', '.', regex=False))
+    v = v.mask(coma_miles, v.str.replace(',', '', regex=False))
+
+    valido = v.str.fullmatch(r'\d+\.?\d*|\.\d+')
+    numeros = pd.Series(0.0, index=serie.index)
+    numeros[valido] = v[valido].astype(float)
+    return numeros
+
+def _filas_muestra(df_crudo, muestra):
+    """Filas equiespaciadas para que la muestra cubra tramos antiguos y modernos"""
+    if len(df_crudo) <= muestra: return df_crudo
+    idx = np.unique(np.linspace(0, len(df_crudo) - 1, muestra).astype(int))
+    return df_crudo.iloc[idx]
+
+@medir()
+def detectar_columnas(df_crudo, muestra=200):
+    """
+    Detecta automáticamente las columnas Desde/Hasta/IBC/Semanas puntuando
+    cada columna sobre una muestra de filas. Devuelve el mapeo, el puntaje
+    por rol y una 'confianza' global (el menor puntaje); si algún rol no se
+    pudo identificar su valor es None.
+    """
+    resultado = {"desde": None, "hasta": None, "ibc": None, "semanas": None,
+                 "puntajes": {}, "confianza": 0.0}
+    if df_crudo is None or df_crudo.empty: return resultado
+
+    df_m = _filas_muestra(df_crudo, muestra)
+    cols = df_m.columns.tolist()
+    texto = {c: df_m[c].astype(object).where(df_m[c].notna(), '').astype(str) for c in cols}
+
+    # --- 1. FECHAS: tasa de acierto del regex y orden Desde <= Hasta ---
+    tasa_fecha = {c: texto[c].str.fullmatch(REGEX_FECHA_CELDA).mean() for c in cols}
+    candidatas = sorted(cols, key=lambda c: (-tasa_fecha[c], cols.index(c)))[:2]
+    if len(candidatas) == 2 and min(tasa_fecha[c] for c in candidatas) > 0:
+        a, b = sorted(candidatas, key=cols.index)
+        fa = pd.to_datetime(texto[a].str.strip(), format='%d/%m/%Y', errors='coerce')
+        fb = pd.to_datetime(texto[b].str.strip(), format='%d/%m/%Y', errors='coerce')
+        validas = fa.notna() & fb.notna()
+        orden = (fa[validas] <= fb[validas]).mean() if validas.any() else 0.5
+        if orden < 0.5: a, b = b, a
+        resultado["desde"], resultado["hasta"] = a, b
+        resultado["puntajes"]["fechas"] = float(min(tasa_fecha[a], tasa_fecha[b]) * max(orden, 1 - orden))
+
+    resto = [c for c in cols if c not in (resultado["desde"], resultado["hasta"])]
+    con_digitos = {c: texto[c].str.contains(r'\d', regex=True) for c in resto}
+
+    # --- 2. IBC: formato moneda ($, miles agrupados) y magnitud ---
+    def puntaje_ibc(c):
+        t = texto[c]
+        signo = t.str.contains('$', regex=False).mean()
+        miles = t.str.contains(r'\d{1,3}(?:[\.,]\d{3})+', regex=True).mean()
+        magnitud = (t.str.replace(r'\D', '', regex=True).str.len() >= 4).mean()
+        # Los NITs también son números largos, pero nunca llevan signo ni miles agrupados
+        return 0.5 * signo + 0.3 * miles + 0.2 * magnitud if con_digitos[c].mean() > 0 else 0.0
+
+    if resto:
+        puntos = {c: puntaje_ibc(c) for c in resto}
+        mejor = max(resto, key=lambda c: (puntos[c], -resto.index(c)))
+        if puntos[mejor] > 0:
+            resultado["ibc"] = mejor
+            resultado["puntajes"]["ibc"] = float(min(1.0, puntos[mejor] / 0.8))
+
+    # --- 3. SEMANAS: valores numéricos <= 55 (preferimos la última columna: 'Total') ---
+    def puntaje_semanas(c):
+        t = texto[c]
+        validos = con_digitos[c] & ~t.str.contains(r'[A-Za-z$/]', regex=True)
+        valores = _normalizar_numeros(t)
+        en_rango = validos & (valores <= 55)
+        return 0.5 * en_rango.mean() + 0.5 * (en_rango & (valores > 0)).mean()
+
+    restantes = [c for c in resto if c != resultado["ibc"]]
+    if restantes:
+        puntos = {c: puntaje_semanas(c) for c in restantes}
+        mejor = max(restantes, key=lambda c: (round(puntos[c], 6), restantes.index(c)))
+        if puntos[mejor] > 0:
+            resultado["semanas"] = mejor
+            resultado["puntajes"]["semanas"] = float(min(1.0, puntos[mejor] / 0.75))
+
+    roles = ("desde", "hasta", "ibc", "semanas")
+    if all(resultado[r] is not None for r in roles):
+        resultado["confianza"] = min(resultado["puntajes"].values())
+    return resultado
+
+def sugerir_columnas(df_crudo, deteccion=None):
+    """
+    Propone el mapeo de columnas para limpiar_y_estandarizar: usa la
+    detección automática (o 'deteccion', si ya se calculó) y, para los roles
+    no detectados, las posiciones habituales del formato Colpensiones.
+    """
+    cols = df_crudo.columns.tolist()
+    detectado = deteccion if deteccion is not None else detectar_columnas(df_crudo)
+    por_defecto = {
+        "desde": cols[2] if len(cols) > 2 else cols[0],
+        "hasta": cols[3] if len(cols) > 3 else cols[0],
+        "ibc": cols[4] if len(cols) > 4 else cols[0],
+        "semanas": cols[-1]
+    }
+    return {rol: detectado[rol] if detectado[rol] is not None else col for rol, col in por_defecto.items()}
+
+def _extraer_fechas(serie):
+    """Primera fecha dd/mm/aaaa de cada celda, convertida en bloque"""
+    texto = serie.astype(str).str.extract(r'(\d{2}/\d{2}/\d{4})', expand=False)
+    fechas = pd.to_datetime(texto, format='%d/%m/%Y', errors='coerce')
+    # Casos raros que el formato estricto rechaza (mes > 12, p.ej. mm/dd):
+    # se conserva el parser flexible de antes, que intercambia día y mes
+    rechazadas = fechas.isna() & texto.notna() & (texto.str[3:5] > '12')
+    if rechazadas.any():
+        fechas[rechazadas] = [pd.to_datetime(t, dayfirst=True, errors='coerce') for t in texto[rechazadas]]
+    return fechas
+
+@medir()
 def limpiar_y_estandarizar(df_crudo, col_desde, col_hasta, col_ibc, col_semanas):
     """
     Limpieza inteligente con rescate de semanas vacías.
+    Trabaja por columnas (sin iterar filas).
     """
-    datos = []
-    
-    for idx, row in df_crudo.iterrows():
-        try:
-            raw_desde = str(row[col_desde])
-            raw_hasta = str(row[col_hasta])
-            raw_ibc = str(row[col_ibc])
-            raw_semanas = str(row[col_semanas])
-            
-            # --- 1. FECHAS ---
-            match_d = re.search(r'\d{2}/\d{2}/\d{4}', raw_desde)
-            match_h = re.search(r'\d{2}/\d{2}/\d{4}', raw_hasta)
-            
-            if not match_d or not match_h: continue
-            
-            desde = pd.to_datetime(match_d.group(0), dayfirst=True, errors='coerce')
-            hasta = pd.to_datetime(match_h.group(0), dayfirst=True, errors='coerce')
-            
-            if pd.isna(desde) or pd.isna(hasta): continue
-            
-            # --- 2. VALORES ---
-            def clean_num(val):
-                if not val or val.lower() == 'none': return 0.0
-                v = re.sub(r'[^\d\.,]', '', val)
-                if not v: return 0.0
-                if ',' in v and '.' in v: v = v.replace('.','').replace(',','.')
-                elif v.count('.') > 1: v = v.replace('.','')
-                elif ',' in v: 
-                    if len(v.split(',')[-1])==2: v = v.replace(',','.')
-                    else: v = v.replace(',','')
-                try: return float(v)
-                except: return 0.0
-
-            ibc = clean_num(raw_ibc)
-            semanas_leidas = clean_num(raw_semanas)
-            
-            # --- 3. LÓGICA DE RESCATE (CRUCIAL PARA AÑOS 80) ---
-            semanas_final = semanas_leidas
-            
-            # Si el PDF dice 0 semanas, vacío, o un número absurdo (>55)
-            # calculamos las semanas matemáticamente por las fechas.
-            recalcular = False
-            if semanas_leidas <= 0.1: recalcular = True
-            elif semanas_leidas > 55: recalcular = True 
-            
-            if recalcular:
-                dias_calculados = (hasta - desde).days + 1
-                if 0 < dias_calculados < 12000:
-                    semanas_final = dias_calculados / 7
-                else:
-                    semanas_final = 0
-            
-            if semanas_final > 0:
-                datos.append({
-                    "Desde": desde,
-                    "Hasta": hasta,
-                    "IBC": ibc,
-                    "Semanas": semanas_final,
-                    "Aportante": "Manual"
-                })
-
-        except Exception as e:
-            continue
-            
-    df = pd.DataFrame(datos)
-    return df.sort_values('Desde') if not df.empty else df
+    if df_crudo.empty: return pd.DataFrame()
+
+    # --- 1. FECHAS ---
+    desde = _extraer_fechas(df_crudo[col_desde])
+    hasta = _extraer_fechas(df_crudo[col_hasta])
+    fechas_ok = desde.notna() & hasta.notna()
+
+    # --- 2. VALORES ---
+    ibc = _normalizar_numeros(df_crudo[col_ibc])
+    semanas_leidas = _normalizar_numeros(df_crudo[col_semanas])
+
+    # --- 3. LÓGICA DE RESCATE (CRUCIAL PARA AÑOS 80) ---
+    # Si el PDF dice 0 semanas, vacío, o un número absurdo (>55)
+    # calculamos las semanas matemáticamente por las fechas.
+    recalcular = (semanas_leidas <= 0.1) | (semanas_leidas > 55)
+    dias_calculados = (hasta - desde).dt.days + 1
+    semanas_por_fechas = np.where((dias_calculados > 0) & (dias_calculados < 12000), dias_calculados / 7, 0.0)
+    semanas_final = semanas_leidas.where(~recalcular, semanas_por_fechas)
+
+    validas = fechas_ok & (semanas_final > 0)
+    if not validas.any(): return pd.DataFrame()
+
+    df = pd.DataFrame({
+        "Desde": desde[validas],
+        "Hasta": hasta[validas],
+        "IBC": ibc[validas],
+        "Semanas": semanas_final[validas],
+        # Aportante categórico: un código int8 por fila en lugar de un objeto str
+        "Aportante": pd.Categorical.from_codes(np.zeros(int(validas.sum()), dtype=np.int8), ["Manual"])
+    }).reset_index(drop=True)
+    return df.sort_values('Desde')
+
+# Tope de semanas de un mes cuando varios aportantes cotizan a la vez
+SEMANAS_MES_COMPLETO = 30 / 7
+
+def _dias_cubiertos(mes, desde, hasta, cortes):
+    """
+    Días distintos cubiertos por los tramos de cada mes (unión de
+    intervalos). 'mes' viene ordenado y 'cortes' marca el inicio de cada mes.
+    """
+    orden = np.lexsort((desde, mes))
+    d = desde[orden].astype(np.int64)
+    h = hasta[orden].astype(np.int64)
+    # Mayor 'hasta' de los tramos anteriores: los meses van en orden, así que
+    # el máximo acumulado de un mes previo nunca alcanza al siguiente
+    previo = np.r_[d[0] - 1, np.maximum.accumulate(h)[:-1]]
+    nuevos = np.maximum(h - np.maximum(d, previo + 1) + 1, 0)
+    return np.add.reduceat(nuevos, cortes)
 
+def simultaneidad_mensual(desde, hasta, ibc, semanas):
+    """
+    Regla de simultaneidad sobre arreglos: expande cada periodo en los meses
+    calendario que cubre, reparte sus semanas según los días de cada mes y
+    aplica su IBC (base mensual) a todos ellos. Luego, por mes:
+    - IBC: suma de los aportantes, cada uno ponderado por sus días sobre los
+      días del mes cubiertos por alguno (la unión de los tramos);
+    - Semanas: la suma, sin pasar de un mes completo (30/7) salvo que un
+      solo periodo ya reporte más;
+    - Desde/Hasta: el tramo cubierto dentro del mes.
+    Devuelve (mes datetime64[M], ibc, semanas, desde, hasta) ordenados por mes.
+    """
+    desde = np.asarray(desde).astype('datetime64[D]')
+    hasta = np.maximum(np.asarray(hasta).astype('datetime64[D]'), desde)
+    ibc = np.asarray(ibc, dtype=float)
+    semanas = np.asarray(semanas, dtype=float)
+
+    # Expansión por intervalos: una posición por (periodo, mes cubierto)
+    mes_inicio = desde.astype('datetime64[M]')
+    n_meses = (hasta.astype('datetime64[M]') - mes_inicio).astype(np.int64) + 1
+    fila = np.repeat(np.arange(len(desde)), n_meses)
+    desplazamiento = np.arange(len(fila)) - np.repeat(np.cumsum(n_meses) - n_meses, n_meses)
+    mes = mes_inicio[fila] + desplazamiento
+
+    # Días del periodo dentro de cada mes
+    tramo_desde = np.maximum(desde[fila], mes.astype('datetime64[D]'))
+    tramo_hasta = np.minimum(hasta[fila], (mes + 1).astype('datetime64[D]') - 1)
+    dias = (tramo_hasta - tramo_desde).astype(np.int64) + 1
+    dias_periodo = (hasta - desde).astype(np.int64) + 1
+    semanas_tramo = semanas[fila] * (dias / dias_periodo[fila])
+
+    # Agregación por mes (orden estable: los aportantes se suman en su orden original)
+    orden = np.argsort(mes, kind='stable')
+    mes = mes[orden]
+    cortes = np.flatnonzero(np.r_[True, mes[1:] != mes[:-1]])
+    semanas_tramo = semanas_tramo[orden]
+    suma_semanas = np.add.reduceat(semanas_tramo, cortes)
+    mayor_semanas = np.maximum.reduceat(semanas_tramo, cortes)
+
+    # IBC de cada tramo según su parte de los días cubiertos del mes: un solo
+    # aportante o aportantes simultáneos todo el mes pesan 1; dos empleadores
+    # seguidos en el mismo mes no duplican la base
+    grupo = np.repeat(np.arange(len(cortes)), np.diff(np.r_[cortes, len(mes)]))
+    cubiertos = _dias_cubiertos(mes, tramo_desde[orden], tramo_hasta[orden], cortes)
+    ibc_tramo = ibc[fila][orden] * (dias[orden] / cubiertos[grupo])
+    return (
+        mes[cortes],
+        np.add.reduceat(ibc_tramo, cortes),
+        np.minimum(suma_semanas, np.maximum(mayor_semanas, SEMANAS_MES_COMPLETO)),
+        np.minimum.reduceat(tramo_desde[orden], cortes),
+        np.maximum.reduceat(tramo_hasta[orden], cortes)
+    )
+
+@medir()
 def aplicar_regla_simultaneidad(df):
+    """
+    Serie mensual compacta (Periodo, IBC, Semanas, Desde, Hasta) a partir de
+    la historia limpia; ver simultaneidad_mensual. No modifica la entrada.
+    Acepta también una HistoriaLaboral y en ese caso devuelve otra.
+    """
+    if isinstance(df, HistoriaLaboral):
+        if df.vacia: return df
+        mes, ibc, semanas, desde, hasta = simultaneidad_mensual(df.desde, df.hasta, df.ibc, df.semanas)
+        return HistoriaLaboral(desde, hasta, ibc, semanas, periodo=mes)
+
     if df.empty: return df
-    df['Periodo'] = df['Desde'].dt.to_period('M')
-    return df.groupby('Periodo').agg({
-        'IBC': 'sum',
-        'Semanas': 'max',
-        'Desde': 'min',
-        'Hasta': 'max'
-    }).reset_index().sort_values('Periodo')
+    mes, ibc, semanas, desde, hasta = simultaneidad_mensual(
+        df['Desde'].to_numpy(), df['Hasta'].to_numpy(), df['IBC'].to_numpy(), df['Semanas'].to_numpy()
+    )
+    return pd.DataFrame({
+        'Periodo': pd.PeriodIndex.from_ordinals(mes.astype(np.int64), freq='M'),
+        'IBC': ibc,
+        'Semanas': semanas,
+        'Desde': desde,
+        'Hasta': hasta
+    })
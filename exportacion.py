@@ -0,0 +1,142 @@
+"""
+Exportación masiva de dictámenes Word a partir de liquidaciones ya calculadas.
+
+Cada registro es un dict con 'perfil', 'fechas', 'liq_data' y opcionalmente
+'proyeccion' (o la tupla equivalente en ese orden), con la misma forma que
+recibe reporte.generar_reporte_completo. Los documentos se generan en un
+pool de procesos y se escriben a medida que llegan, en un ZIP o en una
+carpeta, junto con el tiempo y la memoria pico de cada uno.
+"""
+import os
+import re
+import time
+import tracemalloc
+import zipfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+def _normalizar(registro):
+    if isinstance(registro, dict):
+        return registro["perfil"], registro["fechas"], registro["liq_data"], registro.get("proyeccion")
+    perfil, fechas, liq_data, *resto = registro
+    return perfil, fechas, liq_data, (resto[0] if resto else None)
+
+def _iniciar_worker(medir_memoria=True):
+    # Backend sin interfaz antes de cargar matplotlib; la figura del reporte
+    # se crea una vez por proceso (un solo hilo) y se limpia entre documentos
+    os.environ["MPLBACKEND"] = "Agg"
+    import reporte  # noqa: F401
+    # tracemalloc hace ~3x más lento cada documento: se puede desactivar
+    if medir_memoria: tracemalloc.start()
+
+def _generar(i, registro):
+    from reporte import generar_reporte_completo
+    if tracemalloc.is_tracing():
+        tracemalloc.clear_traces()
+        tracemalloc.reset_peak()
+    inicio = time.perf_counter()
+    perfil, fechas, liq_data, proyeccion = _normalizar(registro)
+    try:
+        contenido = generar_reporte_completo(perfil, fechas, liq_data, proyeccion).getvalue()
+        error = ""
+    except Exception as e:
+        contenido, error = None, f"{type(e).__name__}: {e}"
+    pico = tracemalloc.get_traced_memory()[1] if tracemalloc.is_tracing() else None
+    return i, perfil.get("nombre", ""), contenido, error, time.perf_counter() - inicio, pico
+
+def _nombre_archivo(nombre, usados):
+    base = re.sub(r'[^\w\- ]+', '_', str(nombre)).strip() or "afiliado"
+    nombre_archivo = f"Dictamen_{base}.docx"
+    n = 2
+    while nombre_archivo in usados:
+        nombre_archivo = f"Dictamen_{base}_{n}.docx"
+        n += 1
+    usados.add(nombre_archivo)
+    return nombre_archivo
+
+class _DestinoZip:
+    def __init__(self, ruta):
+        if os.path.dirname(ruta): os.makedirs(os.path.dirname(ruta), exist_ok=True)
+        self._zip = zipfile.ZipFile(ruta, "w", zipfile.ZIP_DEFLATED)
+
+    def escribir(self, nombre, contenido):
+        self._zip.writestr(nombre, contenido)
+
+    def cerrar(self):
+        self._zip.close()
+
+class _DestinoCarpeta:
+    def __init__(self, ruta):
+        self._ruta = ruta
+        os.makedirs(ruta, exist_ok=True)
+
+    def escribir(self, nombre, contenido):
+        with open(os.path.join(self._ruta, nombre), "wb") as f:
+            f.write(contenido)
+
+    def cerrar(self):
+        pass
+
+def _resultados(registros, workers, medir_memoria):
+    """Genera (i, nombre, contenido, error, segundos, memoria_pico) en orden de llegada"""
+    if workers is not None and workers <= 1:
+        ya_activo = tracemalloc.is_tracing()
+        _iniciar_worker(medir_memoria)
+        try:
+            for i, registro in enumerate(registros):
+                yield _generar(i, registro)
+        finally:
+            if not ya_activo: tracemalloc.stop()
+        return
+
+    workers = workers or os.cpu_count() or 1
+    pool = ProcessPoolExecutor(max_workers=workers, initializer=_iniciar_worker, initargs=(medir_memoria,))
+    # Ventana acotada de documentos en vuelo para no cargar todos los registros a la vez
+    ventana = 4 * workers
+    pendientes = deque()
+    try:
+        for i, registro in enumerate(registros):
+            pendientes.append(pool.submit(_generar, i, registro))
+            if len(pendientes) >= ventana:
+                yield pendientes.popleft().result()
+        while pendientes:
+            yield pendientes.popleft().result()
+    finally:
+        pool.shutdown(cancel_futures=True)
+
+def exportar_dictamenes(registros, destino, workers=None, progreso=None, medir_memoria=True):
+    """
+    Genera un dictamen por registro. 'destino' terminado en .zip produce un
+    archivo comprimido; cualquier otra ruta se usa como carpeta.
+    Devuelve una fila por documento (archivo, nombre, estado, error,
+    segundos, memoria_pico_kb, bytes) y un resumen del lote. La memoria
+    pico (tracemalloc) queda vacía con medir_memoria=False.
+    """
+    salida = _DestinoZip(destino) if destino.lower().endswith(".zip") else _DestinoCarpeta(destino)
+    usados = set()
+    detalle = []
+    inicio = time.perf_counter()
+    try:
+        for i, nombre, contenido, error, segundos, pico in _resultados(registros, workers, medir_memoria):
+            fila = {
+                "archivo": "", "nombre": nombre, "estado": "ok" if contenido is not None else "error",
+                "error": error, "segundos": round(segundos, 4),
+                "memoria_pico_kb": round(pico / 1024, 1) if pico is not None else None, "bytes": len(contenido) if contenido else 0
+            }
+            if contenido is not None:
+                fila["archivo"] = _nombre_archivo(nombre, usados)
+                salida.escribir(fila["archivo"], contenido)
+            detalle.append(fila)
+            if progreso: progreso(len(detalle), fila)
+    finally:
+        salida.cerrar()
+
+    total = time.perf_counter() - inicio
+    resumen = {
+        "documentos": len(detalle),
+        "errores": sum(f["estado"] == "error" for f in detalle),
+        "segundos": total,
+        "documentos_por_segundo": (len(detalle) / total) if total > 0 else 0.0,
+        "memoria_pico_kb": max((f["memoria_pico_kb"] for f in detalle if f["memoria_pico_kb"] is not None), default=None)
+    }
+    return detalle, resumen
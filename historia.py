@@ -0,0 +1,95 @@
+"""
+Representación compacta de una historia laboral ya limpia.
+
+En lugar de un DataFrame con columnas de objetos, la historia se guarda en
+arreglos tipados de NumPy: Desde/Hasta en datetime64[D], IBC y Semanas en
+float64 y el aportante como código entero sobre un catálogo (categórico).
+El Periodo de la regla de simultaneidad, si existe, va como datetime64[M].
+"""
+import numpy as np
+import pandas as pd
+
+class HistoriaLaboral:
+    """Historia laboral en arreglos tipados (una posición por periodo, en el orden original)"""
+    __slots__ = ("desde", "hasta", "ibc", "semanas", "aportante", "aportantes", "periodo")
+
+    def __init__(self, desde, hasta, ibc, semanas, aportante=None, aportantes=("Manual",), periodo=None):
+        self.desde = np.asarray(desde).astype("datetime64[D]", copy=False)
+        self.hasta = np.asarray(hasta).astype("datetime64[D]", copy=False)
+        self.ibc = np.asarray(ibc, dtype=np.float64)
+        self.semanas = np.asarray(semanas, dtype=np.float64)
+        n = len(self.desde)
+        # Códigos int8/int16 sobre el catálogo de aportantes (todos 'Manual' por defecto)
+        self.aportante = np.zeros(n, dtype=np.int8) if aportante is None else np.asarray(aportante)
+        self.aportantes = tuple(aportantes)
+        self.periodo = None if periodo is None else np.asarray(periodo).astype("datetime64[M]", copy=False)
+
+    def __len__(self):
+        return len(self.desde)
+
+    @property
+    def vacia(self):
+        return len(self.desde) == 0
+
+    @property
+    def nbytes(self):
+        arreglos = [self.desde, self.hasta, self.ibc, self.semanas, self.aportante]
+        if self.periodo is not None: arreglos.append(self.periodo)
+        return sum(a.nbytes for a in arreglos)
+
+    def ultima_cotizacion(self):
+        return pd.Timestamp(self.hasta.max()) if len(self) else None
+
+    @classmethod
+    def desde_dataframe(cls, df):
+        """Convierte la salida de limpiar_y_estandarizar / aplicar_regla_simultaneidad"""
+        if df is None or df.empty:
+            return cls(np.array([], "datetime64[D]"), np.array([], "datetime64[D]"), [], [])
+        aportante, aportantes = None, ("Manual",)
+        if 'Aportante' in df.columns:
+            cat = pd.Categorical(df['Aportante'])
+            aportante, aportantes = cat.codes, tuple(cat.categories)
+        periodo = None
+        if 'Periodo' in df.columns:
+            periodo = df['Periodo'].array.asi8.view("datetime64[M]")
+        return cls(
+            df['Desde'].to_numpy(), df['Hasta'].to_numpy(),
+            df['IBC'].to_numpy(dtype=np.float64), df['Semanas'].to_numpy(dtype=np.float64),
+            aportante, aportantes, periodo
+        )
+
+    def a_json(self):
+        """Columnas en tipos de JSON (fechas ISO); los float conservan todos sus dígitos"""
+        return {
+            "desde": np.datetime_as_string(self.desde, unit="D").tolist(),
+            "hasta": np.datetime_as_string(self.hasta, unit="D").tolist(),
+            "ibc": self.ibc.tolist(), "semanas": self.semanas.tolist(),
+            "aportante": self.aportante.tolist(), "aportantes": list(self.aportantes),
+            "periodo": None if self.periodo is None else np.datetime_as_string(self.periodo, unit="M").tolist()
+        }
+
+    @classmethod
+    def desde_json(cls, datos):
+        periodo = datos.get("periodo")
+        return cls(
+            np.array(datos["desde"], dtype="datetime64[D]"), np.array(datos["hasta"], dtype="datetime64[D]"),
+            datos["ibc"], datos["semanas"], np.array(datos["aportante"], dtype=np.int16),
+            datos["aportantes"], None if periodo is None else np.array(periodo, dtype="datetime64[M]")
+        )
+
+    def a_dataframe(self):
+        """DataFrame con las mismas columnas que produce el procesador"""
+        if self.periodo is not None:
+            # Mismo orden de columnas que aplicar_regla_simultaneidad
+            columnas = {
+                'Periodo': pd.PeriodIndex.from_ordinals(self.periodo.view(np.int64), freq='M'),
+                'IBC': self.ibc, 'Semanas': self.semanas,
+                'Desde': self.desde, 'Hasta': self.hasta
+            }
+        else:
+            columnas = {
+                'Desde': self.desde, 'Hasta': self.hasta,
+                'IBC': self.ibc, 'Semanas': self.semanas,
+                'Aportante': pd.Categorical.from_codes(self.aportante, categories=list(self.aportantes))
+            }
+        return pd.DataFrame(columnas)
@@ -0,0 +1,126 @@
+"""
+Instrumentación opcional de las etapas del liquidador.
+
+Apagada por defecto: con LIQUIDADOR_INSTRUMENTACION=1 registra tiempo y
+filas de cada etapa; con LIQUIDADOR_INSTRUMENTACION=memoria además mide la
+memoria asignada (tracemalloc, con costo notable). Apagada, el decorador
+solo consulta una bandera antes de llamar a la función original.
+
+Cada medida se publica como JSON en el logger 'liquidador.rendimiento',
+queda en un historial acotado del proceso y, si el hilo abrió una captura
+(un rerun de Streamlit, por ejemplo), también en esa captura.
+"""
+import functools
+import json
+import logging
+import os
+import threading
+import time
+import tracemalloc
+from collections import deque
+from contextlib import contextmanager
+
+import pandas as pd
+
+logger = logging.getLogger("liquidador.rendimiento")
+
+_estado = {"activa": False, "memoria": False}
+_historial = deque(maxlen=2000)
+_local = threading.local()
+
+def activar(memoria=False):
+    _estado["activa"] = True
+    _estado["memoria"] = memoria
+    if memoria and not tracemalloc.is_tracing(): tracemalloc.start()
+
+def desactivar():
+    _estado["activa"] = False
+    if _estado["memoria"] and tracemalloc.is_tracing(): tracemalloc.stop()
+    _estado["memoria"] = False
+
+def esta_activa():
+    return _estado["activa"]
+
+def nueva_captura():
+    """Lista donde se acumulan las medidas de este hilo desde ahora"""
+    _local.captura = []
+    return _local.captura
+
+def historial():
+    return list(_historial)
+
+def resumen(medidas=None):
+    """Totales por etapa: llamadas, segundos, filas y memoria pico"""
+    df = pd.DataFrame(historial() if medidas is None else medidas)
+    if df.empty: return df
+    return df.groupby("etapa", sort=False).agg(
+        llamadas=("segundos", "size"), segundos=("segundos", "sum"),
+        promedio_ms=("segundos", lambda s: s.mean() * 1000),
+        filas=("filas", "max"), memoria_pico_kb=("memoria_pico_kb", "max")
+    ).sort_values("segundos", ascending=False)
+
+def _contar_filas(resultado, args):
+    # Filas del DataFrame devuelto o, si no hay, de la entrada: un DataFrame
+    # directo o la 'historia' del liquidador (len de los arreglos tipados; su
+    # propiedad 'df' armaría un DataFrame completo solo para contarlo)
+    if isinstance(resultado, pd.DataFrame): return len(resultado)
+    for a in args:
+        if isinstance(a, pd.DataFrame): return len(a)
+        historia = getattr(a, "historia", None)
+        if historia is not None: return len(historia)
+    return None
+
+def _publicar(medida):
+    _historial.append(medida)
+    captura = getattr(_local, "captura", None)
+    if captura is not None: captura.append(medida)
+    logger.info(json.dumps(medida, ensure_ascii=False), extra={"medida": medida})
+
+@contextmanager
+def etapa(nombre, filas=None):
+    """
+    Mide un bloque. El dict entregado permite fijar 'filas' dentro del bloque.
+    Con la instrumentación apagada entrega None y no mide nada.
+    """
+    if not _estado["activa"]:
+        yield None
+        return
+
+    medida = {"etapa": nombre, "filas": filas, "segundos": None, "memoria_neta_kb": None, "memoria_pico_kb": None}
+    profundidad = getattr(_local, "profundidad", 0)
+    memoria = _estado["memoria"] and tracemalloc.is_tracing()
+    if memoria:
+        # El pico solo se reinicia en la etapa externa para no falsear la que la contiene
+        if profundidad == 0: tracemalloc.reset_peak()
+        memoria_inicio = tracemalloc.get_traced_memory()[0]
+    _local.profundidad = profundidad + 1
+    inicio = time.perf_counter()
+    try:
+        yield medida
+    finally:
+        medida["segundos"] = time.perf_counter() - inicio
+        _local.profundidad = profundidad
+        if memoria:
+            actual, pico = tracemalloc.get_traced_memory()
+            medida["memoria_neta_kb"] = round((actual - memoria_inicio) / 1024, 1)
+            if profundidad == 0: medida["memoria_pico_kb"] = round((pico - memoria_inicio) / 1024, 1)
+        _publicar(medida)
+
+def medir(nombre=None):
+    """Decorador: mide cada llamada como una etapa y cuenta las filas procesadas"""
+    def decorador(funcion):
+        etiqueta = nombre or funcion.__qualname__
+
+        @functools.wraps(funcion)
+        def envoltura(*args, **kwargs):
+            if not _estado["activa"]: return funcion(*args, **kwargs)
+            with etapa(etiqueta) as medida:
+                resultado = funcion(*args, **kwargs)
+                medida["filas"] = _contar_filas(resultado, args)
+            return resultado
+        return envoltura
+    return decorador
+
+_modo = os.environ.get("LIQUIDADOR_INSTRUMENTACION", "").strip().lower()
+if _modo and _modo not in ("0", "no", "false"):
+    activar(memoria=(_modo == "memoria"))
@@ -2,75 +2,158 @@ import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
 from dateutil.relativedelta import relativedelta
-from utils import calcular_semanas_minimas_mujeres
+from utils import calcular_semanas_minimas_mujeres, obtener_tabla_ipc
+from instrumentacion import medir
+from historia import HistoriaLaboral
+
+SMMLV = 1423500
+GRANULARIDADES = ("anual", "mensual")
+EDAD_797 = {"Masculino": 62, "Femenino": 57}
+
+def semanas_minimas_797(genero, anio_pension):
+    """Semanas mínimas Ley 797 (reducción gradual para mujeres desde 2026)"""
+    if genero == 'Femenino':
+        return calcular_semanas_minimas_mujeres(anio_pension)
+    return 1300
+
+def tasa_reemplazo_797_vectorizada(ibl, semanas, semanas_minimas, limitar_semanas_cotizadas=True, smmlv=SMMLV):
+    """
+    Misma fórmula de calcular_tasa_reemplazo_797 aplicada sobre arreglos
+    (mismas operaciones, mismos resultados). Devuelve (mesadas, tasas).
+    """
+    ibl = np.asarray(ibl, dtype=float)
+    semanas_computables = np.asarray(semanas, dtype=float)
+    if limitar_semanas_cotizadas:
+        semanas_computables = np.minimum(semanas_computables, 1800)
+
+    r_inicial = 65.5 - (0.5 * (ibl / smmlv))
+    semanas_extra = semanas_computables - semanas_minimas
+    puntos_extra = np.where(semanas_extra > 0, np.trunc(semanas_extra / 50) * 1.5, 0.0)
+
+    tasa = np.clip(r_inicial + puntos_extra, 0, 80)
+    mesada = np.maximum(ibl * (tasa / 100), smmlv)
+
+    sin_ibl = ibl <= 0
+    return np.where(sin_ibl, 0.0, mesada), np.where(sin_ibl, 0.0, tasa)
 
 class LiquidadorPension:
-    def __init__(self, historia_laboral, genero, fecha_nacimiento):
-        self.df = historia_laboral
+    def __init__(self, historia_laboral, genero, fecha_nacimiento, tabla_ipc=None):
+        # Acepta un DataFrame limpio o una HistoriaLaboral; los cálculos trabajan
+        # directo sobre los arreglos tipados de la historia
+        if isinstance(historia_laboral, HistoriaLaboral):
+            self.historia = historia_laboral
+            self._df = None
+        else:
+            self.historia = HistoriaLaboral.desde_dataframe(historia_laboral)
+            self._df = historia_laboral
         self.genero = genero
         self.fecha_nacimiento = pd.to_datetime(fecha_nacimiento)
         self.fecha_actual = datetime.now()
         
-        # IPC HISTÓRICO (1967 - 2026)
-        self.ipc_historico = {
-            1967: 8.3, 1968: 6.8, 1969: 7.7, 1970: 6.7, 1971: 11.6, 1972: 13.6,
-            1973: 20.3, 1974: 24.3, 1975: 23.3, 1976: 20.5, 1977: 33.7, 1978: 17.8,
-            1979: 24.8, 1980: 26.5, 1981: 27.5, 1982: 24.5, 1983: 19.8, 1984: 16.3,
-            1985: 24.0, 1986: 18.9, 1987: 23.3, 1988: 28.1, 1989: 25.8, 1990: 29.1,
-            1991: 30.4, 1992: 27.0, 1993: 22.6, 1994: 22.6, 1995: 19.5, 1996: 21.6,
-            1997: 17.7, 1998: 16.7, 1999: 9.2, 2000: 8.8, 2001: 7.7, 2002: 7.0,
-            2003: 6.5, 2004: 5.5, 2005: 4.9, 2006: 4.5, 2007: 5.7, 2008: 7.7,
-            2009: 2.0, 2010: 3.2, 2011: 3.7, 2012: 2.4, 2013: 1.9, 2014: 3.7,
-            2015: 6.8, 2016: 5.8, 2017: 4.1, 2018: 3.2, 2019: 3.8, 2020: 1.6,
-            2021: 5.6, 2022: 13.1, 2023: 9.3, 2024: 5.0, 2025: 4.0, 2026: 3.5
-        }
+        # IPC HISTÓRICO (1967 - 2026): tabla compartida y precalculada en utils
+        self.tabla_ipc = tabla_ipc if tabla_ipc is not None else obtener_tabla_ipc()
+        self.ipc_historico = self.tabla_ipc.serie
+        self._ordenada = None
+
+    @property
+    def df(self):
+        """Historia como DataFrame (la original, o construida a demanda)"""
+        if self._df is None: self._df = self.historia.a_dataframe()
+        return self._df
+
+    def obtener_factores_ipc(self, fechas_inicio, fecha_corte, granularidad="anual"):
+        """
+        Versión vectorizada de obtener_factor_ipc para una serie de fechas.
+        granularidad="mensual" indexa mes a mes con el índice mensual acumulado.
+        """
+        if granularidad == "mensual":
+            return self.tabla_ipc.factores_mensuales(fechas_inicio, fecha_corte)
+        if granularidad != "anual":
+            raise ValueError(f"Granularidad no soportada: {granularidad} (use {GRANULARIDADES})")
+        return self.tabla_ipc.factores_anuales(fechas_inicio, fecha_corte)
 
     def obtener_factor_ipc(self, fecha_inicio, fecha_corte):
         """Calcula inflación acumulada hasta una fecha de corte específica"""
-        anio_inicio = fecha_inicio.year
-        anio_fin = fecha_corte.year
-        
-        min_anio = min(self.ipc_historico.keys())
-        max_anio = max(self.ipc_historico.keys())
-        
-        if anio_inicio < min_anio: anio_inicio = min_anio
-        if anio_fin > max_anio: anio_fin = max_anio
+        # Búsqueda O(1) en la tabla precalculada (mismo resultado que la productoria)
+        return self.tabla_ipc.factor(fecha_inicio, fecha_corte)
+
+    def _historia_ordenada(self):
+        """
+        Historia ordenada por 'Hasta' con las semanas acumuladas. Se calcula
+        una sola vez por historia y se reutiliza en todas las consultas.
+        """
+        h = self.historia
+        if self._ordenada is None or self._ordenada["historia"] is not h:
+            orden = np.argsort(h.hasta, kind='stable')
+            acumulado = np.cumsum(h.semanas[orden])
+            self._ordenada = {
+                "historia": h,
+                "orden": orden,
+                "hasta": h.hasta[orden],
+                "acumulado": acumulado,
+                # Con semanas negativas o vacías el acumulado deja de ser creciente
+                "monotono": bool(np.all(np.diff(acumulado) >= 0)),
+                "ultima_cotizacion": h.ultima_cotizacion()
+            }
+        return self._ordenada
+
+    @staticmethod
+    def _indice_cruce(acumulado, monotono, req_sem):
+        """Primer índice con acumulado >= req_sem (O(log n) si es creciente)"""
+        if monotono:
+            k = int(np.searchsorted(acumulado, req_sem, side='left'))
+        else:
+            cruces = np.flatnonzero(acumulado >= req_sem)
+            k = int(cruces[0]) if len(cruces) else len(acumulado)
+        return k if k < len(acumulado) else None
+
+    def requisitos_estatus(self, anio_requisito=None):
+        """Fecha de cumplimiento de edad y semanas requeridas (Ley 797)"""
+        req_edad = EDAD_797.get(self.genero, EDAD_797["Femenino"])
+        fecha_cumple_edad = self.fecha_nacimiento + relativedelta(years=req_edad)
         
-        factor = 1.0
-        # Se indexa hasta el año anterior a la fecha de corte
-        for anio in range(anio_inicio, anio_fin):
-            if anio in self.ipc_historico:
-                factor *= (1 + (self.ipc_historico[anio] / 100.0))
-        return factor
+        # 1300 semanas; para mujeres la reducción del año actual (o el año pedido)
+        req_sem = semanas_minimas_797(self.genero, anio_requisito if anio_requisito else datetime.now().year)
+        return fecha_cumple_edad, req_sem
 
-    def determinar_fechas_clave(self):
+    def fecha_cruce_semanas(self, req_sem, hasta_extra=None, semanas_extra=None):
+        """
+        Fecha en que las semanas acumuladas alcanzan req_sem (None si nunca).
+        hasta_extra/semanas_extra: periodos posteriores a la historia (p. ej.
+        meses proyectados); se acumulan a continuación sin reordenar.
+        """
+        orden = self._historia_ordenada()
+        k = self._indice_cruce(orden["acumulado"], orden["monotono"], req_sem)
+        if k is not None: return pd.Timestamp(orden["hasta"][k])
+        if semanas_extra is None or len(semanas_extra) == 0: return None
+
+        total = orden["acumulado"][-1] if len(orden["acumulado"]) else 0.0
+        acumulado_extra = np.cumsum(np.concatenate([[total], np.asarray(semanas_extra, dtype=float)]))[1:]
+        k = self._indice_cruce(acumulado_extra, bool(np.all(np.diff(acumulado_extra) >= 0)), req_sem)
+        return pd.Timestamp(hasta_extra[k]) if k is not None else None
+
+    @medir()
+    def determinar_fechas_clave(self, req_semanas=None, anio_requisito=None):
         """
         Determina: Fecha Cumplimiento Edad, Fecha Cumplimiento Semanas,
         Fecha Estatus y Fecha de Indexación (Corte).
+        req_semanas / anio_requisito permiten consultar otros requisitos
+        (p. ej. la reducción para mujeres por año) sin reordenar la historia.
         """
         # 1. FECHA EDAD
-        req_edad = 62 if self.genero == "Masculino" else 57
-        fecha_cumple_edad = self.fecha_nacimiento + relativedelta(years=req_edad)
-        
-        # 2. FECHA SEMANAS (Iterar hasta encontrar la semana 1300/req)
-        # Requisito base
-        req_sem = 1300
-        if self.genero == "Femenino":
-            # Usamos el año actual para definir el requisito, o el año de cumplimiento edad si es menor
-            req_sem = calcular_semanas_minimas_mujeres(datetime.now().year)
-            
-        df_sort = self.df.sort_values('Hasta')
-        acumulado = 0
-        fecha_cumple_semanas = None
-        
-        for _, row in df_sort.iterrows():
-            acumulado += row['Semanas']
-            if acumulado >= req_sem:
-                fecha_cumple_semanas = row['Hasta']
-                break
+        fecha_cumple_edad, req_sem = self.requisitos_estatus(anio_requisito)
+        if req_semanas is not None: req_sem = req_semanas
         
+        # 2. FECHA SEMANAS (búsqueda binaria sobre el acumulado hasta la semana 1300/req)
+        fecha_cumple_semanas = self.fecha_cruce_semanas(req_sem)
+        return self.componer_fechas_clave(
+            fecha_cumple_edad, fecha_cumple_semanas, self._historia_ordenada()["ultima_cotizacion"]
+        )
+
+    def componer_fechas_clave(self, fecha_cumple_edad, fecha_cumple_semanas, ultima_cotizacion):
+        """Estatus, fecha de corte y efectividad a partir de los cumplimientos"""
         # 3. ESTATUS JURÍDICO
-        tiene_estatus = (fecha_cumple_semanas is not None) and (acumulado >= req_sem)
+        tiene_estatus = fecha_cumple_semanas is not None
         fecha_estatus = None
         
         if tiene_estatus:
@@ -86,7 +169,6 @@ class LiquidadorPension:
         #    A. Si NO hay cotizaciones posteriores al estatus -> Fecha Estatus
         #    B. Si HAY cotizaciones posteriores -> Fecha Última Cotización
         
-        ultima_cotizacion = df_sort['Hasta'].max()
         razon_corte = ""
         fecha_corte = datetime.now() # Default
         
@@ -96,9 +178,10 @@ class LiquidadorPension:
         else:
             # Verificar si hay cotizaciones posteriores a la fecha de estatus
             # Damos un margen de 30 días para no contar el mismo mes
-            cotizaciones_posteriores = df_sort[df_sort['Hasta'] > (fecha_estatus + timedelta(days=30))]
+            # (la historia está ordenada: basta comparar contra la última cotización)
+            hay_posteriores = ultima_cotizacion > (fecha_estatus + timedelta(days=30))
             
-            if cotizaciones_posteriores.empty:
+            if not hay_posteriores:
                 fecha_corte = fecha_estatus
                 razon_corte = "Fecha de Estatus (Sin semanas posteriores)"
             else:
@@ -119,59 +202,110 @@ class LiquidadorPension:
             "ultima_cotizacion": ultima_cotizacion
         }
 
-    def calcular_ibl_indexado(self, fecha_corte_personalizada=None, metodo="toda_vida"):
-        if self.df.empty: return 0.0, pd.DataFrame()
+    def _indexar(self, f_corte, filtro=None, granularidad="anual"):
+        """Construye la tabla de soporte con el IBC indexado a la fecha de corte"""
+        h = self.historia
+        desde, hasta, ibc_hist, semanas = h.desde, h.hasta, h.ibc, h.semanas
+        if filtro is not None:
+            desde, hasta, ibc_hist, semanas = desde[filtro], hasta[filtro], ibc_hist[filtro], semanas[filtro]
+
+        # Indexamos hasta la FECHA DE CORTE determinada por las reglas (vectorizado)
+        ibc_hist = np.where(ibc_hist <= 0, 0.0, ibc_hist)
+        factores = self.obtener_factores_ipc(hasta, f_corte, granularidad)
+
+        return pd.DataFrame({
+            'Desde': desde,
+            'Hasta': hasta,
+            'IBC_Historico': ibc_hist,
+            'Factor_IPC': factores,
+            'IBC_Actualizado': ibc_hist * factores,
+            'Semanas': semanas
+        })
+
+    def _fecha_inicio_10(self):
+        # La norma dice últimos 10 años cotizados.
+        # Tomamos la fecha fin del último registro válido y restamos 10 años.
+        return self.historia.ultima_cotizacion() - relativedelta(years=10)
+
+    @medir()
+    def calcular_ibl_indexado(self, fecha_corte_personalizada=None, metodo="toda_vida", granularidad="anual"):
+        if self.historia.vacia: return 0.0, pd.DataFrame()
         
         # Si no mandan fecha, usamos hoy, pero idealmente se debe mandar la calculada
         f_corte = fecha_corte_personalizada if fecha_corte_personalizada else self.fecha_actual
         
-        df_calc = self.df.copy()
-        
         # Filtro Últimos 10 años (Desde la fecha de corte hacia atrás)
+        filtro = None
         if metodo == "ultimos_10":
-            # La norma dice últimos 10 años cotizados. 
-            # Tomamos la fecha fin del último registro válido y restamos 10 años.
-            fecha_max_cot = df_calc['Hasta'].max()
-            fecha_inicio_10 = fecha_max_cot - relativedelta(years=10)
-            df_calc = df_calc[df_calc['Hasta'] >= fecha_inicio_10]
-
-        detalles = []
-        for _, row in df_calc.iterrows():
-            ibc_hist = row['IBC']
-            if ibc_hist <= 0: ibc_hist = 0
-            
-            # Indexamos hasta la FECHA DE CORTE determinada por las reglas
-            factor = self.obtener_factor_ipc(row['Hasta'], f_corte)
-            ibc_act = ibc_hist * factor
-            
-            detalles.append({
-                'Desde': row['Desde'],
-                'Hasta': row['Hasta'],
-                'IBC_Historico': ibc_hist,
-                'Factor_IPC': factor,
-                'IBC_Actualizado': ibc_act,
-                'Semanas': row['Semanas']
-            })
-            
-        df_detalles = pd.DataFrame(detalles)
+            filtro = self.historia.hasta >= np.datetime64(self._fecha_inicio_10())
+
+        df_detalles = self._indexar(f_corte, filtro, granularidad)
         if df_detalles.empty: return 0.0, pd.DataFrame()
         
         ibl = df_detalles['IBC_Actualizado'].mean()
         return ibl, df_detalles
 
-    def calcular_tasa_reemplazo_797(self, ibl, semanas, anio_pension, limitar_semanas_cotizadas=True):
-        smmlv = 1423500 
+    def preparar_indexacion(self, fecha_corte_personalizada=None, granularidad="anual"):
+        """
+        Indexa toda la historia una sola vez y deja listas las sumas prefijas
+        del IBC actualizado ordenado por 'Hasta'. Cualquier ventana
+        (últimos 10 años, toda la vida, etc.) se resuelve luego en O(log n).
+        """
+        f_corte = fecha_corte_personalizada if fecha_corte_personalizada else self.fecha_actual
+        det_vida = self._indexar(f_corte, granularidad=granularidad)
+
+        hasta = det_vida['Hasta'].to_numpy()
+        orden = np.argsort(hasta, kind='stable')
+        return {
+            "det_vida": det_vida,
+            "hasta_ordenado": hasta[orden],
+            "acumulado": np.cumsum(det_vida['IBC_Actualizado'].to_numpy()[orden])
+        }
+
+    def ibl_desde(self, indexacion, fecha_inicio):
+        """IBL promedio de los periodos con 'Hasta' >= fecha_inicio, usando las sumas prefijas"""
+        acumulado = indexacion["acumulado"]
+        n = len(acumulado)
+        k = int(np.searchsorted(indexacion["hasta_ordenado"], np.datetime64(fecha_inicio), side='left'))
+        if k >= n: return 0.0
+        previo = acumulado[k - 1] if k > 0 else 0.0
+        return float((acumulado[-1] - previo) / (n - k))
+
+    @medir()
+    def calcular_ibl_dual(self, fecha_corte_personalizada=None, granularidad="anual"):
+        """
+        Calcula en una sola pasada de indexación el IBL de los últimos 10 años
+        y el de toda la vida, con sus tablas de soporte y el más favorable.
+        """
+        if self.historia.vacia:
+            return {
+                "ibl_10": 0.0, "det_10": pd.DataFrame(),
+                "ibl_vida": 0.0, "det_vida": pd.DataFrame(),
+                "ibl": 0.0, "origen_ibl": "Últimos 10 Años"
+            }
+
+        indexacion = self.preparar_indexacion(fecha_corte_personalizada, granularidad)
+        det_vida = indexacion["det_vida"]
+        fecha_inicio_10 = self._fecha_inicio_10()
+
+        ibl_vida = float(indexacion["acumulado"][-1] / len(det_vida))
+        ibl_10 = self.ibl_desde(indexacion, fecha_inicio_10)
+        det_10 = det_vida[det_vida['Hasta'] >= fecha_inicio_10].reset_index(drop=True)
+
+        return {
+            "ibl_10": ibl_10, "det_10": det_10,
+            "ibl_vida": ibl_vida, "det_vida": det_vida,
+            "ibl": max(ibl_10, ibl_vida),
+            "origen_ibl": "Últimos 10 Años" if ibl_10 >= ibl_vida else "Toda la Vida"
+        }
+
+    @medir()
+    def calcular_tasa_reemplazo_797(self, ibl, semanas, anio_pension, limitar_semanas_cotizadas=True, smmlv=SMMLV):
         if ibl <= 0: return 0, 0, {}
         
         r_inicial = 65.5 - (0.5 * (ibl / smmlv))
         
-        semanas_minimas = 1300
-        if self.genero == 'Femenino':
-            if anio_pension < 2026: semanas_minimas = 1300
-            elif anio_pension == 2026: semanas_minimas = 1250
-            else:
-                diff = anio_pension - 2026
-                semanas_minimas = max(1000, 1250 - (25 * diff))
+        semanas_minimas = semanas_minimas_797(self.genero, anio_pension)
         
         semanas_computables = semanas
         if limitar_semanas_cotizadas and semanas_computables > 1800:
@@ -196,3 +330,21 @@ class LiquidadorPension:
             "tasa_final": tasa
         }
         return mesada, tasa, detalle
+
+    @medir()
+    def liquidar(self, limitar_semanas_cotizadas=True, anio_pension=None, granularidad="anual"):
+        """
+        Flujo completo sin interfaz: fechas clave, IBL más favorable y
+        tasa de reemplazo Ley 797. Usado por la app y por el modo lote.
+        """
+        anio = anio_pension if anio_pension else datetime.now().year
+        fechas = self.determinar_fechas_clave()
+        ibls = self.calcular_ibl_dual(fechas['fecha_corte'], granularidad)
+        semanas = self.historia.semanas.sum()
+        mesada, tasa, detalle = self.calcular_tasa_reemplazo_797(
+            ibls['ibl'], semanas, anio, limitar_semanas_cotizadas
+        )
+        return {
+            "fechas": fechas, **ibls,
+            "semanas": semanas, "mesada": mesada, "tasa": tasa, "detalle": detalle
+        }
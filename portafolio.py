@@ -0,0 +1,172 @@
+"""
+Liquidación Ley 797 de muchos afiliados a la vez.
+
+Recibe las historias concatenadas (una tabla con la clave del afiliado, o
+arreglos con un índice de offsets como los del almacén) y calcula para
+todos las fechas clave, los dos IBL, la tasa y la mesada con operaciones
+agrupadas de NumPy, con los mismos resultados que LiquidadorPension.liquidar.
+
+Para reproducir exactamente cada suma (np.sum es por pares y depende del
+largo), los afiliados se agrupan por número de periodos: cada grupo es una
+matriz afiliados x periodos y todas las reducciones van por filas, igual
+que sobre la historia de una sola persona.
+"""
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from instrumentacion import medir
+from logic import EDAD_797, GRANULARIDADES, semanas_minimas_797, tasa_reemplazo_797_vectorizada
+from utils import obtener_tabla_ipc
+
+def _sumar_anios(fechas, anios):
+    """fechas + relativedelta(years=anios), vectorizado (29 de febrero -> 28)"""
+    return (pd.DatetimeIndex(fechas) + pd.DateOffset(years=anios)).to_numpy()
+
+def _fechas_cumple_edad(generos, nacimientos):
+    edades = np.array([EDAD_797.get(g, EDAD_797["Femenino"]) for g in generos])
+    resultado = np.empty(len(nacimientos), dtype="datetime64[ns]")
+    for edad in np.unique(edades):
+        filas = edades == edad
+        resultado[filas] = _sumar_anios(nacimientos[filas], int(edad))
+    return resultado
+
+def _factores(tabla, hasta, cortes, granularidad):
+    """Factores IPC de una matriz de fechas (una fila por afiliado) a su fecha de corte"""
+    if granularidad == "mensual":
+        m_inicio = tabla.ordinal_mes(hasta)
+        m_corte = tabla.ordinal_mes(cortes)[:, None]
+        return np.where(m_corte > m_inicio, tabla.indice_mensual[m_corte] / tabla.indice_mensual[m_inicio], 1.0)
+    n = tabla.factores.shape[0] - 1
+    anios, _ = tabla._anio_mes(hasta)
+    anios_corte, _ = tabla._anio_mes(cortes)
+    return tabla.factores[np.clip(anios - tabla.min_anio, 0, n), np.clip(anios_corte - tabla.min_anio, 0, n)[:, None]]
+
+@medir()
+def liquidar_concatenado(hasta, ibc, semanas, offsets, generos, fechas_nacimiento,
+                         limitar_semanas_cotizadas=True, anio_pension=None, granularidad="anual", tabla_ipc=None):
+    """
+    Núcleo sobre arreglos: las filas del afiliado i son [offsets[i], offsets[i+1])
+    en el orden original de su historia. Devuelve un DataFrame con una fila
+    por afiliado y las columnas de liquidar (fechas clave incluidas).
+    """
+    if granularidad not in GRANULARIDADES:
+        raise ValueError(f"Granularidad no soportada: {granularidad} (use {GRANULARIDADES})")
+    tabla = tabla_ipc if tabla_ipc is not None else obtener_tabla_ipc()
+    hasta = np.asarray(hasta).astype("datetime64[D]", copy=False)
+    ibc = np.asarray(ibc, dtype=np.float64)
+    semanas = np.asarray(semanas, dtype=np.float64)
+    offsets = np.asarray(offsets, dtype=np.int64)
+    generos = np.asarray(generos, dtype=object)
+    nacimientos = pd.DatetimeIndex(pd.to_datetime(fechas_nacimiento)).to_numpy()
+    n = len(offsets) - 1
+    largos = np.diff(offsets)
+
+    ahora = datetime.now()
+    anio = anio_pension if anio_pension else ahora.year
+    # Requisitos con el año actual (como requisitos_estatus) y semanas mínimas del año de pensión
+    requeridas = np.array([semanas_minimas_797(g, ahora.year) for g in generos], dtype=np.float64)
+    minimas = np.array([semanas_minimas_797(g, anio) for g in generos], dtype=np.float64)
+    cumple_edad = _fechas_cumple_edad(generos, nacimientos)
+
+    # Última cotización e inicio de la ventana de 10 años de todos a la vez
+    con_historia = largos > 0
+    ultima = np.full(n, np.datetime64("NaT"), dtype="datetime64[ns]")
+    inicio_10 = np.full(n, np.datetime64("NaT"), dtype="datetime64[ns]")
+    if con_historia.any():
+        ultima[con_historia] = np.maximum.reduceat(hasta, offsets[:-1][con_historia])
+        inicio_10[con_historia] = _sumar_anios(ultima[con_historia], -10)
+
+    total_semanas = np.zeros(n)
+    cumple_semanas = np.full(n, np.datetime64("NaT"), dtype="datetime64[ns]")
+    ibl_10 = np.zeros(n)
+    ibl_vida = np.zeros(n)
+    cortes = np.full(n, np.datetime64(ahora), dtype="datetime64[ns]")
+    tiene_estatus = np.zeros(n, dtype=bool)
+    estatus = np.full(n, np.datetime64("NaT"), dtype="datetime64[ns]")
+    posteriores = np.zeros(n, dtype=bool)
+
+    for largo in np.unique(largos[con_historia]):
+        grupo = np.flatnonzero(largos == largo)
+        filas = offsets[grupo][:, None] + np.arange(largo)
+        hasta_g, semanas_g = hasta[filas], semanas[filas]
+
+        # 1. Semanas, orden por 'Hasta' y acumulado (mismo orden estable que _historia_ordenada)
+        total_semanas[grupo] = semanas_g.sum(axis=1)
+        orden = np.argsort(hasta_g, axis=1, kind="stable")
+        hasta_ord = np.take_along_axis(hasta_g, orden, axis=1)
+        acumulado = np.cumsum(np.take_along_axis(semanas_g, orden, axis=1), axis=1)
+        ultima_g = ultima[grupo]
+
+        # 2. Fechas clave: primer periodo que alcanza las semanas requeridas
+        alcanza = acumulado >= requeridas[grupo][:, None]
+        cumple = alcanza.any(axis=1)
+        k = alcanza.argmax(axis=1)
+        semanas_cumple = np.where(cumple, hasta_ord[np.arange(len(grupo)), k], np.datetime64("NaT"))
+        cumple_semanas[grupo] = semanas_cumple
+        estatus_g = np.maximum(cumple_edad[grupo], semanas_cumple.astype("datetime64[ns]"))
+        posteriores_g = cumple & (ultima_g > estatus_g + np.timedelta64(30, "D"))
+        corte_g = np.where(cumple, np.where(posteriores_g, ultima_g, estatus_g), cortes[grupo])
+        tiene_estatus[grupo], estatus[grupo], posteriores[grupo], cortes[grupo] = cumple, estatus_g, posteriores_g, corte_g
+
+        # 3. IBC indexado a la fecha de corte de cada afiliado y sumas prefijas
+        ibc_g = ibc[filas]
+        actualizado = np.where(ibc_g <= 0, 0.0, ibc_g) * _factores(tabla, hasta_g, corte_g, granularidad)
+        acumulado_ibc = np.cumsum(np.take_along_axis(actualizado, orden, axis=1), axis=1)
+        total = acumulado_ibc[:, -1]
+        ibl_vida[grupo] = total / largo
+
+        # 4. Últimos 10 años: periodos con 'Hasta' >= última cotización - 10 años
+        k10 = (hasta_ord < inicio_10[grupo][:, None]).sum(axis=1)
+        previo = np.where(k10 > 0, acumulado_ibc[np.arange(len(grupo)), np.maximum(k10 - 1, 0)], 0.0)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            ibl_10[grupo] = np.where(k10 < largo, (total - previo) / (largo - k10), 0.0)
+
+    ibl = np.maximum(ibl_10, ibl_vida)
+    mesada, tasa = tasa_reemplazo_797_vectorizada(ibl, total_semanas, minimas, limitar_semanas_cotizadas)
+    razon = np.where(~tiene_estatus, "Año de Estudio (No acredita estatus)",
+                     np.where(posteriores, "Última Cotización (Con semanas posteriores al estatus)",
+                              "Fecha de Estatus (Sin semanas posteriores)"))
+    return pd.DataFrame({
+        "periodos": largos, "semanas": total_semanas,
+        "fecha_cumple_edad": cumple_edad, "fecha_cumple_semanas": cumple_semanas,
+        "fecha_estatus": estatus, "tiene_estatus": tiene_estatus,
+        "fecha_corte": cortes, "razon_corte": razon,
+        "fecha_efectividad": cortes + np.timedelta64(1, "D"),
+        "ultima_cotizacion": ultima,
+        "ibl_10": ibl_10, "ibl_vida": ibl_vida, "ibl": ibl,
+        "origen_ibl": np.where(ibl_10 >= ibl_vida, "Últimos 10 Años", "Toda la Vida"),
+        "tasa": tasa, "mesada": mesada
+    })
+
+def liquidar_portafolio(historias, afiliados, columna_afiliado="afiliado", limitar_semanas_cotizadas=True,
+                        anio_pension=None, granularidad="anual", tabla_ipc=None):
+    """
+    'historias': tabla concatenada con columna_afiliado, Hasta, IBC y Semanas
+    (cada historia en su orden original). 'afiliados': tabla con
+    columna_afiliado, genero y fecha_nacimiento. Devuelve una fila por
+    afiliado, en el orden de 'afiliados'.
+    """
+    afiliados = afiliados.reset_index(drop=True)
+    posicion = pd.Index(afiliados[columna_afiliado])
+    if not posicion.is_unique:
+        raise ValueError(f"'{columna_afiliado}' repetido en la tabla de afiliados")
+    # Factorizar primero: solo las claves distintas se buscan en 'afiliados'
+    codigos, claves = pd.factorize(historias[columna_afiliado])
+    posiciones = posicion.get_indexer(claves)
+    if (posiciones < 0).any():
+        raise ValueError(f"Historias sin afiliado en la tabla: {list(claves[posiciones < 0][:5])}")
+    codigos = posiciones[codigos]
+
+    # Orden estable por afiliado: cada historia conserva el orden de sus filas
+    orden = np.argsort(codigos, kind="stable")
+    offsets = np.concatenate([[0], np.cumsum(np.bincount(codigos, minlength=len(afiliados)))])
+    resultado = liquidar_concatenado(
+        historias["Hasta"].to_numpy()[orden], historias["IBC"].to_numpy(dtype=np.float64)[orden],
+        historias["Semanas"].to_numpy(dtype=np.float64)[orden], offsets,
+        afiliados["genero"].to_numpy(), afiliados["fecha_nacimiento"],
+        limitar_semanas_cotizadas, anio_pension, granularidad, tabla_ipc
+    )
+    resultado.insert(0, columna_afiliado, posicion)
+    return resultado
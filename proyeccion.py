@@ -0,0 +1,132 @@
+"""
+Motor de escenarios para la pestaña PROYECCIÓN.
+
+Evalúa una grilla completa de estrategias (valor del aporte x años x
+estrategia) reutilizando la historia ya indexada: por cada horizonte solo
+se calculan los meses agregados (fechas clave incluidas), y todos los
+valores se resuelven a la vez con operaciones vectorizadas. Reproduce la
+simulación original de app.py (periodos de 30 días cada 31, 4.29 semanas
+por mes, aporte del 28.5%).
+
+Los IBL salen de sumas prefijas, igual que LiquidadorPension.liquidar; frente
+a calcular_ibl_indexado (media por pares de NumPy) difieren solo por
+redondeo (~1e-16 relativo), así que las comparaciones usan tolerancia.
+"""
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+from dateutil.relativedelta import relativedelta
+
+from logic import semanas_minimas_797, tasa_reemplazo_797_vectorizada
+from instrumentacion import medir
+
+ESTRATEGIAS = ("Cotizar Indep.", "Extra")
+TASA_APORTE = 0.285
+SEMANAS_MES = 4.29
+# Diferencias de mesada por debajo de esto son redondeo, no mejora
+TOLERANCIA_RELATIVA = 1e-9
+
+def periodos_futuros(historia, meses):
+    """Periodos mensuales simulados a partir de la última cotización (sin IBC)"""
+    inicio = historia.ultima_cotizacion() + timedelta(days=1)
+    desde = inicio + pd.to_timedelta(np.arange(meses) * 31, unit='D')
+    return pd.DataFrame({
+        "Desde": desde,
+        "Hasta": desde + timedelta(days=30),
+        "Semanas": np.full(meses, SEMANAS_MES)
+    })
+
+def nuevo_ibc_estrategia(estrategia, valor, ultimo_ibc):
+    """IBC de los meses simulados: el valor cotizado o el último IBC más el extra"""
+    return valor if "Cotizar" in estrategia else ultimo_ibc + valor
+
+@medir()
+def simular_escenarios(liq, valores, anios, estrategias=ESTRATEGIAS,
+                       limitar_semanas_cotizadas=True, mesada_actual=None, granularidad="anual"):
+    """
+    Evalúa todas las combinaciones de estrategia x valor x años sobre la
+    historia de 'liq' y devuelve un DataFrame con IBL, tasa, mesada,
+    inversión, incremento y años de recuperación (ROI) de cada una.
+    """
+    h = liq.historia
+    valores = np.atleast_1d(np.asarray(valores, dtype=float))
+    anios = sorted(set(int(a) for a in np.atleast_1d(anios)))
+    if h.vacia or not anios or valores.size == 0: return pd.DataFrame()
+
+    if mesada_actual is None:
+        mesada_actual = liq.liquidar(limitar_semanas_cotizadas, granularidad=granularidad)['mesada']
+
+    ultimo_ibc = h.ibc[-1]
+    futuros = periodos_futuros(h, max(anios) * 12)
+    anio_base = datetime.now().year
+
+    # Historia ordenada por 'Hasta' una sola vez (los meses futuros siempre van después)
+    orden = np.argsort(h.hasta, kind='stable')
+    hasta_hist_ord = h.hasta[orden]
+    ibc_hist_ord = np.where(h.ibc <= 0, 0.0, h.ibc)[orden]
+    semanas_hist = h.semanas
+    n_hist = len(h)
+
+    fecha_cumple_edad, req_sem = liq.requisitos_estatus()
+
+    bloques = []
+    for a in anios:
+        meses = a * 12
+        fut = futuros.iloc[:meses]
+
+        # Fechas clave con los meses agregados: el acumulado de semanas continúa
+        # sobre la historia ya ordenada (el IBC no influye en ellas)
+        fecha_cumple_semanas = liq.fecha_cruce_semanas(req_sem, fut['Hasta'].to_numpy(), fut['Semanas'].to_numpy())
+        fechas = liq.componer_fechas_clave(fecha_cumple_edad, fecha_cumple_semanas, fut['Hasta'].iloc[-1])
+        f_corte = fechas['fecha_corte']
+
+        # Historia indexada a este corte + factores de los meses nuevos
+        acumulado_hist = np.cumsum(ibc_hist_ord * liq.obtener_factores_ipc(hasta_hist_ord, f_corte, granularidad))
+        factores_fut = liq.obtener_factores_ipc(fut['Hasta'], f_corte, granularidad)
+        hasta_total = np.concatenate([hasta_hist_ord, fut['Hasta'].to_numpy()])
+        n_total = n_hist + meses
+        fecha_inicio_10 = fut['Hasta'].iloc[-1] - relativedelta(years=10)
+        k = int(np.searchsorted(hasta_total, np.datetime64(fecha_inicio_10), side='left'))
+
+        semanas = np.concatenate([semanas_hist, fut['Semanas'].to_numpy()]).sum()
+        minimas = semanas_minimas_797(liq.genero, anio_base + a)
+
+        for estrategia in estrategias:
+            nuevo_ibc = nuevo_ibc_estrategia(estrategia, valores, ultimo_ibc)
+            ibc_fut = np.where(nuevo_ibc <= 0, 0.0, nuevo_ibc)
+
+            # Sumas prefijas continuando desde la historia: (valores x meses)
+            inicio = np.full((len(valores), 1), acumulado_hist[-1] if n_hist else 0.0)
+            acumulado_fut = np.cumsum(np.hstack([inicio, ibc_fut[:, None] * factores_fut[None, :]]), axis=1)[:, 1:]
+
+            total = acumulado_fut[:, -1]
+            if k == 0: previo = np.zeros(len(valores))
+            elif k <= n_hist: previo = np.full(len(valores), acumulado_hist[k - 1])
+            else: previo = acumulado_fut[:, k - n_hist - 1]
+            ibl_vida = total / n_total
+            ibl_10 = (total - previo) / (n_total - k)
+            ibl = np.maximum(ibl_10, ibl_vida)
+
+            mesada, tasa = tasa_reemplazo_797_vectorizada(ibl, semanas, minimas, limitar_semanas_cotizadas)
+            inversion = valores * TASA_APORTE * a * 12
+            delta = np.where(np.isclose(mesada, mesada_actual, rtol=TOLERANCIA_RELATIVA, atol=0.0), 0.0,
+                             mesada - mesada_actual)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                roi = np.where(delta > 0, inversion / delta / 12, 0.0)
+
+            bloques.append(pd.DataFrame({
+                "estrategia": estrategia, "valor": valores, "anios": a,
+                "nuevo_ibc": nuevo_ibc, "inversion": inversion,
+                "fecha_corte": f_corte, "semanas": semanas,
+                "ibl": ibl, "tasa": tasa, "mesada": mesada,
+                "delta": delta, "roi": roi
+            }))
+
+    return pd.concat(bloques, ignore_index=True)
+
+def mejor_estrategia(escenarios):
+    """Escenario con mejora en la mesada que se recupera en menos años"""
+    con_mejora = escenarios[escenarios['delta'] > 0]
+    if con_mejora.empty: return None
+    return con_mejora.sort_values(['roi', 'delta'], ascending=[True, False]).iloc[0]
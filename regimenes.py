@@ -0,0 +1,204 @@
+"""
+Motor de regímenes pensionales.
+
+Cada régimen aporta sus requisitos (edad y semanas), las ventanas de IBL
+que admite, su fórmula de tasa y, si aplica, las condiciones de acceso
+(p. ej. el régimen de transición del art. 36 de la Ley 100). Todos se
+evalúan sobre la misma historia ordenada e indexada: una sola matriz de
+factores IPC (una fila por fecha de corte distinta) y sus sumas prefijas,
+de modo que agregar regímenes no repite la indexación.
+"""
+from abc import ABC, abstractmethod
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+from dateutil.relativedelta import relativedelta
+
+from instrumentacion import medir
+from logic import SMMLV
+
+VIGENCIA_LEY_100 = pd.Timestamp(1994, 4, 1)
+# Acto Legislativo 01 de 2005: fin de la transición, salvo quienes tenían
+# 750 semanas a su entrada en vigencia (se extiende hasta 2014)
+VIGENCIA_AL_01_2005 = pd.Timestamp(2005, 7, 25)
+FIN_TRANSICION = pd.Timestamp(2010, 7, 31)
+FIN_TRANSICION_EXTENDIDA = pd.Timestamp(2014, 12, 31)
+
+def semanas_a_fecha(orden, fecha):
+    """Semanas acumuladas en los periodos con 'Hasta' <= fecha"""
+    k = int(np.searchsorted(orden["hasta"], np.datetime64(fecha, "D"), side="right"))
+    return float(orden["acumulado"][k - 1]) if k > 0 else 0.0
+
+class Regimen(ABC):
+    """
+    Régimen base. Las subclases definen:
+    - requisitos: (fecha_cumple_edad, fecha_cumple_semanas, semanas_requeridas)
+    - acceso: (aplica, razón) para regímenes con condiciones de entrada
+    - ventanas_ibl: [(etiqueta, fecha_inicio)], None = toda la vida
+    - tasa: (mesada, tasa %) para un IBL y unas semanas
+    """
+    clave = ""
+    nombre = ""
+
+    @abstractmethod
+    def requisitos(self, liq, contexto):
+        pass
+
+    def acceso(self, liq, contexto, fechas):
+        return True, ""
+
+    def ventanas_ibl(self, liq, contexto, fechas):
+        return [("Toda la Vida", None)]
+
+    @abstractmethod
+    def tasa(self, liq, ibl, semanas, contexto):
+        pass
+
+class Ley797(Regimen):
+    """Ley 100 modificada por la Ley 797 de 2003 (mismo cálculo de LiquidadorPension.liquidar)"""
+    clave = "ley_797"
+    nombre = "Ley 797 de 2003"
+
+    def requisitos(self, liq, contexto):
+        fecha_cumple_edad, req_sem = liq.requisitos_estatus()
+        return fecha_cumple_edad, liq.fecha_cruce_semanas(req_sem), req_sem
+
+    def ventanas_ibl(self, liq, contexto, fechas):
+        return [("Últimos 10 Años", contexto["fecha_inicio_10"]), ("Toda la Vida", None)]
+
+    def tasa(self, liq, ibl, semanas, contexto):
+        mesada, tasa, _ = liq.calcular_tasa_reemplazo_797(
+            ibl, semanas, contexto["anio_pension"], contexto["limitar_semanas_cotizadas"], contexto["smmlv"]
+        )
+        return mesada, tasa
+
+class Acuerdo049(Regimen):
+    """
+    Acuerdo 049 de 1990 (Decreto 758), aplicable por el régimen de transición.
+    Requisitos: 60/55 años y 1000 semanas en cualquier tiempo o 500 en los 20
+    años anteriores a la edad. Tasa: 45% por las primeras 500 semanas más 3%
+    por cada 50 adicionales, hasta 90%.
+    """
+    clave = "acuerdo_049"
+    nombre = "Acuerdo 049 de 1990 (Transición)"
+    edades = {"Masculino": 60, "Femenino": 55}
+    edades_transicion = {"Masculino": 40, "Femenino": 35}
+
+    def requisitos(self, liq, contexto):
+        edad = self.edades.get(liq.genero, self.edades["Femenino"])
+        fecha_cumple_edad = liq.fecha_nacimiento + relativedelta(years=edad)
+
+        # 500 semanas en los 20 años anteriores a la edad: cruce del acumulado
+        # desde el inicio de esa ventana
+        orden = contexto["orden"]
+        previas = semanas_a_fecha(orden, fecha_cumple_edad - relativedelta(years=20))
+        if semanas_a_fecha(orden, fecha_cumple_edad) - previas >= 500:
+            return fecha_cumple_edad, liq.fecha_cruce_semanas(previas + 500), 500
+        return fecha_cumple_edad, liq.fecha_cruce_semanas(1000), 1000
+
+    def acceso(self, liq, contexto, fechas):
+        orden = contexto["orden"]
+        edad_1994 = relativedelta(VIGENCIA_LEY_100, liq.fecha_nacimiento).years
+        edad_minima = self.edades_transicion.get(liq.genero, self.edades_transicion["Femenino"])
+        if edad_1994 < edad_minima and semanas_a_fecha(orden, VIGENCIA_LEY_100) < 750:
+            return False, f"Sin transición: {edad_1994} años y menos de 750 semanas al 1/04/1994"
+        if not fechas["tiene_estatus"]:
+            return False, "No acredita las semanas del régimen"
+
+        limite = FIN_TRANSICION
+        if semanas_a_fecha(orden, VIGENCIA_AL_01_2005) >= 750:
+            limite = FIN_TRANSICION_EXTENDIDA
+        if fechas["fecha_estatus"] > limite:
+            return False, f"Requisitos cumplidos después del fin de la transición ({limite:%d/%m/%Y})"
+        return True, ""
+
+    def ventanas_ibl(self, liq, contexto, fechas):
+        # Art. 36 Ley 100: a quien le faltaban menos de 10 años el 1/04/1994,
+        # el promedio del tiempo restante o de todo el tiempo si es mayor;
+        # a los demás, el art. 21 (10 años, o toda la vida con 1250 semanas)
+        estatus = fechas["fecha_estatus"]
+        if estatus is not None and estatus < VIGENCIA_LEY_100 + relativedelta(years=10):
+            return [("Tiempo Restante (Art. 36)", VIGENCIA_LEY_100), ("Toda la Vida", None)]
+        ventanas = [("Últimos 10 Años", contexto["fecha_inicio_10"])]
+        if contexto["semanas"] >= 1250: ventanas.append(("Toda la Vida", None))
+        return ventanas
+
+    def tasa(self, liq, ibl, semanas, contexto):
+        if ibl <= 0: return 0, 0
+        tasa = min(45 + 3 * max(int((semanas - 500) / 50), 0), 90)
+        return max(ibl * (tasa / 100), contexto["smmlv"]), tasa
+
+REGIMENES = [Ley797(), Acuerdo049()]
+
+def registrar_regimen(regimen):
+    """Agrega un régimen a los que se evalúan por defecto (reemplaza uno con la misma clave)"""
+    REGIMENES[:] = [r for r in REGIMENES if r.clave != regimen.clave] + [regimen]
+    return regimen
+
+def _ibl_ventana(acumulado, hasta_ordenado, fecha_inicio):
+    n = acumulado.shape[0]
+    k = 0 if fecha_inicio is None else int(np.searchsorted(hasta_ordenado, np.datetime64(fecha_inicio), side='left'))
+    if k >= n: return 0.0
+    previo = acumulado[k - 1] if k > 0 else 0.0
+    return float((acumulado[-1] - previo) / (n - k))
+
+@medir()
+def evaluar_regimenes(liq, regimenes=None, limitar_semanas_cotizadas=True, anio_pension=None,
+                      granularidad="anual", smmlv=SMMLV):
+    """
+    Liquida la historia de 'liq' (LiquidadorPension) en todos los regímenes.
+    Devuelve una fila por régimen: acceso, fechas clave, IBL de la ventana
+    más favorable, semanas, tasa y mesada.
+    """
+    regimenes = REGIMENES if regimenes is None else regimenes
+    h = liq.historia
+    orden = liq._historia_ordenada()
+    contexto = {
+        "orden": orden,
+        "semanas": h.semanas.sum(),
+        "anio_pension": anio_pension if anio_pension else datetime.now().year,
+        "limitar_semanas_cotizadas": limitar_semanas_cotizadas,
+        "smmlv": smmlv,
+        "fecha_inicio_10": liq._fecha_inicio_10() if not h.vacia else None
+    }
+
+    # 1. Requisitos y fechas clave de cada régimen (búsquedas binarias, sin reindexar)
+    evaluados = []
+    for regimen in regimenes:
+        fecha_cumple_edad, fecha_cumple_semanas, req_sem = regimen.requisitos(liq, contexto)
+        fechas = liq.componer_fechas_clave(fecha_cumple_edad, fecha_cumple_semanas, orden["ultima_cotizacion"])
+        evaluados.append((regimen, req_sem, fechas))
+
+    # 2. Una sola indexación: una fila de factores por fecha de corte distinta
+    acumulados = {}
+    if not h.vacia:
+        cortes = list(dict.fromkeys(pd.Timestamp(f["fecha_corte"]) for _, _, f in evaluados))
+        ibc = np.where(h.ibc <= 0, 0.0, h.ibc)[orden["orden"]]
+        factores = liq.tabla_ipc.matriz_factores(orden["hasta"], pd.DatetimeIndex(cortes), granularidad)
+        matriz = np.cumsum(ibc[None, :] * factores, axis=1)
+        acumulados = {corte: matriz[i] for i, corte in enumerate(cortes)}
+
+    # 3. Ventanas de IBL y tasa de cada régimen sobre las sumas prefijas compartidas
+    resultados = []
+    for regimen, req_sem, fechas in evaluados:
+        aplica, razon = regimen.acceso(liq, contexto, fechas)
+        ibl, origen = 0.0, ""
+        # Sin historia todas las ventanas valen 0 y gana la primera (como en liquidar)
+        acumulado = acumulados.get(pd.Timestamp(fechas["fecha_corte"]))
+        for etiqueta, inicio in regimen.ventanas_ibl(liq, contexto, fechas):
+            valor = _ibl_ventana(acumulado, orden["hasta"], inicio) if acumulado is not None else 0.0
+            if not origen or valor > ibl: ibl, origen = valor, etiqueta
+        mesada, tasa = regimen.tasa(liq, ibl, contexto["semanas"], contexto)
+        resultados.append({
+            "clave": regimen.clave, "regimen": regimen.nombre, "aplica": aplica, "razon": razon,
+            "semanas_requeridas": req_sem, "fechas": fechas, "ibl": ibl, "origen_ibl": origen,
+            "semanas": contexto["semanas"], "tasa": tasa, "mesada": mesada
+        })
+    return resultados
+
+def mas_favorable(resultados):
+    """Régimen aplicable con la mayor mesada (prefiere los que acreditan estatus)"""
+    aplicables = [r for r in resultados if r["aplica"]]
+    if not aplicables: return None
+    return max(aplicables, key=lambda r: (r["fechas"]["tiene_estatus"], r["mesada"]))
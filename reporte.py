@@ -0,0 +1,174 @@
+"""
+Generación del dictamen técnico en Word (sin dependencia de Streamlit).
+
+El costo fijo se paga una sola vez por proceso: la plantilla con los
+estilos base se guarda en bytes y los PNG de la gráfica quedan en un
+lru_cache por par de IBL. Cuando hay que dibujar, cada hilo reutiliza su
+propia figura de matplotlib (backend Agg, sin pyplot).
+Las tablas de soporte se llenan clonando una fila XML modelo en lugar de
+llamar add_row() por cada periodo.
+"""
+import threading
+from copy import deepcopy
+from datetime import datetime
+from functools import lru_cache
+from io import BytesIO
+
+import pandas as pd
+from docx import Document
+from docx.enum.text import WD_ALIGN_PARAGRAPH
+from docx.oxml.ns import qn
+from docx.shared import Pt, Inches
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+
+from instrumentacion import medir
+
+MIME_DOCX = "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+
+@lru_cache(maxsize=1)
+def _plantilla():
+    """Documento base con el estilo Normal ya configurado (en bytes)"""
+    doc = Document()
+    style = doc.styles['Normal']
+    style.font.name = 'Arial'
+    style.font.size = Pt(10)
+    buffer = BytesIO()
+    doc.save(buffer)
+    return buffer.getvalue()
+
+_figuras = threading.local()
+
+def _figura_reutilizable():
+    # Una figura por hilo (en un worker de exportación, una por proceso): las
+    # sesiones de Streamlit corren en hilos distintos y no deben dibujar sobre
+    # la misma. Nunca pasa por pyplot.
+    fig = getattr(_figuras, "fig", None)
+    if fig is None:
+        fig = _figuras.fig = Figure(figsize=(6, 3))
+        FigureCanvasAgg(fig)
+    fig.clf()
+    return fig
+
+@lru_cache(maxsize=256)
+def grafica_ibl_png(ibl_10, ibl_vida):
+    """PNG de la gráfica comparativa, reutilizado mientras los IBL no cambien"""
+    fig = _figura_reutilizable()
+    ax1 = fig.add_subplot()
+    ax1.bar(["Últimos 10", "Toda Vida"], [ibl_10, ibl_vida], color=['#3498db', '#2ecc71'])
+    ax1.set_title("Comparativo IBL")
+    ax1.yaxis.set_major_formatter('${x:,.0f}')
+    memfile = BytesIO()
+    fig.savefig(memfile)
+    return memfile.getvalue()
+
+def _filas_soporte(df_sop):
+    """Textos de las filas del anexo (periodo, IBC histórico, IBC actualizado)"""
+    # Limitamos a las primeras 50 y últimas 10 filas para no saturar el Word si es muy largo
+    filas = pd.concat([df_sop.head(50), df_sop.tail(10)]) if len(df_sop) > 60 else df_sop
+    periodos = filas['Desde'].dt.strftime('%m/%Y') + " - " + filas['Hasta'].dt.strftime('%m/%Y')
+    return zip(
+        periodos.tolist(),
+        [f"${v:,.0f}" for v in filas['IBC_Historico'].tolist()],
+        [f"${v:,.0f}" for v in filas['IBC_Actualizado'].tolist()]
+    )
+
+def agregar_tabla_soporte(doc, df_sop):
+    if df_sop.empty: return
+    t = doc.add_table(rows=1, cols=3)
+    t.style = 'Table Grid'
+    h = t.rows[0].cells
+    h[0].text = 'Periodo'; h[1].text = 'IBC Histórico'; h[2].text = 'IBC Actualizado'
+
+    # Fila modelo: se clona su XML y solo se reemplazan los textos
+    modelo = t.add_row()
+    for celda in modelo.cells: celda.text = "-"
+    tr_modelo = modelo._tr
+    tbl = t._tbl
+    tbl.remove(tr_modelo)
+    for textos in _filas_soporte(df_sop):
+        tr = deepcopy(tr_modelo)
+        for nodo, texto in zip(tr.iter(qn('w:t')), textos):
+            nodo.text = texto
+        tbl.append(tr)
+
+def datos_liquidacion(res):
+    """'liq_data' del reporte a partir del resultado de LiquidadorPension.liquidar"""
+    return {
+        "semanas": res["semanas"], "ibl": res["ibl"], "origen_ibl": res["origen_ibl"],
+        "tasa": res["tasa"], "mesada": res["mesada"],
+        "ibl_10": res["ibl_10"], "ibl_vida": res["ibl_vida"],
+        "df_soporte_10": res["det_10"], "df_soporte_vida": res["det_vida"]
+    }
+
+@medir()
+def generar_reporte_completo(perfil, fechas, liq_data, proyeccion=None):
+    doc = Document(BytesIO(_plantilla()))
+
+    # TÍTULO
+    tit = doc.add_heading('DICTAMEN TÉCNICO PENSIONAL', 0)
+    tit.alignment = WD_ALIGN_PARAGRAPH.CENTER
+    doc.add_paragraph(f"Fecha de Emisión: {datetime.now().strftime('%d/%m/%Y')}")
+    doc.add_paragraph("_" * 70)
+
+    # 1. INFORMACIÓN
+    doc.add_heading('1. ESTATUS JURÍDICO', level=1)
+    table = doc.add_table(rows=1, cols=2)
+    table.style = 'Table Grid'
+
+    datos = [
+        ("Afiliado", perfil['nombre']),
+        ("Fecha Nacimiento", perfil['fecha_nac']),
+        ("Cumplimiento Edad", fechas['fecha_cumple_edad'].strftime('%d/%m/%Y')),
+        ("Cumplimiento Semanas", fechas['fecha_cumple_semanas'].strftime('%d/%m/%Y') if fechas['fecha_cumple_semanas'] else "No cumplido"),
+        ("FECHA ESTATUS", fechas['fecha_estatus'].strftime('%d/%m/%Y') if fechas['tiene_estatus'] else "NO ADQUIRIDO"),
+        ("FECHA CORTE (INDEXACIÓN)", fechas['fecha_corte'].strftime('%d/%m/%Y')),
+    ]
+    for k, v in datos:
+        r = table.add_row().cells
+        r[0].text = k
+        r[1].text = str(v)
+
+    # 2. LIQUIDACIÓN
+    doc.add_heading('2. RESULTADO DE LA LIQUIDACIÓN', level=1)
+    t2 = doc.add_table(rows=1, cols=2)
+    t2.style = 'Light Shading Accent 1'
+
+    res_data = [
+        ("Semanas Totales", f"{liq_data['semanas']:,.2f}"),
+        ("IBL 10 Años", f"${liq_data['ibl_10']:,.0f}"),
+        ("IBL Toda la Vida", f"${liq_data['ibl_vida']:,.0f}"),
+        ("IBL APLICADO", f"${liq_data['ibl']:,.0f} ({liq_data['origen_ibl']})"),
+        ("Tasa Reemplazo", f"{liq_data['tasa']:.2f}%"),
+        ("MESADA PENSIONAL", f"${liq_data['mesada']:,.0f}")
+    ]
+    for k, v in res_data:
+        r = t2.add_row().cells
+        r[0].text = k
+        r[1].text = v
+
+    # 3. GRÁFICA COMPARATIVA
+    doc.add_heading('3. ANÁLISIS GRÁFICO', level=1)
+    doc.add_picture(BytesIO(grafica_ibl_png(float(liq_data['ibl_10']), float(liq_data['ibl_vida']))), width=Inches(5))
+
+    # 4. TABLAS DE SOPORTE (AMBAS)
+    doc.add_page_break()
+    doc.add_heading('ANEXO 1: DETALLE ÚLTIMOS 10 AÑOS', level=1)
+    agregar_tabla_soporte(doc, liq_data['df_soporte_10'])
+
+    doc.add_heading('ANEXO 2: DETALLE TODA LA VIDA', level=1)
+    agregar_tabla_soporte(doc, liq_data['df_soporte_vida'])
+
+    # 5. PROYECCIÓN
+    if proyeccion:
+        doc.add_page_break()
+        doc.add_heading('4. PROYECCIÓN FUTURA', level=1)
+        doc.add_paragraph(f"Estrategia: {proyeccion['estrategia']}")
+        doc.add_paragraph(f"Inversión: ${proyeccion['inversion']:,.0f}")
+        doc.add_paragraph(f"Nueva Mesada: ${proyeccion['mesada_fut']:,.0f}")
+        doc.add_paragraph(f"ROI: {proyeccion['roi']:.1f} Años")
+
+    buffer = BytesIO()
+    doc.save(buffer)
+    buffer.seek(0)
+    return buffer
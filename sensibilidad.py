@@ -0,0 +1,158 @@
+"""
+Análisis de sensibilidad de la mesada a los supuestos de IPC y SMMLV.
+
+El IPC de los últimos años de la serie (2025-2026) es proyectado y el SMMLV
+está fijo en logic.SMMLV. Aquí cada escenario trae su propio IPC para esos
+años y su propio SMMLV, y se evalúan miles a la vez sin volver a liquidar:
+la historia se indexa una sola vez con la serie base y un escenario solo
+multiplica cada periodo por el cociente (1 + IPC escenario) / (1 + IPC base)
+de los años proyectados que su indexación atraviesa. Como ese producto solo
+depende del primer año proyectado que cruza el periodo, el IBC indexado se
+agrupa por ese año y todos los escenarios se resuelven con un producto
+matricial (escenarios x años proyectados).
+"""
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from instrumentacion import medir
+from logic import SMMLV, semanas_minimas_797, tasa_reemplazo_797_vectorizada
+
+ANIOS_PROYECTADOS = (2025, 2026)
+PERCENTILES = (5, 25, 50, 75, 95)
+
+def escenarios_monte_carlo(n, anios=ANIOS_PROYECTADOS, ipc_base=None, desviacion_ipc=1.5,
+                           smmlv_base=SMMLV, desviacion_smmlv=0.03, correlacion=0.5, semilla=None):
+    """
+    'n' escenarios aleatorios: IPC normal alrededor de la serie (puntos
+    porcentuales) y SMMLV con variación relativa normal, correlacionada con
+    el choque promedio de inflación. Devuelve (ipc n x años en %, smmlv n).
+    """
+    rng = np.random.default_rng(semilla)
+    if ipc_base is None:
+        from utils import obtener_tabla_ipc
+        serie = obtener_tabla_ipc().serie
+        ipc_base = [serie.get(a, 0.0) for a in anios]
+    z_ipc = rng.standard_normal((n, len(anios)))
+    ipc = np.maximum(np.asarray(ipc_base, dtype=float)[None, :] + desviacion_ipc * z_ipc, -99.0)
+
+    choque = z_ipc.mean(axis=1) * np.sqrt(len(anios)) if len(anios) else np.zeros(n)
+    z_smmlv = correlacion * choque + np.sqrt(1 - correlacion ** 2) * rng.standard_normal(n)
+    smmlv = smmlv_base * np.maximum(1 + desviacion_smmlv * z_smmlv, 0.01)
+    return ipc, smmlv
+
+def _unidades_proyectadas(tabla, anios, granularidad):
+    """
+    Posición de cada año proyectado en la tabla y las unidades (años o meses)
+    en que se aplica su cociente; los meses con dato mensual publicado no
+    son proyección y no cambian.
+    """
+    columnas, unidades, exponente = [], [], 1.0
+    for j, anio in enumerate(anios):
+        if not tabla.min_anio <= anio <= tabla.max_anio: continue
+        if granularidad == "mensual":
+            exponente = 1 / 12
+            for mes in range(12):
+                if (anio, mes + 1) in tabla.serie_mensual: continue
+                columnas.append(j)
+                unidades.append((anio - tabla.min_anio) * 12 + mes)
+        else:
+            columnas.append(j)
+            unidades.append(anio - tabla.min_anio)
+    return np.array(columnas, dtype=np.int64), np.array(unidades, dtype=np.int64), exponente
+
+@medir()
+def analizar_sensibilidad(liq, ipc=None, smmlv=None, anios_ipc=ANIOS_PROYECTADOS,
+                          limitar_semanas_cotizadas=True, anio_pension=None, granularidad="anual"):
+    """
+    IBL, tasa y mesada (Ley 797, IBL más favorable) de la historia de 'liq'
+    para cada escenario. 'ipc' es una matriz escenarios x anios_ipc en %
+    (None = serie base) y 'smmlv' un vector o escalar. Devuelve un
+    DataFrame con una fila por escenario.
+    """
+    tabla = liq.tabla_ipc
+    anios_ipc = tuple(int(a) for a in anios_ipc)
+    # Años en orden creciente (la agrupación por unidad usa searchsorted),
+    # con las columnas de ipc reordenadas junto con ellos
+    orden_anios = np.argsort(anios_ipc, kind="stable")
+    if ipc is not None:
+        ipc = np.atleast_2d(np.asarray(ipc, dtype=float))
+        ipc = np.broadcast_to(ipc, (len(ipc), len(anios_ipc)))[:, orden_anios]
+    anios_ipc = tuple(anios_ipc[k] for k in orden_anios)
+    if len(set(anios_ipc)) < len(anios_ipc):
+        raise ValueError(f"Años de IPC repetidos: {anios_ipc}")
+    ipc_base = np.array([tabla.serie.get(a, 0.0) for a in anios_ipc])
+    ipc = ipc_base[None, :] if ipc is None else ipc
+    smmlv = np.atleast_1d(np.asarray(SMMLV if smmlv is None else smmlv, dtype=float))
+    n_escenarios = max(len(ipc), len(smmlv))
+    ipc = np.broadcast_to(ipc, (n_escenarios, len(anios_ipc)))
+    smmlv = np.broadcast_to(smmlv, (n_escenarios,))
+
+    columnas_ipc = {f"ipc_{a}": ipc[:, j] for j, a in enumerate(anios_ipc)}
+    h = liq.historia
+    if h.vacia:
+        cero = np.zeros(n_escenarios)
+        return pd.DataFrame({**columnas_ipc, "smmlv": smmlv, "ibl_10": cero, "ibl_vida": cero,
+                             "ibl": cero, "tasa": cero, "mesada": cero})
+
+    # 1. Historia indexada una sola vez con la serie base (mismo corte que liquidar)
+    fechas = liq.determinar_fechas_clave()
+    f_corte = fechas["fecha_corte"]
+    orden = liq._historia_ordenada()
+    hasta = orden["hasta"]
+    indexado = np.where(h.ibc <= 0, 0.0, h.ibc)[orden["orden"]] * liq.obtener_factores_ipc(hasta, f_corte, granularidad)
+
+    # 2. Unidad (año o mes de la tabla) de cada periodo y del corte: el factor
+    #    de un periodo cubre las unidades [inicio, corte)
+    if granularidad == "mensual":
+        inicio = tabla.ordinal_mes(hasta)
+        corte = int(tabla.ordinal_mes([f_corte])[0])
+    else:
+        anios, _ = tabla._anio_mes(hasta)
+        inicio = np.clip(anios - tabla.min_anio, 0, tabla.factores.shape[0] - 1)
+        corte = tabla._indice_anio(f_corte.year)
+    columnas, unidades, exponente = _unidades_proyectadas(tabla, anios_ipc, granularidad)
+    vigentes = unidades < corte
+    columnas, unidades = columnas[vigentes], unidades[vigentes]
+
+    # 3. Cociente de cada escenario por unidad proyectada y sus productos
+    #    desde cada unidad hasta el corte (la última columna vale 1)
+    cocientes = ((1 + ipc / 100.0) / (1 + ipc_base / 100.0)[None, :]) ** exponente
+    sufijos = np.ones((n_escenarios, len(unidades) + 1))
+    if len(unidades):
+        sufijos[:, :-1] = np.cumprod(cocientes[:, columnas][:, ::-1], axis=1)[:, ::-1]
+
+    # 4. IBC indexado agrupado por la primera unidad proyectada que atraviesa
+    grupo = np.searchsorted(unidades, inicio, side="left")
+    fecha_inicio_10 = np.datetime64(liq._fecha_inicio_10())
+    en_10 = hasta >= fecha_inicio_10
+    pesos_vida = np.bincount(grupo, weights=indexado, minlength=len(unidades) + 1)
+    pesos_10 = np.bincount(grupo[en_10], weights=indexado[en_10], minlength=len(unidades) + 1)
+
+    n_vida, n_10 = len(indexado), int(en_10.sum())
+    ibl_vida = sufijos @ pesos_vida / n_vida
+    ibl_10 = sufijos @ pesos_10 / n_10 if n_10 else np.zeros(n_escenarios)
+    ibl = np.maximum(ibl_10, ibl_vida)
+
+    # 5. Tasa y mesada con el SMMLV de cada escenario
+    anio = anio_pension if anio_pension else datetime.now().year
+    semanas = h.semanas.sum()
+    mesada, tasa = tasa_reemplazo_797_vectorizada(
+        ibl, semanas, semanas_minimas_797(liq.genero, anio), limitar_semanas_cotizadas, smmlv
+    )
+    return pd.DataFrame({
+        **columnas_ipc, "smmlv": smmlv, "ibl_10": ibl_10, "ibl_vida": ibl_vida,
+        "ibl": ibl, "tasa": tasa, "mesada": mesada
+    })
+
+def resumir_distribucion(escenarios, columnas=("ibl", "tasa", "mesada"), percentiles=PERCENTILES):
+    """Media, desviación y percentiles de cada columna (una fila por columna)"""
+    filas = {}
+    for col in columnas:
+        valores = escenarios[col].to_numpy()
+        filas[col] = {
+            "media": valores.mean(), "desviacion": valores.std(),
+            **{f"p{p}": v for p, v in zip(percentiles, np.percentile(valores, percentiles))}
+        }
+    return pd.DataFrame.from_dict(filas, orient="index")
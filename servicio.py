@@ -0,0 +1,441 @@
+"""
+Servicio local de liquidación (HTTP sobre asyncio, solo librería estándar).
+
+Uso:
+    python servicio.py --puerto 8765 --workers 4 --cache ~/.cache/liquidador-pension
+
+API:
+    POST /trabajos?genero=..&fecha_nacimiento=AAAA-MM-DD[&tope=0][&granularidad=mensual]
+         cuerpo: bytes del PDF -> 202 {"id": ...}
+    GET  /trabajos/<id>            estado y resultado (historia limpia + liquidación)
+    GET  /trabajos/<id>/eventos    progreso en NDJSON (una línea por evento) hasta terminar
+    POST /trabajos/<id>/liquidacion cuerpo JSON (genero, fecha_nacimiento, ...) -> liquidación con otros parámetros
+    POST /trabajos/<id>/dictamen   cuerpo JSON (perfil, genero, fecha_nacimiento, ...) -> .docx
+    GET  /salud
+
+El bucle de eventos solo recibe, encola y responde: el parseo del PDF, la
+liquidación y el dictamen corren en un pool de procesos acotado. Los
+trabajos esperan turno en una cola (un semáforo) para que la memoria de
+los PDF en vuelo no crezca con la carga. La app de Streamlit usa este
+servicio como cliente delgado cuando LIQUIDADOR_SERVICIO_URL está definida.
+"""
+import argparse
+import asyncio
+import io
+import json
+import os
+import signal
+import sys
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime
+
+import numpy as np
+import pandas as pd
+
+from historia import HistoriaLaboral
+
+MAX_MB_POR_DEFECTO = 50
+ESTADOS_FINALES = ("listo", "error")
+_MENSAJES = {200: "OK", 202: "Accepted", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+             409: "Conflict", 413: "Payload Too Large", 500: "Internal Server Error"}
+
+def _json_defecto(valor):
+    if isinstance(valor, (pd.Timestamp, datetime, date)): return valor.isoformat()
+    if isinstance(valor, np.generic): return valor.item()
+    raise TypeError(f"No serializable: {type(valor).__name__}")
+
+def _a_json(datos):
+    return json.dumps(datos, default=_json_defecto, ensure_ascii=False).encode("utf-8")
+
+# ==========================================
+# TRABAJO EN LOS PROCESOS DEL POOL
+# ==========================================
+def _iniciar_worker():
+    # Backend sin interfaz antes de cargar matplotlib (dictámenes)
+    os.environ["MPLBACKEND"] = "Agg"
+
+def _extraer_historia(contenido, directorio_cache):
+    from batch import historia_desde_pdf
+    df_final, _ = historia_desde_pdf(io.BytesIO(contenido), directorio_cache)
+    return HistoriaLaboral.desde_dataframe(df_final)
+
+def _liquidacion(historia, parametros):
+    from logic import LiquidadorPension
+    liq = LiquidadorPension(historia, parametros["genero"], parametros["fecha_nacimiento"])
+    res = liq.liquidar(parametros["limitar"], granularidad=parametros["granularidad"])
+    return liq, res
+
+def _tabla_json(df):
+    """Tabla de soporte por columnas (las fechas quedan en ISO al serializar)"""
+    return {c: df[c].tolist() for c in df.columns}
+
+def _liquidar(historia, parametros):
+    """Liquidación completa (con tablas de soporte) y de los demás regímenes, lista para la app"""
+    from regimenes import evaluar_regimenes
+    liq, res = _liquidacion(historia, parametros)
+    regimenes = evaluar_regimenes(liq, limitar_semanas_cotizadas=parametros["limitar"],
+                                  granularidad=parametros["granularidad"])
+    return {
+        "fechas": res["fechas"], "semanas": res["semanas"],
+        "ibl_10": res["ibl_10"], "ibl_vida": res["ibl_vida"], "ibl": res["ibl"], "origen_ibl": res["origen_ibl"],
+        "tasa": res["tasa"], "mesada": res["mesada"], "detalle": res["detalle"],
+        "det_10": _tabla_json(res["det_10"]), "det_vida": _tabla_json(res["det_vida"]),
+        "regimenes": [{k: r[k] for k in ("clave", "regimen", "aplica", "razon", "semanas_requeridas", "fechas",
+                                         "ibl", "origen_ibl", "semanas", "tasa", "mesada")}
+                      for r in regimenes]
+    }
+
+def _fechas_desde_json(fechas):
+    return {k: (pd.Timestamp(v) if v else None) if k.startswith("fecha_") or k == "ultima_cotizacion" else v
+            for k, v in fechas.items()}
+
+def resultado_desde_json(datos):
+    """Resultado de _liquidar leído del JSON: fechas como Timestamp y soportes como DataFrame"""
+    resultado = dict(datos, fechas=_fechas_desde_json(datos["fechas"]))
+    for clave in ("det_10", "det_vida"):
+        tabla = pd.DataFrame(datos[clave])
+        for columna in ("Desde", "Hasta"):
+            if columna in tabla: tabla[columna] = pd.to_datetime(tabla[columna])
+        resultado[clave] = tabla
+    resultado["regimenes"] = [dict(r, fechas=_fechas_desde_json(r["fechas"])) for r in datos["regimenes"]]
+    return resultado
+
+def _dictamen(historia, parametros, perfil, proyeccion):
+    from reporte import generar_reporte_completo, datos_liquidacion
+    _, res = _liquidacion(historia, parametros)
+    return generar_reporte_completo(perfil, res["fechas"], datos_liquidacion(res), proyeccion).getvalue()
+
+# ==========================================
+# SERVIDOR
+# ==========================================
+def _parametros(datos):
+    """Parámetros de liquidación validados desde la query o un cuerpo JSON"""
+    genero = datos.get("genero")
+    if genero not in ("Masculino", "Femenino"):
+        raise ValueError("genero debe ser Masculino o Femenino")
+    granularidad = datos.get("granularidad") or "anual"
+    if granularidad not in ("anual", "mensual"):
+        raise ValueError("granularidad debe ser anual o mensual")
+    limitar = datos.get("tope", datos.get("limitar", True))
+    return {
+        "genero": genero,
+        "fecha_nacimiento": pd.Timestamp(datos.get("fecha_nacimiento")).strftime("%Y-%m-%d"),
+        "limitar": limitar not in ("0", "false", "no", False, 0),
+        "granularidad": granularidad
+    }
+
+class _ErrorHTTP(Exception):
+    def __init__(self, codigo, mensaje):
+        super().__init__(mensaje)
+        self.codigo = codigo
+
+class Trabajo:
+    """Estado de un PDF enviado: eventos de progreso, resultado e historia limpia"""
+    def __init__(self, parametros):
+        self.id = uuid.uuid4().hex
+        self.parametros = parametros
+        self.estado = "en_cola"
+        self.creado = time.perf_counter()
+        self.eventos = []
+        self.resultado = None
+        self.error = ""
+        self.historia = None
+        self._cambio = asyncio.Condition()
+
+    @property
+    def terminado(self):
+        return self.estado in ESTADOS_FINALES
+
+    async def publicar(self, estado, **datos):
+        self.estado = estado
+        evento = {"id": self.id, "estado": estado, "segundos": round(time.perf_counter() - self.creado, 3), **datos}
+        async with self._cambio:
+            self.eventos.append(evento)
+            self._cambio.notify_all()
+
+    async def seguir(self):
+        """Eventos desde el primero, esperando los nuevos hasta que el trabajo termine"""
+        i = 0
+        while True:
+            async with self._cambio:
+                await self._cambio.wait_for(lambda: len(self.eventos) > i)
+                nuevos = self.eventos[i:]
+            for evento in nuevos:
+                yield evento
+            i += len(nuevos)
+            if nuevos[-1]["estado"] in ESTADOS_FINALES: return
+
+    def resumen(self, con_historia=True):
+        datos = {"id": self.id, "estado": self.estado, "error": self.error, "resultado": self.resultado}
+        if con_historia and self.historia is not None: datos["historia"] = self.historia.a_json()
+        return datos
+
+class ServicioLiquidacion:
+    """
+    Servidor HTTP mínimo. 'workers' procesos ejecutan el trabajo pesado;
+    'max_en_vuelo' trabajos (por defecto 2 por worker) pueden estar en el
+    pool a la vez y el resto espera en cola. Se conservan los últimos
+    'retener' trabajos terminados.
+    """
+    def __init__(self, workers=None, directorio_cache=None, max_mb=MAX_MB_POR_DEFECTO, max_en_vuelo=None, retener=256):
+        self.workers = workers or os.cpu_count() or 1
+        self.directorio_cache = directorio_cache
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.retener = retener
+        self.trabajos = OrderedDict()
+        # El loop solo guarda referencias débiles a las tareas: se retienen aquí
+        self._tareas = set()
+        self._cupos = asyncio.Semaphore(max_en_vuelo or 2 * self.workers)
+        self._pool = ProcessPoolExecutor(max_workers=self.workers, initializer=_iniciar_worker)
+
+    async def iniciar(self, host="127.0.0.1", puerto=8765):
+        return await asyncio.start_server(self._atender, host, puerto)
+
+    def cerrar(self):
+        self._pool.shutdown(cancel_futures=True)
+
+    async def detener(self):
+        """Cancela los trabajos en curso, espera a que terminen y cierra el pool"""
+        for tarea in self._tareas: tarea.cancel()
+        await asyncio.gather(*self._tareas, return_exceptions=True)
+        self.cerrar()
+
+    def _tarea_terminada(self, tarea):
+        self._tareas.discard(tarea)
+        if not tarea.cancelled() and tarea.exception() is not None:
+            print(f"Trabajo interrumpido: {tarea.exception()!r}", file=sys.stderr)
+
+    async def _en_pool(self, funcion, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._pool, funcion, *args)
+
+    def _registrar(self, trabajo):
+        self.trabajos[trabajo.id] = trabajo
+        terminados = [t.id for t in self.trabajos.values() if t.terminado]
+        for id_viejo in terminados[:max(0, len(terminados) - self.retener)]:
+            del self.trabajos[id_viejo]
+
+    async def _correr(self, trabajo, contenido):
+        try:
+            async with self._cupos:
+                await trabajo.publicar("extrayendo", bytes=len(contenido))
+                historia = await self._en_pool(_extraer_historia, contenido, self.directorio_cache)
+                del contenido
+                await trabajo.publicar("liquidando", periodos=len(historia))
+                trabajo.resultado = await self._en_pool(_liquidar, historia, trabajo.parametros)
+                trabajo.historia = historia
+            await trabajo.publicar("listo", resultado=trabajo.resultado)
+        except Exception as e:
+            trabajo.error = f"{type(e).__name__}: {e}"
+            await trabajo.publicar("error", error=trabajo.error)
+
+    def _trabajo(self, id_trabajo):
+        trabajo = self.trabajos.get(id_trabajo)
+        if trabajo is None: raise _ErrorHTTP(404, "Trabajo no encontrado")
+        return trabajo
+
+    def _datos_trabajo(self, trabajo, cuerpo):
+        """Cuerpo JSON de una petición sobre un trabajo listo y sus parámetros de liquidación"""
+        if trabajo.historia is None: raise _ErrorHTTP(409, f"Trabajo en estado '{trabajo.estado}'")
+        try:
+            datos = json.loads(cuerpo or b"{}")
+            if not isinstance(datos, dict): raise ValueError("El cuerpo debe ser un objeto JSON")
+            parametros = _parametros({**trabajo.parametros, **datos})
+        except (ValueError, TypeError) as e:
+            raise _ErrorHTTP(400, str(e))
+        return datos, parametros
+
+    async def _rutear(self, metodo, ruta, query, cuerpo, writer):
+        partes = [p for p in ruta.split("/") if p]
+        if partes == ["salud"] and metodo == "GET":
+            activos = sum(not t.terminado for t in self.trabajos.values())
+            return await _responder(writer, 200, _a_json({"estado": "ok", "workers": self.workers, "trabajos": len(self.trabajos), "activos": activos}))
+
+        if partes == ["trabajos"] and metodo == "POST":
+            if not cuerpo: raise _ErrorHTTP(400, "Falta el PDF en el cuerpo")
+            try:
+                parametros = _parametros({k: v[-1] for k, v in query.items()})
+            except (ValueError, TypeError) as e:
+                raise _ErrorHTTP(400, str(e))
+            trabajo = Trabajo(parametros)
+            self._registrar(trabajo)
+            await trabajo.publicar("en_cola")
+            tarea = asyncio.create_task(self._correr(trabajo, cuerpo))
+            self._tareas.add(tarea)
+            tarea.add_done_callback(self._tarea_terminada)
+            return await _responder(writer, 202, _a_json({"id": trabajo.id, "estado": trabajo.estado}))
+
+        if len(partes) == 2 and partes[0] == "trabajos" and metodo == "GET":
+            return await _responder(writer, 200, _a_json(self._trabajo(partes[1]).resumen()))
+
+        if len(partes) == 3 and partes[0] == "trabajos" and partes[2] == "eventos" and metodo == "GET":
+            trabajo = self._trabajo(partes[1])
+            await _iniciar_flujo(writer, "application/x-ndjson")
+            async for evento in trabajo.seguir():
+                await _escribir_trozo(writer, _a_json(evento) + b"\n")
+            return await _escribir_trozo(writer, b"")
+
+        if len(partes) == 3 and partes[0] == "trabajos" and partes[2] == "liquidacion" and metodo == "POST":
+            trabajo = self._trabajo(partes[1])
+            _, parametros = self._datos_trabajo(trabajo, cuerpo)
+            # Con los parámetros del envío el resultado ya está calculado
+            if parametros == trabajo.parametros:
+                return await _responder(writer, 200, _a_json(trabajo.resultado))
+            async with self._cupos:
+                resultado = await self._en_pool(_liquidar, trabajo.historia, parametros)
+            return await _responder(writer, 200, _a_json(resultado))
+
+        if len(partes) == 3 and partes[0] == "trabajos" and partes[2] == "dictamen" and metodo == "POST":
+            trabajo = self._trabajo(partes[1])
+            datos, parametros = self._datos_trabajo(trabajo, cuerpo)
+            perfil = datos.get("perfil") or {"nombre": "", "fecha_nac": pd.Timestamp(parametros["fecha_nacimiento"]).strftime("%d/%m/%Y")}
+            async with self._cupos:
+                docx = await self._en_pool(_dictamen, trabajo.historia, parametros, perfil, datos.get("proyeccion"))
+            from reporte import MIME_DOCX
+            return await _responder(writer, 200, docx, MIME_DOCX)
+
+        raise _ErrorHTTP(404 if metodo in ("GET", "POST") else 405, f"Ruta no soportada: {metodo} {ruta}")
+
+    async def _atender(self, reader, writer):
+        try:
+            linea = await asyncio.wait_for(reader.readline(), 30)
+            if not linea: return
+            metodo, destino, _ = linea.decode("latin-1").split(" ", 2)
+            cabeceras = {}
+            while True:
+                linea = await asyncio.wait_for(reader.readline(), 30)
+                if linea in (b"\r\n", b"\n", b""): break
+                nombre, _, valor = linea.decode("latin-1").partition(":")
+                cabeceras[nombre.strip().lower()] = valor.strip()
+
+            largo = int(cabeceras.get("content-length", 0))
+            if largo > self.max_bytes:
+                raise _ErrorHTTP(413, f"El archivo supera {self.max_bytes // (1024 * 1024)} MB")
+            cuerpo = await reader.readexactly(largo) if largo else b""
+            url = urllib.parse.urlsplit(destino)
+            await self._rutear(metodo.upper(), url.path, urllib.parse.parse_qs(url.query), cuerpo, writer)
+        except _ErrorHTTP as e:
+            await _responder(writer, e.codigo, _a_json({"error": str(e)}))
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError):
+            pass
+        except Exception as e:
+            await _responder(writer, 500, _a_json({"error": f"{type(e).__name__}: {e}"}))
+        finally:
+            try:
+                writer.close()
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+async def _responder(writer, codigo, cuerpo, tipo="application/json"):
+    writer.write(
+        f"HTTP/1.1 {codigo} {_MENSAJES.get(codigo, '')}\r\nContent-Type: {tipo}\r\n"
+        f"Content-Length: {len(cuerpo)}\r\nConnection: close\r\n\r\n".encode("latin-1") + cuerpo
+    )
+    await writer.drain()
+
+async def _iniciar_flujo(writer, tipo):
+    writer.write(f"HTTP/1.1 200 OK\r\nContent-Type: {tipo}\r\nTransfer-Encoding: chunked\r\nConnection: close\r\n\r\n".encode("latin-1"))
+    await writer.drain()
+
+async def _escribir_trozo(writer, datos):
+    writer.write(f"{len(datos):X}\r\n".encode("latin-1") + datos + b"\r\n")
+    await writer.drain()
+
+async def servir(host="127.0.0.1", puerto=8765, **opciones):
+    servicio = ServicioLiquidacion(**opciones)
+    servidor = await servicio.iniciar(host, puerto)
+    print(f"Servicio de liquidación en http://{host}:{puerto} ({servicio.workers} workers)", file=sys.stderr)
+    # SIGTERM/SIGINT cierran el servidor y el pool (sin dejar workers huérfanos)
+    parar = asyncio.Event()
+    for senal in (signal.SIGINT, signal.SIGTERM):
+        try:
+            asyncio.get_running_loop().add_signal_handler(senal, parar.set)
+        except (NotImplementedError, RuntimeError):
+            pass
+    try:
+        async with servidor:
+            await parar.wait()
+    finally:
+        await servicio.detener()
+
+# ==========================================
+# CLIENTE (usado por la app)
+# ==========================================
+class ClienteServicio:
+    """Cliente HTTP síncrono del servicio (urllib, sin dependencias)"""
+    def __init__(self, url, timeout=600):
+        self.url = url.rstrip("/")
+        self.timeout = timeout
+
+    def _pedir(self, metodo, ruta, cuerpo=None, tipo="application/json"):
+        peticion = urllib.request.Request(self.url + ruta, data=cuerpo, method=metodo, headers={"Content-Type": tipo})
+        try:
+            return urllib.request.urlopen(peticion, timeout=self.timeout)
+        except urllib.error.HTTPError as e:
+            try:
+                mensaje = json.loads(e.read()).get("error", str(e))
+            except ValueError:
+                mensaje = str(e)
+            raise RuntimeError(f"Servicio de liquidación ({e.code}): {mensaje}") from None
+
+    def enviar_pdf(self, contenido, genero, fecha_nacimiento, limitar=True, granularidad="anual"):
+        """Encola un PDF y devuelve el id del trabajo"""
+        query = urllib.parse.urlencode({
+            "genero": genero, "fecha_nacimiento": pd.Timestamp(fecha_nacimiento).strftime("%Y-%m-%d"),
+            "tope": int(bool(limitar)), "granularidad": granularidad
+        })
+        with self._pedir("POST", f"/trabajos?{query}", contenido, "application/pdf") as r:
+            return json.loads(r.read())["id"]
+
+    def eventos(self, id_trabajo):
+        """Eventos de progreso a medida que llegan (el último es 'listo' o 'error')"""
+        with self._pedir("GET", f"/trabajos/{id_trabajo}/eventos") as r:
+            for linea in r:
+                if linea.strip(): yield json.loads(linea)
+
+    def trabajo(self, id_trabajo):
+        with self._pedir("GET", f"/trabajos/{id_trabajo}") as r:
+            return json.loads(r.read())
+
+    def historia(self, id_trabajo):
+        """Historia limpia del trabajo terminado como DataFrame"""
+        datos = self.trabajo(id_trabajo)
+        if datos["estado"] != "listo": raise RuntimeError(datos["error"] or f"Trabajo en estado '{datos['estado']}'")
+        return HistoriaLaboral.desde_json(datos["historia"]).a_dataframe()
+
+    def liquidacion(self, id_trabajo, genero, fecha_nacimiento, limitar=True, granularidad="anual"):
+        """Liquidación y regímenes de la historia del trabajo (ver resultado_desde_json)"""
+        cuerpo = _a_json({
+            "genero": genero, "fecha_nacimiento": pd.Timestamp(fecha_nacimiento).strftime("%Y-%m-%d"),
+            "limitar": bool(limitar), "granularidad": granularidad
+        })
+        with self._pedir("POST", f"/trabajos/{id_trabajo}/liquidacion", cuerpo) as r:
+            return resultado_desde_json(json.loads(r.read()))
+
+    def dictamen(self, id_trabajo, perfil, genero, fecha_nacimiento, limitar=True, granularidad="anual", proyeccion=None):
+        cuerpo = _a_json({
+            "perfil": perfil, "genero": genero, "fecha_nacimiento": pd.Timestamp(fecha_nacimiento).strftime("%Y-%m-%d"),
+            "limitar": bool(limitar), "granularidad": granularidad, "proyeccion": proyeccion
+        })
+        with self._pedir("POST", f"/trabajos/{id_trabajo}/dictamen", cuerpo) as r:
+            return r.read()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Servicio local de liquidación pensional.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--puerto", type=int, default=8765)
+    parser.add_argument("--workers", type=int, default=None, help="Procesos del pool (por defecto: núcleos)")
+    parser.add_argument("--cache", metavar="DIR", help="Caché en disco de historias ya parseadas")
+    parser.add_argument("--max-mb", type=float, default=MAX_MB_POR_DEFECTO, help="Tamaño máximo del PDF")
+    args = parser.parse_args(argv)
+    asyncio.run(servir(args.host, args.puerto, workers=args.workers, directorio_cache=args.cache, max_mb=args.max_mb))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
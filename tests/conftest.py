@@ -0,0 +1,20 @@
+import os
+import sys
+
+import pytest
+
+# Los módulos del liquidador viven en la raíz del repositorio
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+@pytest.fixture
+def historia_generada():
+    """Historia limpia (DataFrame final) a partir de las líneas sintéticas de los benchmarks"""
+    from benchmarks.generador import lineas_por_filas
+    from data_processor import aplicar_regla_simultaneidad, construir_tabla_cruda, limpiar_y_estandarizar, sugerir_columnas
+
+    def generar(filas, semilla=0, anios=40):
+        df_crudo = construir_tabla_cruda(lineas_por_filas(filas, anios=anios, semilla=semilla))
+        cols = sugerir_columnas(df_crudo)
+        limpio = limpiar_y_estandarizar(df_crudo, cols["desde"], cols["hasta"], cols["ibc"], cols["semanas"])
+        return aplicar_regla_simultaneidad(limpio)
+    return generar
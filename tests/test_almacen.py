@@ -0,0 +1,88 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from almacen import AlmacenHistorias
+from logic import LiquidadorPension
+
+COLUMNAS = ["Desde", "Hasta", "IBC", "Semanas"]
+CASOS = [
+    # (filas, semilla, género, nacimiento)
+    (200, 0, "Masculino", "1962-03-15"),
+    (450, 1, "Femenino", "1968-02-29"),
+    (1, 2, "Masculino", "1990-01-01"),
+    (120, 3, "Femenino", "1960-02-29"),
+    (60, 4, "Masculino", "1955-07-01"),
+]
+
+@pytest.fixture
+def almacen(tmp_path, historia_generada):
+    """Almacén con las historias de CASOS escritas y reabierto desde disco"""
+    directorio = str(tmp_path / "almacen")
+    historias = {}
+    with AlmacenHistorias(directorio).escritor() as escritor:
+        for i, (filas, semilla, genero, nacimiento) in enumerate(CASOS):
+            historias[f"a{i}"] = historia_generada(filas, semilla)
+            escritor.agregar(f"a{i}", historias[f"a{i}"], genero, nacimiento, nombre=f"Afiliado {i}")
+    return AlmacenHistorias(directorio), historias
+
+def _resultados(almacen, max_filas):
+    return almacen.reliquidar(max_filas=max_filas).set_index("id")
+
+def test_historias_ida_y_vuelta(almacen):
+    almacen, historias = almacen
+    assert almacen.ids == list(historias)
+    assert almacen.filas == sum(len(df) for df in historias.values())
+    for id_afiliado, df in historias.items():
+        historia = almacen.historia(id_afiliado)
+        assert np.array_equal(historia.desde, df["Desde"].to_numpy().astype("datetime64[D]"))
+        assert np.array_equal(historia.hasta, df["Hasta"].to_numpy().astype("datetime64[D]"))
+        assert np.array_equal(historia.ibc, df["IBC"].to_numpy(dtype=float))
+        assert np.array_equal(historia.semanas, df["Semanas"].to_numpy(dtype=float))
+
+@pytest.mark.parametrize("max_filas", [1, 150, 500, 10_000])
+def test_bloques_cubren_el_almacen(almacen, max_filas):
+    almacen, _ = almacen
+    bloques = list(almacen.bloques(max_filas))
+    assert bloques[0][0] == 0 and bloques[-1][1] == len(almacen)
+    assert all(fin == inicio for (_, fin), (inicio, _) in zip(bloques, bloques[1:]))
+    for primero, ultimo in bloques:
+        # Un bloque excede max_filas solo si tiene un único afiliado
+        assert almacen.offsets[ultimo] - almacen.offsets[primero] <= max_filas or ultimo - primero == 1
+
+@pytest.mark.parametrize("max_filas", [1, 150, 10_000])
+def test_reliquidar_igual_a_liquidar(almacen, max_filas):
+    almacen, historias = almacen
+    resultado = _resultados(almacen, max_filas)
+    assert resultado.index.tolist() == list(historias)
+    for (id_afiliado, df), (_, _, genero, nacimiento) in zip(historias.items(), CASOS):
+        res = LiquidadorPension(df[COLUMNAS], genero, nacimiento).liquidar()
+        fila = resultado.loc[id_afiliado]
+        assert fila["estado"] == "ok"
+        assert fila["periodos"] == len(df)
+        for campo in ("semanas", "ibl_10", "ibl_vida", "ibl", "origen_ibl", "tasa", "mesada"):
+            assert fila[campo] == res[campo], (id_afiliado, campo)
+        if res["fechas"]["tiene_estatus"]:
+            assert pd.Timestamp(fila["fecha_corte"]) == pd.Timestamp(res["fechas"]["fecha_corte"])
+
+def test_escritor_sin_publicar(almacen, historia_generada):
+    almacen, _ = almacen
+    antes = _resultados(almacen, 10_000)
+    ids, filas = almacen.ids, almacen.filas
+
+    escritor = almacen.escritor().abrir()
+    escritor.agregar("nuevo", historia_generada(300, 9), "Femenino", "1965-05-05")
+    escritor.cerrar(publicar=False)
+
+    reabierto = AlmacenHistorias(almacen.directorio)
+    assert reabierto.ids == ids and reabierto.filas == filas
+    assert "nuevo" not in reabierto
+    pd.testing.assert_frame_equal(_resultados(reabierto, 10_000).drop(columns="fecha_corte"),
+                                  antes.drop(columns="fecha_corte"))
+
+    # La próxima escritura descarta las filas huérfanas y anexa tras las publicadas
+    nueva = historia_generada(30, 9)
+    with reabierto.escritor() as escritor:
+        escritor.agregar("nuevo", nueva, "Femenino", "1965-05-05")
+    assert reabierto.filas == filas + len(nueva)
+    assert np.array_equal(reabierto.historia("nuevo").ibc, nueva["IBC"].to_numpy(dtype=float))
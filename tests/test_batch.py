@@ -0,0 +1,53 @@
+import csv
+import zipfile
+
+import pandas as pd
+import pytest
+
+from almacen import AlmacenHistorias
+from batch import cargar_tareas, ejecutar_lote
+from benchmarks.generador import fixtures
+
+@pytest.fixture
+def manifiesto(tmp_path):
+    """Manifiesto con dos PDFs sintéticos, uno de ellos repetido"""
+    pdfs = [fixtures(str(tmp_path / "pdfs"), 40, semilla)["pdf"] for semilla in (0, 1)]
+    ruta = tmp_path / "manifiesto.csv"
+    with open(ruta, "w", newline="", encoding="utf-8") as f:
+        w = csv.writer(f)
+        w.writerow(["archivo", "genero", "fecha_nacimiento", "nombre"])
+        w.writerow([pdfs[0], "Masculino", "1962-03-15", "Uno"])
+        w.writerow([pdfs[1], "Femenino", "1968-02-29", "Dos"])
+        w.writerow([pdfs[0], "Masculino", "1962-03-15", "Uno (repetido)"])
+    return str(ruta), pdfs
+
+def test_manifiesto_con_duplicado(tmp_path, manifiesto):
+    ruta, pdfs = manifiesto
+    salida = str(tmp_path / "resumen.csv")
+    stats = ejecutar_lote(cargar_tareas(ruta), salida, workers=1, directorio_almacen=str(tmp_path / "almacen"))
+
+    assert stats["archivos"] == 3 and stats["ok"] == 3
+    assert len(pd.read_csv(salida)) == 3
+    almacen = AlmacenHistorias(str(tmp_path / "almacen"))
+    assert sorted(almacen.ids) == sorted(pdfs)
+
+def test_lote_interrumpido_no_publica(tmp_path, manifiesto):
+    ruta, _ = manifiesto
+    directorio = str(tmp_path / "almacen")
+
+    def interrumpir(i, total, fila):
+        if i == 2: raise KeyboardInterrupt
+
+    with pytest.raises(KeyboardInterrupt):
+        ejecutar_lote(cargar_tareas(ruta), str(tmp_path / "resumen.csv"), workers=1, progreso=interrumpir,
+                      directorio_almacen=directorio)
+    almacen = AlmacenHistorias(directorio)
+    assert len(almacen) == 0 and almacen.filas == 0
+
+def test_lote_con_dictamenes(tmp_path, manifiesto):
+    ruta, _ = manifiesto
+    destino = str(tmp_path / "dictamenes.zip")
+    stats = ejecutar_lote(cargar_tareas(ruta), str(tmp_path / "resumen.csv"), workers=1, destino_dictamenes=destino)
+    assert stats["dictamenes"]["documentos"] == 3 and stats["dictamenes"]["errores"] == 0
+    with zipfile.ZipFile(destino) as z:
+        assert len(z.namelist()) == 3
@@ -0,0 +1,18 @@
+import pytest
+
+import data_processor
+from benchmarks.generador import fixtures
+
+def test_cupo_paralelo_liberado_si_falla_el_pool(tmp_path, monkeypatch):
+    pdf = fixtures(str(tmp_path), 600)["pdf"]
+
+    def pool_fallido(*args, **kwargs):
+        raise OSError("Resource temporarily unavailable")
+
+    monkeypatch.setattr(data_processor.os, "cpu_count", lambda: 4)
+    monkeypatch.setattr(data_processor, "ProcessPoolExecutor", pool_fallido)
+    with pytest.raises(OSError):
+        list(data_processor._textos_paginas(pdf, workers=4))
+    # El siguiente documento puede volver a extraerse en paralelo
+    assert data_processor._extraccion_paralela.acquire(blocking=False)
+    data_processor._extraccion_paralela.release()
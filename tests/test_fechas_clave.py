@@ -0,0 +1,83 @@
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+import pytest
+from dateutil.relativedelta import relativedelta
+
+from logic import LiquidadorPension
+from utils import calcular_semanas_minimas_mujeres
+
+COLUMNAS = ["Desde", "Hasta", "IBC", "Semanas"]
+PERFILES = [("Masculino", "1962-03-15"), ("Femenino", "1968-02-29"), ("Femenino", "1960-02-29"),
+            ("Masculino", "1990-01-01")]
+
+def referencia(df, genero, fecha_nacimiento):
+    """determinar_fechas_clave original: recorre la historia ordenada fila por fila"""
+    fecha_nacimiento = pd.to_datetime(fecha_nacimiento)
+    fecha_cumple_edad = fecha_nacimiento + relativedelta(years=62 if genero == "Masculino" else 57)
+    req_sem = 1300
+    if genero == "Femenino":
+        req_sem = calcular_semanas_minimas_mujeres(datetime.now().year)
+
+    df_sort = df.sort_values('Hasta')
+    acumulado = 0
+    fecha_cumple_semanas = None
+    for _, row in df_sort.iterrows():
+        acumulado += row['Semanas']
+        if acumulado >= req_sem:
+            fecha_cumple_semanas = row['Hasta']
+            break
+
+    tiene_estatus = (fecha_cumple_semanas is not None) and (acumulado >= req_sem)
+    fecha_estatus = max(fecha_cumple_edad, fecha_cumple_semanas) if tiene_estatus else None
+    ultima_cotizacion = df_sort['Hasta'].max()
+    if not tiene_estatus:
+        fecha_corte, razon_corte = datetime.now(), "Año de Estudio (No acredita estatus)"
+    elif df_sort[df_sort['Hasta'] > (fecha_estatus + timedelta(days=30))].empty:
+        fecha_corte, razon_corte = fecha_estatus, "Fecha de Estatus (Sin semanas posteriores)"
+    else:
+        fecha_corte, razon_corte = ultima_cotizacion, "Última Cotización (Con semanas posteriores al estatus)"
+    return {
+        "fecha_cumple_edad": fecha_cumple_edad, "fecha_cumple_semanas": fecha_cumple_semanas,
+        "fecha_estatus": fecha_estatus, "tiene_estatus": tiene_estatus, "fecha_corte": fecha_corte,
+        "razon_corte": razon_corte, "fecha_efectividad": fecha_corte + timedelta(days=1),
+        "ultima_cotizacion": ultima_cotizacion
+    }
+
+def comparar(df, genero, fecha_nacimiento):
+    obtenido = LiquidadorPension(df, genero, fecha_nacimiento).determinar_fechas_clave()
+    esperado = referencia(df, genero, fecha_nacimiento)
+    assert obtenido.keys() == esperado.keys()
+    for campo, valor in esperado.items():
+        if campo in ("fecha_corte", "fecha_efectividad") and not esperado["tiene_estatus"]:
+            # Sin estatus el corte es 'ahora' y difiere en microsegundos
+            assert pd.Timestamp(obtenido[campo]).normalize() == pd.Timestamp(valor).normalize(), campo
+        elif valor is None or (not isinstance(valor, (bool, str)) and pd.isna(valor)):
+            assert obtenido[campo] is None or pd.isna(obtenido[campo]), campo
+        else:
+            assert obtenido[campo] == valor, campo
+    return obtenido
+
+@pytest.mark.parametrize("genero, fecha_nacimiento", PERFILES)
+@pytest.mark.parametrize("filas, semilla", [(1, 0), (90, 1), (400, 2), (700, 3)])
+def test_historias_generadas(historia_generada, filas, semilla, genero, fecha_nacimiento):
+    df = historia_generada(filas, semilla, anios=45)[COLUMNAS]
+    comparar(df, genero, fecha_nacimiento)
+    # Mismo resultado con las filas desordenadas (el orden por 'Hasta' es estable)
+    comparar(df.sample(frac=1, random_state=semilla), genero, fecha_nacimiento)
+
+@pytest.mark.parametrize("genero, fecha_nacimiento", PERFILES)
+def test_semanas_negativas(historia_generada, genero, fecha_nacimiento):
+    # Ajustes con semanas negativas: el acumulado deja de ser creciente
+    df = historia_generada(700, 4, anios=45)[COLUMNAS].reset_index(drop=True)
+    rng = np.random.default_rng(4)
+    ajustes = rng.choice(len(df), 40, replace=False)
+    df.loc[ajustes, "Semanas"] = -rng.uniform(1, 30, len(ajustes))
+    comparar(df, genero, fecha_nacimiento)
+
+@pytest.mark.parametrize("genero, fecha_nacimiento", PERFILES)
+def test_historia_vacia(genero, fecha_nacimiento):
+    df = pd.DataFrame({"Desde": pd.to_datetime([]), "Hasta": pd.to_datetime([]), "IBC": [], "Semanas": []})
+    fechas = comparar(df, genero, fecha_nacimiento)
+    assert not fechas["tiene_estatus"]
@@ -0,0 +1,186 @@
+import numpy as np
+import pandas as pd
+import pytest
+from dateutil.relativedelta import relativedelta
+
+import utils
+from logic import LiquidadorPension
+from utils import IPC_HISTORICO, TablaIPC, obtener_ipc_acumulado
+
+COLUMNAS = ["Desde", "Hasta", "IBC", "Semanas"]
+CORTES = [pd.Timestamp(1960, 1, 1), pd.Timestamp(1994, 4, 1), pd.Timestamp(2010, 6, 15),
+          pd.Timestamp(2024, 2, 29), pd.Timestamp(2031, 12, 31)]
+
+def factor_referencia(fecha_inicio, fecha_corte, ipc=IPC_HISTORICO):
+    """Productoria original año por año hasta el año anterior al corte"""
+    anio_inicio, anio_fin = fecha_inicio.year, fecha_corte.year
+    min_anio, max_anio = min(ipc), max(ipc)
+    if anio_inicio < min_anio: anio_inicio = min_anio
+    if anio_fin > max_anio: anio_fin = max_anio
+    factor = 1.0
+    for anio in range(anio_inicio, anio_fin):
+        if anio in ipc:
+            factor *= (1 + (ipc[anio] / 100.0))
+    return factor
+
+def ibl_referencia(df, f_corte, metodo="toda_vida"):
+    """calcular_ibl_indexado original, fila por fila"""
+    if df.empty: return 0.0, pd.DataFrame()
+    if metodo == "ultimos_10":
+        df = df[df['Hasta'] >= df['Hasta'].max() - relativedelta(years=10)]
+    detalles = []
+    for _, row in df.iterrows():
+        ibc_hist = row['IBC']
+        if ibc_hist <= 0: ibc_hist = 0
+        factor = factor_referencia(row['Hasta'], f_corte)
+        detalles.append({
+            'Desde': row['Desde'], 'Hasta': row['Hasta'], 'IBC_Historico': ibc_hist,
+            'Factor_IPC': factor, 'IBC_Actualizado': ibc_hist * factor, 'Semanas': row['Semanas']
+        })
+    df_detalles = pd.DataFrame(detalles)
+    if df_detalles.empty: return 0.0, pd.DataFrame()
+    return df_detalles['IBC_Actualizado'].mean(), df_detalles
+
+def igual_soporte(obtenido, esperado):
+    """Mismas filas y mismos números, bit a bit"""
+    assert len(obtenido) == len(esperado)
+    if esperado.empty: return
+    for col in ("Desde", "Hasta"):
+        assert pd.to_datetime(obtenido[col]).tolist() == pd.to_datetime(esperado[col]).tolist()
+    for col in ("IBC_Historico", "Factor_IPC", "IBC_Actualizado", "Semanas"):
+        assert np.array_equal(obtenido[col].to_numpy(), esperado[col].to_numpy().astype(float)), col
+
+@pytest.fixture(params=[(0, 0), (1, 0), (90, 1), (700, 2)], ids=lambda p: f"{p[0]}filas")
+def historia(request, historia_generada):
+    filas, semilla = request.param
+    if filas == 0:
+        return pd.DataFrame({"Desde": pd.to_datetime([]), "Hasta": pd.to_datetime([]), "IBC": [], "Semanas": []})
+    return historia_generada(filas, semilla, anios=45)[COLUMNAS]
+
+def historia_un_periodo():
+    # Último periodo terminado un 29 de febrero: la ventana de 10 años cae en un año no bisiesto
+    return pd.DataFrame({"Desde": pd.to_datetime(["2024-02-01"]), "Hasta": pd.to_datetime(["2024-02-29"]),
+                         "IBC": [2_500_000.0], "Semanas": [4.14]})
+
+@pytest.mark.parametrize("metodo", ["toda_vida", "ultimos_10"])
+@pytest.mark.parametrize("f_corte", CORTES, ids=lambda f: f.strftime("%Y-%m-%d"))
+def test_ibl_indexado_igual_al_original(historia, metodo, f_corte):
+    liq = LiquidadorPension(historia, "Femenino", "1960-02-29")
+    ibl, detalle = liq.calcular_ibl_indexado(f_corte, metodo)
+    ibl_esperado, detalle_esperado = ibl_referencia(historia, f_corte, metodo)
+    igual_soporte(detalle, detalle_esperado)
+    assert ibl == ibl_esperado
+
+@pytest.mark.parametrize("metodo", ["toda_vida", "ultimos_10"])
+def test_un_periodo_29_febrero(metodo):
+    df = historia_un_periodo()
+    ibl, detalle = LiquidadorPension(df, "Masculino", "1964-02-29").calcular_ibl_indexado(CORTES[-1], metodo)
+    ibl_esperado, detalle_esperado = ibl_referencia(df, CORTES[-1], metodo)
+    igual_soporte(detalle, detalle_esperado)
+    assert ibl == ibl_esperado
+
+def test_factor_ipc_igual_al_original():
+    liq = LiquidadorPension(historia_un_periodo(), "Masculino", "1964-02-29")
+    for inicio in range(1950, 2032):
+        for corte in range(1950, 2032, 3):
+            fecha_inicio, fecha_corte = pd.Timestamp(inicio, 6, 30), pd.Timestamp(corte, 1, 1)
+            assert liq.obtener_factor_ipc(fecha_inicio, fecha_corte) == factor_referencia(fecha_inicio, fecha_corte)
+
+@pytest.mark.parametrize("f_corte", CORTES, ids=lambda f: f.strftime("%Y-%m-%d"))
+def test_ibl_dual_igual_a_dos_pasadas(historia, f_corte):
+    dual = LiquidadorPension(historia, "Masculino", "1962-03-15").calcular_ibl_dual(f_corte)
+    ibl_10, det_10 = ibl_referencia(historia, f_corte, "ultimos_10")
+    ibl_vida, det_vida = ibl_referencia(historia, f_corte, "toda_vida")
+    # Los soportes salen de la misma indexación; los IBL, de sumas prefijas
+    # (otro orden de suma que mean(): iguales salvo redondeo)
+    igual_soporte(dual["det_10"], det_10)
+    igual_soporte(dual["det_vida"], det_vida)
+    assert dual["ibl_10"] == pytest.approx(ibl_10, rel=1e-12, abs=0)
+    assert dual["ibl_vida"] == pytest.approx(ibl_vida, rel=1e-12, abs=0)
+    assert dual["ibl"] == max(dual["ibl_10"], dual["ibl_vida"])
+    if not np.isclose(ibl_10, ibl_vida, rtol=1e-12, atol=0):
+        assert dual["origen_ibl"] == ("Últimos 10 Años" if ibl_10 >= ibl_vida else "Toda la Vida")
+
+def test_ibl_dual_un_periodo_29_febrero():
+    df = historia_un_periodo()
+    dual = LiquidadorPension(df, "Femenino", "1964-02-29").calcular_ibl_dual(CORTES[-1])
+    assert dual["ibl_10"] == dual["ibl_vida"] == ibl_referencia(df, CORTES[-1])[0]
+    assert dual["origen_ibl"] == "Últimos 10 Años"
+
+@pytest.fixture
+def serie_restaurada():
+    """Restaura la tabla IPC compartida al terminar"""
+    original = utils.obtener_tabla_ipc()
+    yield
+    utils.actualizar_serie_ipc(original.serie, original.serie_mensual)
+
+def _todas_las_fechas():
+    for inicio in range(1950, 2032):
+        for corte in range(1950, 2032, 3):
+            yield pd.Timestamp(inicio, 6, 30), pd.Timestamp(corte, 1, 1)
+
+def test_tabla_compartida_igual_al_original():
+    liq = LiquidadorPension(historia_un_periodo(), "Masculino", "1964-02-29")
+    assert liq.tabla_ipc is utils.obtener_tabla_ipc()
+    for fecha_inicio, fecha_corte in _todas_las_fechas():
+        assert obtener_ipc_acumulado(fecha_inicio, fecha_corte) == factor_referencia(fecha_inicio, fecha_corte)
+
+def test_serie_cargada_desde_csv(tmp_path, serie_restaurada):
+    # Serie con un año faltante y un dato nuevo, como la publicaría el DANE
+    serie = {a: v for a, v in IPC_HISTORICO.items() if a != 1999}
+    serie[2027] = 3.1
+    ruta = tmp_path / "ipc.csv"
+    ruta.write_text("anio,ipc\n" + "".join(f"{a},{v}\n" for a, v in serie.items()), encoding="utf-8")
+    utils.cargar_serie_ipc(str(ruta))
+
+    liq = LiquidadorPension(historia_un_periodo(), "Masculino", "1964-02-29")
+    for fecha_inicio, fecha_corte in _todas_las_fechas():
+        esperado = factor_referencia(fecha_inicio, fecha_corte, serie)
+        assert obtener_ipc_acumulado(fecha_inicio, fecha_corte) == esperado
+        assert liq.obtener_factor_ipc(fecha_inicio, fecha_corte) == esperado
+
+def factor_mensual_referencia(fecha_inicio, fecha_corte, ipc=IPC_HISTORICO, ipc_mensual=None):
+    """Productoria mes a mes desde el mes del periodo hasta el mes anterior al corte"""
+    ipc_mensual = ipc_mensual or {}
+    min_anio, max_anio = min(ipc), max(ipc)
+
+    def ordinal(fecha):
+        return min(max((fecha.year - min_anio) * 12 + fecha.month - 1, 0), (max_anio - min_anio + 1) * 12)
+
+    factor = 1.0
+    for m in range(ordinal(fecha_inicio), ordinal(fecha_corte)):
+        anio, mes = min_anio + m // 12, m % 12 + 1
+        if (anio, mes) in ipc_mensual:
+            factor *= 1 + ipc_mensual[(anio, mes)] / 100.0
+        else:
+            factor *= (1 + ipc.get(anio, 0.0) / 100.0) ** (1 / 12)
+    return factor
+
+IPC_MENSUAL = {(2023, 1): 1.78, (2023, 2): 1.66, (2023, 12): 0.45, (2024, 2): 1.09, (2024, 7): 0.2}
+
+@pytest.mark.parametrize("ipc_mensual", [None, IPC_MENSUAL], ids=["derivado", "publicado"])
+@pytest.mark.parametrize("f_corte", CORTES, ids=lambda f: f.strftime("%Y-%m-%d"))
+def test_indexacion_mensual(historia, f_corte, ipc_mensual):
+    liq = LiquidadorPension(historia, "Masculino", "1962-03-15", tabla_ipc=TablaIPC(IPC_HISTORICO, ipc_mensual))
+    ibl, detalle = liq.calcular_ibl_indexado(f_corte, granularidad="mensual")
+    if historia.empty:
+        assert ibl == 0.0 and detalle.empty
+        return
+    esperado = np.array([factor_mensual_referencia(h, f_corte, ipc_mensual=ipc_mensual) for h in historia["Hasta"]])
+    # Cociente de índices acumulados contra la productoria directa: iguales salvo redondeo
+    np.testing.assert_allclose(detalle["Factor_IPC"].to_numpy(), esperado, rtol=1e-12, atol=0)
+    ibc = np.where(historia["IBC"].to_numpy() <= 0, 0.0, historia["IBC"].to_numpy())
+    assert ibl == pytest.approx((ibc * esperado).mean(), rel=1e-12, abs=0)
+
+def test_mensual_en_anios_completos_igual_al_anual():
+    # De enero a enero los doce meses derivados suman el año completo
+    tabla = TablaIPC(IPC_HISTORICO)
+    inicios = pd.to_datetime([f"{a}-01-31" for a in range(1967, 2026)])
+    for corte in (pd.Timestamp(1990, 1, 15), pd.Timestamp(2026, 1, 1)):
+        np.testing.assert_allclose(tabla.factores_mensuales(inicios, corte), tabla.factores_anuales(inicios, corte),
+                                   rtol=1e-12, atol=0)
+
+def test_granularidad_desconocida(historia):
+    if historia.empty: return
+    with pytest.raises(ValueError):
+        LiquidadorPension(historia, "Masculino", "1962-03-15").calcular_ibl_indexado(CORTES[2], granularidad="diaria")
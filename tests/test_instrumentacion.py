@@ -0,0 +1,21 @@
+import pytest
+
+import instrumentacion
+from historia import HistoriaLaboral
+from logic import LiquidadorPension
+
+@pytest.fixture
+def instrumentado():
+    ya_activa = instrumentacion.esta_activa()
+    instrumentacion.activar()
+    yield
+    if not ya_activa: instrumentacion.desactivar()
+
+def test_medir_no_arma_dataframe(instrumentado, historia_generada):
+    df = historia_generada(300)
+    liq = LiquidadorPension(HistoriaLaboral.desde_dataframe(df), "Masculino", "1962-01-01")
+    medidas = instrumentacion.nueva_captura()
+    liq.liquidar(True)
+    # Las filas salen de los arreglos tipados: la propiedad 'df' no se evalúa
+    assert liq._df is None
+    assert {m["filas"] for m in medidas if m["etapa"].startswith("LiquidadorPension.")} == {len(df)}
@@ -0,0 +1,80 @@
+import re
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from benchmarks.generador import lineas_por_filas
+from data_processor import construir_tabla_cruda, limpiar_y_estandarizar, sugerir_columnas
+
+def _numero(val):
+    if not val or val.lower() == 'none': return 0.0
+    v = re.sub(r'[^\d\.,]', '', val)
+    if not v: return 0.0
+    if ',' in v and '.' in v: v = v.replace('.', '').replace(',', '.')
+    elif v.count('.') > 1: v = v.replace('.', '')
+    elif ',' in v:
+        if len(v.split(',')[-1]) == 2: v = v.replace(',', '.')
+        else: v = v.replace(',', '')
+    try: return float(v)
+    except ValueError: return 0.0
+
+def referencia(df_crudo, col_desde, col_hasta, col_ibc, col_semanas):
+    """Limpieza original fila por fila (antes de vectorizarla)"""
+    datos = []
+    for _, row in df_crudo.iterrows():
+        match_d = re.search(r'\d{2}/\d{2}/\d{4}', str(row[col_desde]))
+        match_h = re.search(r'\d{2}/\d{2}/\d{4}', str(row[col_hasta]))
+        if not match_d or not match_h: continue
+        desde = pd.to_datetime(match_d.group(0), dayfirst=True, errors='coerce')
+        hasta = pd.to_datetime(match_h.group(0), dayfirst=True, errors='coerce')
+        if pd.isna(desde) or pd.isna(hasta): continue
+        ibc = _numero(str(row[col_ibc]))
+        semanas = _numero(str(row[col_semanas]))
+        if semanas <= 0.1 or semanas > 55:
+            dias = (hasta - desde).days + 1
+            semanas = dias / 7 if 0 < dias < 12000 else 0
+        if semanas > 0:
+            datos.append({"Desde": desde, "Hasta": hasta, "IBC": ibc, "Semanas": semanas})
+    df = pd.DataFrame(datos)
+    return df.sort_values('Desde') if not df.empty else df
+
+def comparar(df_crudo, cols):
+    esperado = referencia(df_crudo, *cols)
+    obtenido = limpiar_y_estandarizar(df_crudo, *cols)
+    if esperado.empty:
+        assert obtenido.empty
+        return obtenido
+    assert list(obtenido.index) == list(esperado.index)
+    for col in ("Desde", "Hasta"):
+        assert obtenido[col].tolist() == esperado[col].tolist()
+    # Mismos números, bit a bit
+    for col in ("IBC", "Semanas"):
+        assert np.array_equal(obtenido[col].to_numpy(), esperado[col].to_numpy().astype(float))
+    assert (obtenido["Aportante"] == "Manual").all()
+    return obtenido
+
+@pytest.mark.parametrize("filas, semilla", [(1, 0), (60, 1), (800, 2)])
+def test_historias_generadas(filas, semilla):
+    df_crudo = construir_tabla_cruda(lineas_por_filas(filas, semilla=semilla))
+    cols = sugerir_columnas(df_crudo)
+    comparar(df_crudo, (cols["desde"], cols["hasta"], cols["ibc"], cols["semanas"]))
+
+# '05/13/1990' no admite día primero: ambas rutas caen al orden mes/día y pandas lo advierte
+@pytest.mark.filterwarnings("ignore:Parsing dates")
+def test_celdas_dificiles():
+    df_crudo = pd.DataFrame({
+        "d": ["01/02/1990", "29/02/1992", "29/02/1991", "05/13/1990", "x 01/03/1990 y", None, "01/01/1990", "15/06/1985", "01/01/2000"],
+        "h": ["28/02/1990", "31/03/1992", "31/03/1991", "30/06/1990", "31/03/1990", "01/01/1990", "bad", "14/06/2020", "31/01/2000"],
+        "i": ["$1.234.567", "1,234", "12,5", "None", None, "1.5", "3", "4.302.000,50", ""],
+        "s": ["4,29", "0,00", "999,00", "", "None", "4.29", "1", "0,05", "60"]
+    })
+    obtenido = comparar(df_crudo, ("d", "h", "i", "s"))
+    # El 29/02/1991 no existe, y un periodo de más de 12000 días sin semanas válidas se descarta
+    assert pd.Timestamp(1992, 2, 29) in set(obtenido["Desde"])
+    assert pd.Timestamp(1985, 6, 15) not in set(obtenido["Desde"]) and len(obtenido) == 5
+
+def test_tabla_vacia():
+    assert limpiar_y_estandarizar(pd.DataFrame(), "a", "b", "c", "d").empty
+    sin_filas_validas = pd.DataFrame({"d": ["sin fecha"], "h": ["x"], "i": ["1"], "s": ["1"]})
+    comparar(sin_filas_validas, ("d", "h", "i", "s"))
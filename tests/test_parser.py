@@ -0,0 +1,69 @@
+import random
+import re
+
+import pandas as pd
+import pytest
+
+import data_processor
+from benchmarks.generador import lineas_por_filas
+from data_processor import construir_tabla_cruda
+
+REGEX_FECHA = re.compile(r'\d{2}/\d{2}/\d{4}')
+
+def partir_referencia(linea):
+    """_partir_linea original: (formato, celdas) o None"""
+    linea = linea.strip()
+    if not linea or not REGEX_FECHA.search(linea): return None
+    if '","' in linea:
+        linea_temp = linea.replace('","', "||SEP||").strip('"')
+        return "moderno", [p.strip() for p in linea_temp.split("||SEP||")]
+    fechas = REGEX_FECHA.findall(linea)
+    if len(fechas) >= 2:
+        split_1 = linea.split(fechas[0], 1)
+        split_2 = split_1[1].split(fechas[1], 1)
+        valores = [v for v in re.split(r'\s+', split_2[1].strip()) if v]
+        return "antiguo", ["(Sin ID)", split_1[0].strip(), fechas[0], fechas[1]] + valores
+    return "otro", linea.split()
+
+def referencia(lineas):
+    """construir_tabla_cruda original: filas completadas con None hasta el ancho máximo"""
+    formatos = dict.fromkeys(("moderno", "antiguo", "otro"), 0)
+    filas = []
+    for linea in lineas:
+        partida = partir_referencia(linea)
+        if partida is None: continue
+        formatos[partida[0]] += 1
+        filas.append(partida[1])
+    if not filas: return pd.DataFrame(), formatos
+    max_cols = max(len(f) for f in filas)
+    df = pd.DataFrame([f + [None] * (max_cols - len(f)) for f in filas],
+                      columns=[f"Columna {i}" for i in range(max_cols)])
+    return df, formatos
+
+def comparar(lineas):
+    esperado, formatos = referencia(lineas)
+    obtenido = construir_tabla_cruda(lineas)
+    assert obtenido.attrs["formatos"] == formatos
+    if esperado.empty:
+        assert obtenido.empty
+    else:
+        pd.testing.assert_frame_equal(obtenido, esperado)
+
+def lineas_aleatorias(n, semilla):
+    """Líneas con comillas, separadores, espacios y fechas parciales mezclados"""
+    rng = random.Random(semilla)
+    piezas = ['"', '","', ",", " ", "  ", "\t", "01/02/2003", "31/12/1999", "1/02/2003", "12/2003", "/",
+              "ACME S.A.", "1.234.567", "4,29", "0,00", "$", "(Sin ID)", "30/06/20"]
+    return ["".join(rng.choice(piezas) for _ in range(rng.randint(0, 12))) for _ in range(n)]
+
+@pytest.mark.parametrize("filas, semilla", [(0, 0), (1, 0), (60, 1), (3000, 2)])
+def test_lineas_generadas(filas, semilla):
+    comparar(lineas_por_filas(filas, semilla=semilla) if filas else [])
+
+@pytest.mark.parametrize("filas_por_lote", [1, 2, 3, 5, 7, data_processor.FILAS_POR_LOTE])
+def test_lineas_aleatorias(monkeypatch, filas_por_lote):
+    # Lotes pequeños para cruzar muchas fronteras de lote con anchos distintos
+    monkeypatch.setattr(data_processor, "FILAS_POR_LOTE", filas_por_lote)
+    lineas = lineas_aleatorias(2000, filas_por_lote)
+    lineas += lineas_por_filas(40, semilla=3)
+    comparar(lineas)
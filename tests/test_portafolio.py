@@ -0,0 +1,67 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from logic import LiquidadorPension
+from portafolio import liquidar_portafolio
+
+COLUMNAS = ["Desde", "Hasta", "IBC", "Semanas"]
+
+def _igual_fecha(obtenida, esperada):
+    if esperada is None: return pd.isna(obtenida)
+    return pd.Timestamp(obtenida) == pd.Timestamp(esperada)
+
+@pytest.fixture
+def portafolio(historia_generada):
+    historias, afiliados = [], []
+    casos = [
+        # (filas, semilla, género, nacimiento, desordenar)
+        (200, 0, "Masculino", "1962-03-15", False),
+        (450, 1, "Femenino", "1968-02-29", True),
+        (120, 2, "Femenino", "1960-02-29", False),
+        (1, 3, "Masculino", "1990-01-01", False),
+        (60, 4, "Masculino", "1955-07-01", True),
+        (0, 5, "Femenino", "1970-01-01", False),
+    ]
+    rng = np.random.default_rng(0)
+    for i, (filas, semilla, genero, nacimiento, desordenar) in enumerate(casos):
+        afiliados.append({"afiliado": f"a{i}", "genero": genero, "fecha_nacimiento": pd.Timestamp(nacimiento)})
+        if not filas: continue
+        df = historia_generada(filas, semilla)[COLUMNAS]
+        if desordenar: df = df.iloc[rng.permutation(len(df))]
+        historias.append(df.reset_index(drop=True).assign(afiliado=f"a{i}"))
+    # Historias intercaladas al azar conservando el orden de filas de cada una
+    tabla = pd.concat(historias, ignore_index=True)
+    clave = pd.Series(rng.random(len(tabla))).groupby(tabla["afiliado"].to_numpy()).transform(np.sort)
+    return tabla.iloc[np.argsort(clave.to_numpy(), kind="stable")].reset_index(drop=True), pd.DataFrame(afiliados)
+
+@pytest.mark.parametrize("granularidad", ["anual", "mensual"])
+@pytest.mark.parametrize("limitar", [True, False])
+def test_coincide_con_liquidar(portafolio, granularidad, limitar):
+    historias, afiliados = portafolio
+    resultado = liquidar_portafolio(historias, afiliados, limitar_semanas_cotizadas=limitar, granularidad=granularidad)
+    assert resultado["afiliado"].tolist() == afiliados["afiliado"].tolist()
+
+    for (_, af), (_, fila) in zip(afiliados.iterrows(), resultado.iterrows()):
+        df = historias.loc[historias["afiliado"] == af["afiliado"], COLUMNAS].reset_index(drop=True)
+        if df.empty:
+            df = pd.DataFrame({"Desde": pd.to_datetime([]), "Hasta": pd.to_datetime([]), "IBC": [], "Semanas": []})
+        res = LiquidadorPension(df, af["genero"], af["fecha_nacimiento"]).liquidar(limitar, granularidad=granularidad)
+        fechas = res["fechas"]
+        # Mismas operaciones en el mismo orden: igualdad exacta
+        for campo in ("semanas", "ibl_10", "ibl_vida", "ibl", "tasa", "mesada", "origen_ibl"):
+            assert fila[campo] == res[campo], (af["afiliado"], campo)
+        assert fila["tiene_estatus"] == fechas["tiene_estatus"]
+        assert fila["razon_corte"] == fechas["razon_corte"]
+        for campo in ("fecha_cumple_edad", "fecha_cumple_semanas", "fecha_estatus", "ultima_cotizacion"):
+            assert _igual_fecha(fila[campo], fechas[campo]), (af["afiliado"], campo)
+        # Sin estatus el corte es 'ahora' y difiere en microsegundos
+        if fechas["tiene_estatus"]:
+            assert _igual_fecha(fila["fecha_corte"], fechas["fecha_corte"])
+
+def test_afiliado_sin_datos(portafolio):
+    historias, afiliados = portafolio
+    with pytest.raises(ValueError):
+        liquidar_portafolio(historias, afiliados.iloc[1:])
+    with pytest.raises(ValueError):
+        liquidar_portafolio(historias, pd.concat([afiliados, afiliados.iloc[:1]]))
@@ -0,0 +1,55 @@
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from logic import LiquidadorPension
+from proyeccion import TASA_APORTE, mejor_estrategia, simular_escenarios
+
+def referencia(df, genero, nacimiento, estrategia, valor, anios, mesada_actual):
+    """Simulación original: concatena los meses futuros y liquida de nuevo"""
+    ultimo = df["IBC"].iloc[-1]
+    nuevo_ibc = valor if "Cotizar" in estrategia else ultimo + valor
+    filas, cur = [], df["Hasta"].max() + timedelta(days=1)
+    for _ in range(anios * 12):
+        filas.append({"Desde": cur, "Hasta": cur + timedelta(days=30), "IBC": nuevo_ibc, "Semanas": 4.29})
+        cur += timedelta(days=31)
+    df_fut = pd.concat([df[["Desde", "Hasta", "IBC", "Semanas"]], pd.DataFrame(filas)], ignore_index=True)
+    liq = LiquidadorPension(df_fut, genero, nacimiento)
+    corte = liq.determinar_fechas_clave()["fecha_corte"]
+    ibl = max(liq.calcular_ibl_indexado(corte, "ultimos_10")[0], liq.calcular_ibl_indexado(corte, "toda_vida")[0])
+    mesada, tasa, _ = liq.calcular_tasa_reemplazo_797(ibl, df_fut["Semanas"].sum(), datetime.now().year + anios)
+    delta = mesada - mesada_actual
+    inversion = valor * TASA_APORTE * anios * 12
+    return ibl, tasa, mesada, (inversion / delta / 12) if delta > 0 else 0.0
+
+@pytest.mark.parametrize("filas, semilla, genero, nacimiento", [
+    (60, 0, "Masculino", "1963-01-01"), (300, 1, "Femenino", "1968-02-29"), (1, 2, "Masculino", "1990-01-01")
+])
+def test_coincide_con_la_simulacion_escalar(historia_generada, filas, semilla, genero, nacimiento):
+    df = historia_generada(filas, semilla)
+    liq = LiquidadorPension(df, genero, nacimiento)
+    mesada_actual = liq.liquidar()["mesada"]
+    escenarios = simular_escenarios(liq, [0, 1.5e6, 8e6], [1, 4, 12], mesada_actual=mesada_actual)
+    assert len(escenarios) == 2 * 3 * 3
+    for _, e in escenarios.iterrows():
+        ibl, tasa, mesada, roi = referencia(df, genero, nacimiento, e["estrategia"], e["valor"], int(e["anios"]), mesada_actual)
+        # Sumas prefijas frente a la media por pares: iguales salvo redondeo
+        assert np.isclose(e["ibl"], ibl, rtol=1e-12, atol=0)
+        assert np.isclose(e["tasa"], tasa, rtol=1e-12, atol=0)
+        assert np.isclose(e["mesada"], mesada, rtol=1e-12, atol=0)
+        assert np.isclose(e["roi"], roi, rtol=1e-9, atol=0)
+
+def test_redondeo_no_cuenta_como_mejora(historia_generada):
+    liq = LiquidadorPension(historia_generada(120), "Masculino", "1963-01-01")
+    estrategia = ["Cotizar Indep."]
+    base = simular_escenarios(liq, [1.5e6], [3], estrategia, mesada_actual=0.0)
+    # Mesada actual igual a la simulada salvo el último bit: sin mejora ni ROI
+    escenarios = simular_escenarios(liq, [1.5e6], [3], estrategia, mesada_actual=base["mesada"].iloc[0] * (1 - 1e-15))
+    assert (escenarios["delta"] == 0).all() and (escenarios["roi"] == 0).all()
+    assert mejor_estrategia(escenarios) is None
+
+def test_historia_vacia():
+    vacia = pd.DataFrame({"Desde": pd.to_datetime([]), "Hasta": pd.to_datetime([]), "IBC": [], "Semanas": []})
+    assert simular_escenarios(LiquidadorPension(vacia, "Masculino", "1963-01-01"), [1e6], [1]).empty
@@ -0,0 +1,132 @@
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+import pytest
+from dateutil.relativedelta import relativedelta
+
+from logic import SMMLV, LiquidadorPension
+from regimenes import (FIN_TRANSICION, FIN_TRANSICION_EXTENDIDA, VIGENCIA_AL_01_2005, VIGENCIA_LEY_100,
+                       evaluar_regimenes)
+from utils import IPC_HISTORICO
+
+COLUMNAS = ["Desde", "Hasta", "IBC", "Semanas"]
+PERFILES = [("Masculino", "1938-02-28"), ("Masculino", "1945-06-01"), ("Femenino", "1952-02-29"),
+            ("Masculino", "1956-02-29"), ("Femenino", "1968-02-29")]
+
+def _factor(fecha_inicio, fecha_corte):
+    """Productoria original del IPC año por año"""
+    anio_inicio = max(fecha_inicio.year, min(IPC_HISTORICO))
+    anio_fin = min(fecha_corte.year, max(IPC_HISTORICO))
+    factor = 1.0
+    for anio in range(anio_inicio, anio_fin):
+        if anio in IPC_HISTORICO:
+            factor *= (1 + (IPC_HISTORICO[anio] / 100.0))
+    return factor
+
+def _semanas_hasta(df_sort, fecha):
+    acumulado = 0.0
+    for hasta, semanas in zip(df_sort["Hasta"], df_sort["Semanas"]):
+        if hasta > fecha: break
+        acumulado += semanas
+    return acumulado
+
+def _cruce(df_sort, objetivo):
+    acumulado = 0.0
+    for hasta, semanas in zip(df_sort["Hasta"], df_sort["Semanas"]):
+        acumulado += semanas
+        if acumulado >= objetivo: return hasta
+    return None
+
+def _fechas(fecha_cumple_edad, fecha_cumple_semanas, df_sort):
+    tiene_estatus = fecha_cumple_semanas is not None
+    fecha_estatus = max(fecha_cumple_edad, fecha_cumple_semanas) if tiene_estatus else None
+    ultima = df_sort["Hasta"].max() if len(df_sort) else None
+    if not tiene_estatus:
+        fecha_corte = datetime.now()
+    elif ultima > fecha_estatus + timedelta(days=30):
+        fecha_corte = ultima
+    else:
+        fecha_corte = fecha_estatus
+    return {"fecha_cumple_edad": fecha_cumple_edad, "fecha_cumple_semanas": fecha_cumple_semanas,
+            "fecha_estatus": fecha_estatus, "tiene_estatus": tiene_estatus, "fecha_corte": fecha_corte}
+
+def _ibl(df_sort, fecha_corte, inicio):
+    """Promedio del IBC indexado fila por fila en la ventana 'Hasta' >= inicio"""
+    ventana = df_sort if inicio is None else df_sort[df_sort["Hasta"] >= inicio]
+    if ventana.empty: return 0.0
+    return float(np.mean([max(ibc, 0) * _factor(hasta, fecha_corte) for hasta, ibc in zip(ventana["Hasta"], ventana["IBC"])]))
+
+def referencia_049(df, genero, fecha_nacimiento):
+    """Acuerdo 049 evaluado de forma directa: recorridos de la historia y una indexación por ventana"""
+    nacimiento = pd.Timestamp(fecha_nacimiento)
+    df_sort = df.sort_values("Hasta", kind="stable")
+    fecha_cumple_edad = nacimiento + relativedelta(years=60 if genero == "Masculino" else 55)
+    previas = _semanas_hasta(df_sort, fecha_cumple_edad - relativedelta(years=20))
+    if _semanas_hasta(df_sort, fecha_cumple_edad) - previas >= 500:
+        req_sem, cruce = 500, _cruce(df_sort, previas + 500)
+    else:
+        req_sem, cruce = 1000, _cruce(df_sort, 1000)
+    fechas = _fechas(fecha_cumple_edad, cruce, df_sort)
+
+    edad_1994 = relativedelta(VIGENCIA_LEY_100, nacimiento).years
+    limite = FIN_TRANSICION_EXTENDIDA if _semanas_hasta(df_sort, VIGENCIA_AL_01_2005) >= 750 else FIN_TRANSICION
+    aplica = (
+        (edad_1994 >= (40 if genero == "Masculino" else 35) or _semanas_hasta(df_sort, VIGENCIA_LEY_100) >= 750)
+        and fechas["tiene_estatus"] and fechas["fecha_estatus"] <= limite
+    )
+
+    semanas = df["Semanas"].sum()
+    estatus = fechas["fecha_estatus"]
+    if estatus is not None and estatus < VIGENCIA_LEY_100 + relativedelta(years=10):
+        ventanas = [VIGENCIA_LEY_100, None]
+    else:
+        ventanas = [df["Hasta"].max() - relativedelta(years=10) if len(df) else None]
+        if semanas >= 1250: ventanas.append(None)
+    ibl = max(_ibl(df_sort, fechas["fecha_corte"], inicio) for inicio in ventanas) if len(df) else 0.0
+
+    tasa = min(45 + 3 * max(int((semanas - 500) / 50), 0), 90) if ibl > 0 else 0
+    mesada = max(ibl * (tasa / 100), SMMLV) if ibl > 0 else 0
+    return {"aplica": aplica, "semanas_requeridas": req_sem, "fechas": fechas, "ibl": ibl, "tasa": tasa, "mesada": mesada}
+
+def _igual_fechas(obtenidas, esperadas):
+    for campo, valor in esperadas.items():
+        if campo == "fecha_corte" and not esperadas["tiene_estatus"]:
+            # Sin estatus el corte es 'ahora' y difiere en microsegundos
+            assert pd.Timestamp(obtenidas[campo]).normalize() == pd.Timestamp(valor).normalize()
+        elif valor is None:
+            assert obtenidas[campo] is None, campo
+        else:
+            assert obtenidas[campo] == valor, campo
+
+def _comparar(df, genero, fecha_nacimiento):
+    liq = LiquidadorPension(df, genero, fecha_nacimiento)
+    resultados = {r["clave"]: r for r in evaluar_regimenes(liq)}
+
+    # Ley 797: exactamente lo mismo que liquidar
+    ley_797, res = resultados["ley_797"], liq.liquidar()
+    for campo in ("ibl", "origen_ibl", "tasa", "mesada", "semanas"):
+        assert ley_797[campo] == res[campo], campo
+    _igual_fechas(ley_797["fechas"], {k: res["fechas"][k] for k in
+                                      ("fecha_cumple_edad", "fecha_cumple_semanas", "fecha_estatus", "tiene_estatus", "fecha_corte")})
+
+    # Acuerdo 049: fechas exactas; IBL de sumas prefijas frente al promedio directo
+    acuerdo, esperado = resultados["acuerdo_049"], referencia_049(df, genero, fecha_nacimiento)
+    assert acuerdo["aplica"] == esperado["aplica"]
+    assert acuerdo["semanas_requeridas"] == esperado["semanas_requeridas"]
+    _igual_fechas(acuerdo["fechas"], esperado["fechas"])
+    assert acuerdo["ibl"] == pytest.approx(esperado["ibl"], rel=1e-12, abs=0)
+    assert acuerdo["tasa"] == esperado["tasa"]
+    assert acuerdo["mesada"] == pytest.approx(esperado["mesada"], rel=1e-12, abs=0)
+    return resultados
+
+@pytest.mark.parametrize("genero, fecha_nacimiento", PERFILES)
+@pytest.mark.parametrize("filas, semilla", [(1, 0), (90, 1), (400, 2), (700, 3)])
+def test_historias_generadas(historia_generada, filas, semilla, genero, fecha_nacimiento):
+    _comparar(historia_generada(filas, semilla, anios=45)[COLUMNAS], genero, fecha_nacimiento)
+
+@pytest.mark.parametrize("genero, fecha_nacimiento", PERFILES)
+def test_historia_vacia(genero, fecha_nacimiento):
+    df = pd.DataFrame({"Desde": pd.to_datetime([]), "Hasta": pd.to_datetime([]), "IBC": [], "Semanas": []})
+    resultados = _comparar(df, genero, fecha_nacimiento)
+    assert all(r["ibl"] == 0.0 and r["mesada"] == 0 for r in resultados.values())
@@ -0,0 +1,25 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from logic import LiquidadorPension
+from sensibilidad import analizar_sensibilidad, escenarios_monte_carlo
+
+ANIOS = (2023, 2025, 2026)
+
+@pytest.fixture
+def liq(historia_generada):
+    return LiquidadorPension(historia_generada(400, anios=35), "Masculino", "1966-02-28")
+
+@pytest.mark.parametrize("granularidad", ["anual", "mensual"])
+def test_anios_desordenados(liq, granularidad):
+    ipc, smmlv = escenarios_monte_carlo(200, ANIOS, semilla=1)
+    ordenado = analizar_sensibilidad(liq, ipc, smmlv, ANIOS, granularidad=granularidad)
+    permutacion = [2, 0, 1]
+    desordenado = analizar_sensibilidad(liq, ipc[:, permutacion], smmlv, [ANIOS[k] for k in permutacion],
+                                        granularidad=granularidad)
+    pd.testing.assert_frame_equal(desordenado, ordenado)
+
+def test_anios_repetidos(liq):
+    with pytest.raises(ValueError):
+        analizar_sensibilidad(liq, np.zeros((3, 2)), anios_ipc=(2025, 2025))
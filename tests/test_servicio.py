@@ -0,0 +1,81 @@
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+
+import pandas as pd
+import pytest
+
+from batch import historia_desde_pdf
+from benchmarks.generador import fixtures
+from logic import LiquidadorPension
+from servicio import ClienteServicio
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def _puerto_libre():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+@pytest.fixture(scope="module")
+def url():
+    puerto = _puerto_libre()
+    proceso = subprocess.Popen([sys.executable, os.path.join(RAIZ, "servicio.py"), "--puerto", str(puerto), "--workers", "1"],
+                               cwd=RAIZ, stderr=subprocess.DEVNULL)
+    url = f"http://127.0.0.1:{puerto}"
+    try:
+        for _ in range(100):
+            try:
+                urllib.request.urlopen(url + "/salud", timeout=1).close()
+                break
+            except OSError:
+                time.sleep(0.1)
+        yield url
+    finally:
+        proceso.terminate()
+        proceso.wait(10)
+
+@pytest.fixture(scope="module")
+def trabajo(url, tmp_path_factory):
+    pdf = fixtures(str(tmp_path_factory.mktemp("pdfs")), 120)["pdf"]
+    with open(pdf, "rb") as f:
+        contenido = f.read()
+    cliente = ClienteServicio(url)
+    id_trabajo = cliente.enviar_pdf(contenido, "Femenino", "1968-02-29")
+    assert list(cliente.eventos(id_trabajo))[-1]["estado"] == "listo"
+    return cliente, id_trabajo, historia_desde_pdf(pdf)[0]
+
+@pytest.mark.parametrize("genero, nacimiento, limitar, granularidad", [
+    ("Femenino", "1968-02-29", True, "anual"),   # mismos parámetros del envío
+    ("Masculino", "1960-05-01", False, "mensual"),
+])
+def test_liquidacion_igual_a_local(trabajo, genero, nacimiento, limitar, granularidad):
+    cliente, id_trabajo, df = trabajo
+    remoto = cliente.liquidacion(id_trabajo, genero, nacimiento, limitar, granularidad)
+    local = LiquidadorPension(df, genero, nacimiento).liquidar(limitar, granularidad=granularidad)
+
+    for campo in ("semanas", "ibl_10", "ibl_vida", "ibl", "origen_ibl", "tasa", "mesada"):
+        assert remoto[campo] == local[campo], campo
+    for campo, valor in local["fechas"].items():
+        # Sin estatus el corte es 'ahora' y difiere en microsegundos
+        if campo in ("fecha_corte", "fecha_efectividad") and not local["fechas"]["tiene_estatus"]:
+            assert remoto["fechas"][campo].normalize() == pd.Timestamp(valor).normalize(), campo
+        else:
+            assert remoto["fechas"][campo] == valor, campo
+    for clave in ("det_10", "det_vida"):
+        pd.testing.assert_frame_equal(remoto[clave], local[clave], check_dtype=False)
+    assert [r["clave"] for r in remoto["regimenes"]]
+
+def test_dictamen_cuerpo_no_objeto(url, trabajo):
+    _, id_trabajo, _ = trabajo
+    for cuerpo in (b"[1, 2]", b'"texto"'):
+        peticion = urllib.request.Request(f"{url}/trabajos/{id_trabajo}/dictamen", data=cuerpo, method="POST")
+        with pytest.raises(urllib.error.HTTPError) as error:
+            urllib.request.urlopen(peticion, timeout=30)
+        assert error.value.code == 400
+        assert "objeto" in json.loads(error.value.read())["error"]
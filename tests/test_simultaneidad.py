@@ -0,0 +1,79 @@
+from collections import defaultdict
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from benchmarks.generador import lineas_por_filas
+from data_processor import (SEMANAS_MES_COMPLETO, aplicar_regla_simultaneidad, construir_tabla_cruda,
+                            limpiar_y_estandarizar, simultaneidad_mensual, sugerir_columnas)
+
+def referencia(desde, hasta, ibc, semanas):
+    """Regla de simultaneidad mes a mes y día a día, sin vectorizar"""
+    tramos = defaultdict(list)
+    for d, h, base, sem in zip(desde, hasta, ibc, semanas):
+        d, h = pd.Timestamp(d), max(pd.Timestamp(h), pd.Timestamp(d))
+        dias_periodo = (h - d).days + 1
+        mes = d.to_period("M")
+        while mes <= h.to_period("M"):
+            inicio = max(d, mes.start_time.normalize())
+            fin = min(h, mes.end_time.normalize())
+            dias = (fin - inicio).days + 1
+            tramos[mes].append((inicio, fin, dias, base, sem * dias / dias_periodo))
+            mes += 1
+    filas = []
+    for mes in sorted(tramos):
+        cubiertos = set()
+        for inicio, fin, *_ in tramos[mes]:
+            cubiertos.update(pd.date_range(inicio, fin))
+        suma = sum(t[4] for t in tramos[mes])
+        filas.append((
+            mes, sum(base * dias / len(cubiertos) for _, _, dias, base, _ in tramos[mes]),
+            min(suma, max(max(t[4] for t in tramos[mes]), SEMANAS_MES_COMPLETO)),
+            min(t[0] for t in tramos[mes]), max(t[1] for t in tramos[mes])
+        ))
+    return filas
+
+def comparar(desde, hasta, ibc, semanas):
+    mes, ibc_mes, sem_mes, d_mes, h_mes = simultaneidad_mensual(
+        np.array(desde, dtype="datetime64[D]"), np.array(hasta, dtype="datetime64[D]"), ibc, semanas
+    )
+    esperado = referencia(desde, hasta, ibc, semanas)
+    assert [str(p) for p, *_ in esperado] == [str(m) for m in mes]
+    np.testing.assert_allclose(ibc_mes, [f[1] for f in esperado], rtol=1e-12)
+    np.testing.assert_allclose(sem_mes, [f[2] for f in esperado], rtol=1e-12)
+    assert [pd.Timestamp(x) for x in d_mes] == [f[3] for f in esperado]
+    assert [pd.Timestamp(x) for x in h_mes] == [f[4] for f in esperado]
+    return ibc_mes, sem_mes
+
+def test_empleadores_seguidos_en_el_mismo_mes_no_suman_ibc():
+    ibc, semanas = comparar(["1990-03-01", "1990-03-16"], ["1990-03-15", "1990-03-31"], [100000, 100000], [15 / 7, 16 / 7])
+    assert ibc.tolist() == [100000.0]
+    assert semanas.tolist() == [SEMANAS_MES_COMPLETO]
+
+def test_empleadores_simultaneos_suman_ibc():
+    ibc, _ = comparar(["1990-03-01", "1990-03-01"], ["1990-03-31", "1990-03-31"], [100000, 100000], [30 / 7, 30 / 7])
+    assert ibc.tolist() == [200000.0]
+
+def test_periodo_unico():
+    ibc, semanas = comparar(["1990-03-10"], ["1990-03-20"], [100000], [11 / 7])
+    assert ibc.tolist() == [100000.0]
+    assert semanas.tolist() == [11 / 7]
+
+def test_periodos_de_varios_meses_superpuestos():
+    comparar(["1988-01-10", "1988-03-01", "1988-03-20", "1989-12-31"],
+             ["1988-03-15", "1988-04-20", "1988-05-02", "1990-01-01"],
+             [100000, 50000, 80000, 70000], [9, 7, 6, 0.3])
+
+@pytest.mark.parametrize("filas, semilla", [(120, 0), (120, 1), (1500, 2)])
+def test_historias_generadas(filas, semilla):
+    # Periodos antiguos seguidos (varios meses) y, con 1500 filas, varios empleadores por mes
+    df_crudo = construir_tabla_cruda(lineas_por_filas(filas, semilla=semilla))
+    cols = sugerir_columnas(df_crudo)
+    limpio = limpiar_y_estandarizar(df_crudo, cols["desde"], cols["hasta"], cols["ibc"], cols["semanas"])
+    comparar(limpio["Desde"].dt.strftime("%Y-%m-%d").tolist(), limpio["Hasta"].dt.strftime("%Y-%m-%d").tolist(),
+             limpio["IBC"].to_numpy(), limpio["Semanas"].to_numpy())
+
+def test_historia_vacia():
+    vacia = pd.DataFrame({"Desde": pd.to_datetime([]), "Hasta": pd.to_datetime([]), "IBC": [], "Semanas": []})
+    assert aplicar_regla_simultaneidad(vacia).empty
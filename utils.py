@@ -1,3 +1,8 @@
+import csv
+import os
+from types import MappingProxyType
+
+import numpy as np
 import pandas as pd
 from datetime import datetime
 
@@ -17,35 +22,145 @@ IPC_HISTORICO = {
     2021: 5.6, 2022: 13.1, 2023: 9.3, 2024: 5.0, 2025: 4.0, 2026: 3.5
 }
 
+class TablaIPC:
+    """
+    Serie IPC inmutable con índices precalculados una sola vez:
+    - factores[i, f]: productoria (1 + IPC) de los años min+i .. min+f-1,
+      acumulada en el mismo orden que el algoritmo anual original, de modo
+      que cada consulta es O(1) y da exactamente el mismo resultado.
+    - indice_mensual[m]: índice acumulado al inicio del mes m (contado desde
+      enero del primer año), para indexar con granularidad mensual. Se deriva
+      de la serie anual, salvo los meses que traiga serie_mensual
+      ({(anio, mes): variación mensual en %}).
+    """
+    def __init__(self, serie, serie_mensual=None):
+        self.serie = MappingProxyType({int(k): float(v) for k, v in serie.items()})
+        self.serie_mensual = MappingProxyType(
+            {(int(a), int(m)): float(v) for (a, m), v in (serie_mensual or {}).items()}
+        )
+        self.min_anio = min(self.serie.keys())
+        self.max_anio = max(self.serie.keys())
+        n = self.max_anio - self.min_anio + 1
+
+        # Años sin dato en la tabla no aportan inflación (factor 1)
+        crecimiento = np.array([
+            1 + (self.serie[anio] / 100.0) if anio in self.serie else 1.0
+            for anio in range(self.min_anio, self.max_anio + 1)
+        ])
+        # Cada fila es un cumprod secuencial desde su año de inicio (prefijos exactos)
+        factores = np.ones((n, n))
+        for i in range(n - 1):
+            factores[i, i + 1:] = np.cumprod(crecimiento[i:n - 1])
+        factores.setflags(write=False)
+        self.factores = factores
+
+        # Crecimiento mensual equivalente: (1 + IPC anual) ^ (1/12), o el dato mensual publicado
+        mensual = np.repeat(crecimiento ** (1 / 12), 12)
+        for (anio, mes), variacion in self.serie_mensual.items():
+            if self.min_anio <= anio <= self.max_anio and 1 <= mes <= 12:
+                mensual[(anio - self.min_anio) * 12 + mes - 1] = 1 + variacion / 100.0
+        indice_mensual = np.concatenate([[1.0], np.cumprod(mensual)])
+        indice_mensual.setflags(write=False)
+        self.indice_mensual = indice_mensual
+
+    @staticmethod
+    def _anio_mes(fechas):
+        """Año y mes (0-11) de un arreglo de fechas, sin pasar por objetos Timestamp"""
+        arreglo = np.asarray(fechas)
+        if arreglo.dtype.kind != 'M': arreglo = pd.DatetimeIndex(fechas).to_numpy()
+        meses = arreglo.astype('datetime64[M]').astype(np.int64)
+        return meses // 12 + 1970, meses % 12
+
+    def _indice_anio(self, anio):
+        return min(max(anio - self.min_anio, 0), self.factores.shape[0] - 1)
+
+    def factor(self, fecha_inicio, fecha_corte):
+        """Factor anual de una fecha a la fecha de corte (O(1))"""
+        return float(self.factores[self._indice_anio(fecha_inicio.year), self._indice_anio(fecha_corte.year)])
+
+    def factores_anuales(self, fechas_inicio, fecha_corte):
+        """Factor anual para una serie de fechas en una sola lectura vectorizada"""
+        anios, _ = self._anio_mes(fechas_inicio)
+        idx_inicio = np.clip(anios - self.min_anio, 0, self.factores.shape[0] - 1)
+        return self.factores[idx_inicio, self._indice_anio(fecha_corte.year)]
+
+    def ordinal_mes(self, fechas):
+        """Número de mes contado desde enero del primer año de la serie, acotado a la tabla"""
+        anios, mes = self._anio_mes(fechas)
+        meses = (anios - self.min_anio) * 12 + mes
+        return np.clip(meses, 0, len(self.indice_mensual) - 1)
+
+    def factores_mensuales(self, fechas_inicio, fecha_corte):
+        """Factor con resolución mensual: cociente de índices acumulados (mes de corte / mes del periodo)"""
+        m_inicio = self.ordinal_mes(fechas_inicio)
+        m_corte = self.ordinal_mes([fecha_corte])[0]
+        return np.where(m_corte > m_inicio, self.indice_mensual[m_corte] / self.indice_mensual[m_inicio], 1.0)
+
+    def matriz_factores(self, fechas_inicio, fechas_corte, granularidad="anual"):
+        """
+        Factores de una misma serie de fechas hacia varias fechas de corte en
+        una sola lectura: matriz (cortes x fechas), fila r = factores al corte r.
+        """
+        if granularidad == "mensual":
+            m_inicio = self.ordinal_mes(fechas_inicio)
+            m_corte = self.ordinal_mes(list(fechas_corte))
+            cociente = self.indice_mensual[m_corte][:, None] / self.indice_mensual[m_inicio][None, :]
+            return np.where(m_corte[:, None] > m_inicio[None, :], cociente, 1.0)
+        anios, _ = self._anio_mes(fechas_inicio)
+        idx_inicio = np.clip(anios - self.min_anio, 0, self.factores.shape[0] - 1)
+        idx_corte = np.array([self._indice_anio(f.year) for f in fechas_corte], dtype=np.int64)
+        return self.factores[idx_inicio[None, :], idx_corte[:, None]]
+
+# Tabla compartida por todo el proceso. Se reemplaza completa (nunca se
+# modifica en sitio), así que una liquidación en curso conserva su tabla.
+_tabla_ipc = TablaIPC(IPC_HISTORICO)
+
+def obtener_tabla_ipc():
+    """Tabla IPC vigente"""
+    return _tabla_ipc
+
+def actualizar_serie_ipc(serie, serie_mensual=None):
+    """
+    Publica una nueva serie IPC (p. ej. un nuevo dato del DANE) sin reiniciar
+    el servicio. Las liquidaciones creadas después usan la nueva tabla.
+    """
+    global _tabla_ipc
+    nueva = TablaIPC(serie, serie_mensual)
+    _tabla_ipc = nueva
+    return nueva
+
+def cargar_serie_ipc(ruta):
+    """Carga una serie IPC desde un CSV con columnas 'anio' e 'ipc' y la publica"""
+    serie = {}
+    with open(ruta, newline='', encoding='utf-8-sig') as f:
+        for fila in csv.DictReader(f):
+            serie[int(fila['anio'])] = float(fila['ipc'])
+    return actualizar_serie_ipc(serie, _tabla_ipc.serie_mensual)
+
+def cargar_serie_ipc_mensual(ruta):
+    """
+    Carga variaciones mensuales del IPC desde un CSV con columnas 'anio',
+    'mes' e 'ipc' (variación del mes en %) y publica la tabla con ellas.
+    """
+    serie_mensual = {}
+    with open(ruta, newline='', encoding='utf-8-sig') as f:
+        for fila in csv.DictReader(f):
+            serie_mensual[(int(fila['anio']), int(fila['mes']))] = float(fila['ipc'])
+    return actualizar_serie_ipc(_tabla_ipc.serie, serie_mensual)
+
+if os.environ.get("LIQUIDADOR_IPC_CSV"):
+    cargar_serie_ipc(os.environ["LIQUIDADOR_IPC_CSV"])
+if os.environ.get("LIQUIDADOR_IPC_MENSUAL_CSV"):
+    cargar_serie_ipc_mensual(os.environ["LIQUIDADOR_IPC_MENSUAL_CSV"])
+
 def obtener_ipc_acumulado(fecha_inicio, fecha_fin):
     """
     Calcula el factor multiplicador de IPC desde fecha_inicio hasta fecha_fin.
     """
-    anio_inicio = fecha_inicio.year
-    anio_fin = fecha_fin.year
-    
-    # Validar rangos
-    min_anio_tabla = min(IPC_HISTORICO.keys())
-    max_anio_tabla = max(IPC_HISTORICO.keys())
-    
-    # Si la cotización es anterior a 1967, arrancamos desde 1967
-    if anio_inicio < min_anio_tabla: 
-        anio_inicio = min_anio_tabla
-    
-    if anio_fin > max_anio_tabla: 
-        anio_fin = max_anio_tabla
-
-    ipc_acumulado = 1.0
-    
-    # Algoritmo de acumulación (Productoria)
     # Factor = (1+IPC_1) * (1+IPC_2) ...
-    # Se toma hasta el año anterior a la fecha de corte (norma general de indexación anual)
-    
-    for anio in range(anio_inicio, anio_fin): 
-        if anio in IPC_HISTORICO:
-             ipc_acumulado *= (1 + (IPC_HISTORICO[anio] / 100.0))
-             
-    return ipc_acumulado
+    # Se toma hasta el año anterior a la fecha de corte (norma general de indexación anual).
+    # Si la cotización es anterior a 1967, arrancamos desde 1967.
+    return obtener_tabla_ipc().factor(fecha_inicio, fecha_fin)
 
 def calcular_semanas_minimas_mujeres(anio_proyeccion):
     if anio_proyeccion < 2026: